@@ -7,6 +7,10 @@ Provides access to dem_analyzer and lidar_extractor across modules
 dem_analyzer = None
 lidar_extractor = None
 
+# Bumped whenever this process adds or removes trails, so caches keyed on it
+# (e.g. similar-trail results) stop being served
+trails_version = 0
+
 
 def set_dem_analyzer(analyzer):
     """Set the global DEM analyzer instance"""
@@ -28,3 +32,14 @@ def get_dem_analyzer():
 def get_lidar_extractor():
     """Get the global LiDAR extractor instance"""
     return lidar_extractor
+
+
+def get_trails_version():
+    """Get the current trails version"""
+    return trails_version
+
+
+def bump_trails_version():
+    """Mark the trails table as changed"""
+    global trails_version
+    trails_version += 1
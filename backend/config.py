@@ -16,6 +16,9 @@ SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise Exception("Missing Supabase credentials. Please check your .env file.")
 
+# Per-operation HTTP timeout (seconds) for Supabase database and storage calls
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
+
 # Paths
 DEM_PATH = os.path.join(
     os.path.dirname(__file__), "data", "QSpatial", "DEM", "1 Metre"
@@ -1,17 +1,41 @@
 """
 Database client initialization for Supabase.
 """
-from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_ROLE_KEY
+from supabase import create_client, Client, ClientOptions
+from config import (
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_HTTP_TIMEOUT,
+)
+
+
+def _client_options() -> ClientOptions:
+    """
+    Options shared by the module-level clients
+
+    Each client lazily builds one httpx session per service (PostgREST,
+    Storage) and keeps it for the life of the process, so back-to-back
+    calls reuse keep-alive connections. A single shared httpx_client is
+    deliberately not passed in: supabase-py rebinds its base_url to each
+    service in turn, which would send table calls to the storage endpoint.
+    """
+    return ClientOptions(
+        postgrest_client_timeout=SUPABASE_HTTP_TIMEOUT,
+        storage_client_timeout=SUPABASE_HTTP_TIMEOUT,
+    )
+
 
 # Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=_client_options())
 
 # Optional service-role client for server-side writes that must bypass RLS
 supabase_service = None
 if SUPABASE_SERVICE_ROLE_KEY:
     try:
-        supabase_service: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+        supabase_service: Client = create_client(
+            SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, options=_client_options()
+        )
         print("✅ Supabase service-role client initialized")
     except Exception as e:
         print(f"⚠️  Could not initialize supabase service client: {e}")
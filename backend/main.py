@@ -5,8 +5,13 @@ Refactored modular version with route separation
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
+import atexit
+import logging
+import logging.handlers
 import os
+import queue
 from dotenv import load_dotenv
 
 # Import database clients
@@ -22,6 +27,30 @@ from routes import trails_router, uploads_router, analysis_router, maps_router
 # Load environment variables
 load_dotenv()
 
+
+def configure_logging():
+    """
+    Route log records through a queue so request handlers never block on
+    console I/O; a background listener thread does the actual writing.
+    LOG_LEVEL=WARNING silences per-upload chatter.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+        return
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(message)s"))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, console)
+
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+
+
+configure_logging()
+
 # Initialize DEM analyzer
 try:
     from utils.real_dem_analysis import RealDEMAnalyzer
@@ -72,6 +101,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses such as the 3D terrain viewer page
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # Register route modules
 app.include_router(trails_router, tags=["Trails"])
 app.include_router(uploads_router, tags=["Uploads"])
@@ -103,6 +135,12 @@ async def startup_event():
     print(f"📊 DEM: {'✅' if app_state.get_dem_analyzer() else '❌'}")
     print(f"🗺️  LiDAR: {'✅' if app_state.get_lidar_extractor() else '❌'}")
     print(f"🔐 Supabase: {'✅' if supabase else '❌'}")
+    try:
+        from openpyxl.xml import LXML
+
+        print(f"📑 XLSX parser: {'lxml' if LXML else 'ElementTree (install lxml for faster parsing)'}")
+    except ImportError:
+        print("📑 XLSX parser: ❌ openpyxl not installed")
     print("✅ Ready!")
 
 
@@ -2,19 +2,29 @@
 Elevation analysis routes
 Handles DEM analysis, 3D terrain visualization, and multi-source elevation data
 """
+import asyncio
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
+from typing import Literal
 from database import supabase
-from utils.calculations import haversine
+from utils.calculations import cumulative_distances
 from utils.dem_processing import find_relevant_dem_tiles, process_dem_for_trail
+import logging
 import random
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.get("/trail/{trail_id}/dem3d")
-async def get_trail_3d_dem(trail_id: int):
-    """Get 3D DEM data for a specific trail"""
+async def get_trail_3d_dem(trail_id: int, format: Literal["binary", "json"] = "binary"):
+    """
+    Get 3D DEM data for a specific trail
+
+    The surface elevation grid is sent as base64 float32 bytes
+    (surface.z_f32_b64 + surface.z_shape) unless format=json is given,
+    which returns the nested-list surface.z instead.
+    """
     try:
         print(f"Getting 3D DEM data for trail ID: {trail_id}")
 
@@ -45,7 +55,7 @@ async def get_trail_3d_dem(trail_id: int):
         print(f"Found {len(dem_files)} DEM files")
 
         # Process DEM data
-        dem_data = process_dem_for_trail(trail_coords, dem_files)
+        dem_data = process_dem_for_trail(trail_coords, dem_files, z_format=format)
         if not dem_data:
             raise HTTPException(status_code=500, detail="Failed to process DEM data")
 
@@ -59,10 +69,7 @@ async def get_trail_3d_dem(trail_id: int):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"3D DEM error: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("3D DEM error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -112,7 +119,9 @@ async def get_trail_dem_analysis(trail_id: int):
         terrain_features = dem_analyzer.analyze_terrain_features(coordinates)
 
         # Generate 3D visualization
-        visualization_3d = dem_analyzer.create_3d_terrain_visualization(coordinates)
+        visualization_3d = await asyncio.to_thread(
+            dem_analyzer.create_3d_terrain_visualization, coordinates
+        )
 
         result = {
             "success": True,
@@ -191,7 +200,8 @@ async def get_trail_3d_terrain(trail_id: int, elevation_source: str = "gpx"):
                 elevation_source = "gpx"
 
         # Generate 3D visualization
-        visualization_result = dem_analyzer.create_3d_terrain_visualization(
+        visualization_result = await asyncio.to_thread(
+            dem_analyzer.create_3d_terrain_visualization,
             coordinates,
             buffer_meters=1000,
             elevation_source=elevation_source,
@@ -283,7 +293,8 @@ async def get_trail_3d_terrain_viewer(trail_id: int, elevation_source: str = "gp
                 elevation_source = "gpx"
 
         # Generate 3D visualization
-        visualization_result = dem_analyzer.create_3d_terrain_visualization(
+        visualization_result = await asyncio.to_thread(
+            dem_analyzer.create_3d_terrain_visualization,
             coordinates,
             buffer_meters=1000,
             elevation_source=elevation_source,
@@ -344,6 +355,89 @@ async def get_trail_3d_terrain_viewer(trail_id: int, elevation_source: str = "gp
         return HTMLResponse(content=error_html, status_code=500)
 
 
+@router.get("/trail/{trail_id}/3d-terrain.json")
+async def get_trail_3d_terrain_json(trail_id: int, elevation_source: str = "gpx"):
+    """Serve the 3D terrain Plotly figure spec as JSON
+
+    For clients that load Plotly themselves and call
+    Plotly.newPlot(div, spec.data, spec.layout, spec.config); skips the
+    HTML page the viewer endpoint renders.
+
+    Args:
+        trail_id: Trail ID
+        elevation_source: "gpx" (default) or "lidar" - determines which elevation data to use for trail overlay
+    """
+    try:
+        import app_state
+
+        dem_analyzer = app_state.get_dem_analyzer()
+        lidar_extractor = app_state.get_lidar_extractor()
+        if not dem_analyzer:
+            return JSONResponse(
+                {"error": "DEM analyzer not available"}, status_code=503
+            )
+
+        # Get trail data
+        trail_response = (
+            supabase.table("trails").select("*").eq("id", trail_id).execute()
+        )
+        if not trail_response.data:
+            return JSONResponse({"error": "Trail not found"}, status_code=404)
+
+        coordinates = trail_response.data[0].get("coordinates", [])
+        if not coordinates:
+            return JSONResponse({"error": "No coordinates available"}, status_code=400)
+
+        # Get LiDAR elevations if requested (same logic as the viewer)
+        lidar_elevations = None
+        if elevation_source.lower() == "lidar" and lidar_extractor:
+            try:
+                profile = lidar_extractor.extract_elevation_profile(
+                    trail_coords=coordinates, trail_id=trail_id
+                )
+                if profile and profile.get("success") and "elevations" in profile:
+                    lidar_elevations = profile["elevations"]
+                else:
+                    elevation_source = "gpx"
+            except Exception as e:
+                print(f"❌ Error getting LiDAR elevations: {e}")
+                elevation_source = "gpx"
+
+        visualization_result = await asyncio.to_thread(
+            dem_analyzer.create_3d_terrain_visualization,
+            coordinates,
+            buffer_meters=1000,
+            elevation_source=elevation_source,
+            trail_id=trail_id,
+            lidar_elevations=lidar_elevations,
+            output_format="json",
+        )
+
+        if not visualization_result.get("success"):
+            return JSONResponse(
+                {
+                    "error": visualization_result.get(
+                        "error", "Failed to generate 3D visualization"
+                    )
+                },
+                status_code=500,
+            )
+        if visualization_result.get("type") != "interactive":
+            return JSONResponse(
+                {"error": "Interactive 3D terrain not available"}, status_code=503
+            )
+
+        # Already serialized by Plotly; pass it through as is
+        return Response(
+            content=visualization_result["figure_json"],
+            media_type="application/json",
+        )
+
+    except Exception as e:
+        print(f"3D terrain JSON error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
 @router.get("/dem/coverage")
 async def get_dem_coverage():
     """Get information about available DEM coverage"""
@@ -469,32 +563,16 @@ async def get_trail_elevation_sources(trail_id: int):
                 }
 
         # Calculate distances along trail for x-axis
-        distances = [0]
         print(f"🧮 Calculating distances for {len(coordinates)} coordinates")
 
-        for i in range(1, len(coordinates)):
-            try:
-                coord_prev = coordinates[i - 1]
-                coord_curr = coordinates[i]
-                
-                # Validate coordinate format
-                if not isinstance(coord_prev, (list, tuple)) or len(coord_prev) < 2:
-                    raise ValueError(f"Invalid coordinate at index {i-1}: {coord_prev}")
-                if not isinstance(coord_curr, (list, tuple)) or len(coord_curr) < 2:
-                    raise ValueError(f"Invalid coordinate at index {i}: {coord_curr}")
-                
-                lat1, lon1 = coord_prev[0], coord_prev[1]
-                lat2, lon2 = coord_curr[0], coord_curr[1]
-                dist = haversine(lat1, lon1, lat2, lon2)
-                distances.append(distances[-1] + dist)
-            except Exception as e:
-                print(f"❌ Error at coordinate index {i}: {e}")
-                print(f"   Coordinate[{i-1}]: {coordinates[i-1]}")
-                print(f"   Coordinate[{i}]: {coordinates[i]}")
-                raise
+        # Validate coordinate format
+        for i, coord in enumerate(coordinates):
+            if not isinstance(coord, (list, tuple)) or len(coord) < 2:
+                print(f"❌ Error at coordinate index {i}: {coord}")
+                raise ValueError(f"Invalid coordinate at index {i}: {coord}")
 
-        # Convert distances to kilometers
-        distances_km = [d / 1000 for d in distances]
+        # Cumulative distances in one vectorized pass, converted to kilometers
+        distances_km = (cumulative_distances(coordinates) / 1000).tolist()
         print(f"✅ Calculated {len(distances_km)} distance points")
 
         # Initialize results
@@ -848,9 +926,7 @@ async def get_trail_elevation_sources(trail_id: int):
                             "distances": [],
                         }
                 except Exception as e:
-                    print(f"XLSX parse error: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("XLSX parse error: %s", e)
                     sources["XLSX"] = {
                         "available": False,
                         "error": f"XLSX parsing error: {str(e)}",
@@ -866,9 +942,7 @@ async def get_trail_elevation_sources(trail_id: int):
                     "distances": [],
                 }
         except Exception as e:
-            print(f"XLSX database query error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("XLSX database query error: %s", e)
             sources["XLSX"] = {
                 "available": False,
                 "error": f"Database error: {str(e)}",
@@ -1044,8 +1118,5 @@ async def get_trail_elevation_sources(trail_id: int):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Elevation sources error: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("Elevation sources error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
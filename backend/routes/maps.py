@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 from database import supabase
 import folium
+import numpy as np
 import os
 import tempfile
 import uuid
@@ -51,8 +52,9 @@ async def get_map():
             prefer_canvas=False,  # Ensure interactive behavior
         )
 
-        # Collect all coordinates to calculate bounds
-        all_coordinates = []
+        # Per-trail [lat, lon] minima and maxima, to calculate bounds
+        trail_mins = []
+        trail_maxs = []
 
         # Color palette for different trails
         colors = ["blue", "red", "green", "purple", "orange", "darkred", "lightred"]
@@ -62,8 +64,10 @@ async def get_map():
             coordinates = trail.get("coordinates", [])
 
             if coordinates:
-                # Add all coordinates to bounds calculation
-                all_coordinates.extend(coordinates)
+                # Add this trail's extent to bounds calculation
+                lat_lon = np.asarray(coordinates, dtype=float)[:, :2]
+                trail_mins.append(lat_lon.min(axis=0))
+                trail_maxs.append(lat_lon.max(axis=0))
 
                 # Add polyline for this trail with better styling
                 folium.PolyLine(
@@ -111,19 +115,15 @@ async def get_map():
                 ).add_to(m)
 
         # Fit map bounds to show all trails
-        if all_coordinates:
+        if trail_mins:
             # Calculate bounds
-            lats = [coord[0] for coord in all_coordinates]
-            lons = [coord[1] for coord in all_coordinates]
+            lowest = np.min(trail_mins, axis=0)
+            highest = np.max(trail_maxs, axis=0)
 
             # Add some padding to the bounds
-            lat_padding = (max(lats) - min(lats)) * 0.1
-            lon_padding = (max(lons) - min(lons)) * 0.1
+            padding = (highest - lowest) * 0.1
 
-            bounds = [
-                [min(lats) - lat_padding, min(lons) - lon_padding],
-                [max(lats) + lat_padding, max(lons) + lon_padding],
-            ]
+            bounds = [(lowest - padding).tolist(), (highest + padding).tolist()]
 
             m.fit_bounds(bounds)
 
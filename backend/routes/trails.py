@@ -3,10 +3,16 @@ Trail management routes
 Handles trail CRUD operations, analytics, and similar trail matching
 """
 from fastapi import APIRouter, HTTPException
+import logging
+import time
+from collections import OrderedDict
 from database import supabase, supabase_service
-from utils.calculations import calculate_trail_similarity
+import numpy as np
+import app_state
+from utils.calculations import calculate_trail_similarity_batch
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.get("/trails")
@@ -55,13 +61,56 @@ async def get_trails():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Similar-trail rankings, keyed on (trail_id, trails_version). Entries also
+# expire after a TTL because trails can change outside this process
+# (e.g. scripts/update_technical_rating.py).
+SIMILAR_CACHE_TTL = 300  # seconds
+SIMILAR_CACHE_MAXSIZE = 512
+_similar_cache = OrderedDict()
+
+
+def _get_cached_similar(key):
+    """Return a cached ranking for key, or None if missing/expired"""
+    entry = _similar_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at <= time.monotonic():
+        del _similar_cache[key]
+        return None
+    _similar_cache.move_to_end(key)
+    return value
+
+
+def _store_similar(key, value):
+    """Cache a ranking, evicting the least recently used entries past maxsize"""
+    _similar_cache[key] = (time.monotonic() + SIMILAR_CACHE_TTL, value)
+    _similar_cache.move_to_end(key)
+    while len(_similar_cache) > SIMILAR_CACHE_MAXSIZE:
+        _similar_cache.popitem(last=False)
+
+
 @router.get("/trail/{trail_id}/similar")
 async def get_similar_trails(trail_id: int, limit: int = 5):
     """
     Find trails similar to the given trail based on distance, elevation gain, and terrain features.
     Uses sophisticated similarity scoring algorithm.
+    Rankings are cached per trail until trails change or the TTL expires.
     """
     try:
+        cache_key = (trail_id, app_state.get_trails_version())
+        cached = _get_cached_similar(cache_key)
+        if cached is not None:
+            target_trail, all_trails, scores, order = cached
+            return {
+                "success": True,
+                "target_trail": target_trail.get("name", "Unknown"),
+                "similar_trails": [
+                    {"trail": all_trails[i], "similarity_score": float(scores[i])}
+                    for i in order[:limit]
+                ],
+            }
+
         # Get the target trail
         target_response = (
             supabase.table("trails").select("*").eq("id", trail_id).execute()
@@ -84,17 +133,16 @@ async def get_similar_trails(trail_id: int, limit: int = 5):
                 "message": "No other trails available for comparison",
             }
 
-        # Calculate similarity scores
-        similarities = []
-        for trail in all_trails:
-            similarity_score = calculate_trail_similarity(target_trail, trail)
-            similarities.append({"trail": trail, "similarity_score": similarity_score})
+        # Score every candidate in one pass, then take the top N
+        # (stable sort keeps database order between equal scores)
+        scores = calculate_trail_similarity_batch(target_trail, all_trails)
+        order = np.argsort(-scores, kind="stable")
+        _store_similar(cache_key, (target_trail, all_trails, scores, order))
 
-        # Sort by similarity score (descending)
-        similarities.sort(key=lambda x: x["similarity_score"], reverse=True)
-
-        # Return top N similar trails
-        similar_trails = similarities[:limit]
+        similar_trails = [
+            {"trail": all_trails[i], "similarity_score": float(scores[i])}
+            for i in order[:limit]
+        ]
 
         return {
             "success": True,
@@ -299,16 +347,15 @@ async def delete_trail(trail_id: int):
         print(f"🗑️  Deleting trail: {trail_name}")
         db_client = supabase_service if supabase_service else supabase
         db_client.table("trails").delete().eq("id", trail_id).execute()
+        app_state.bump_trails_version()
         print(f"✅ Trail deleted")
 
         # Reinitialize LiDAR extractor if files were deleted
         if deleted_lidar_count > 0:
-            import app_state
-
             lidar_extractor = app_state.get_lidar_extractor()
             if lidar_extractor:
-                lidar_extractor.lidar_files = lidar_extractor._find_lidar_files()
-                print(f"🔄 LiDAR extractor reinitialized")
+                lidar_extractor.invalidate()
+                print(f"🔄 LiDAR extractor marked for rescan")
 
         return {
             "success": True,
@@ -320,8 +367,5 @@ async def delete_trail(trail_id: int):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error deleting trail: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("❌ Error deleting trail: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -4,15 +4,120 @@ Handles GPX, LiDAR (.las/.laz), and XLSX file uploads
 """
 from fastapi import APIRouter, File, UploadFile, HTTPException, Form
 from typing import Optional
+import asyncio
 import gpxpy
+import io
+import logging
+import numpy as np
 import os
+import posixpath
+import shutil
+import re
 import uuid
 import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
 from database import supabase, supabase_service
-from utils.calculations import haversine, analyze_rolling_hills
+import app_state
+
+try:
+    import lxml.etree  # noqa: F401 - lets openpyxl use the libxml2 parser for XLSX
+except ImportError:
+    pass
+from utils.calculations import distance_array, analyze_rolling_hills
 from utils.terrain_analysis import get_trail_weather_exposure, calculate_terrain_variety
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Columns returned by GET /lidar-files unless full records are requested
+LIDAR_FILE_SUMMARY_COLUMNS = "id,trail_id,filename,file_url,file_size_mb,point_count"
+
+# Buffer size used when streaming uploads to disk
+UPLOAD_COPY_BUFFER = 1024 * 1024
+
+
+def _save_upload_to_temp(src, suffix):
+    """
+    Stream an uploaded file to a named temp file without holding it in memory
+
+    Args:
+        src: Binary file object of the upload (UploadFile.file)
+        suffix: Extension for the temp file, e.g. ".laz"
+
+    Returns:
+        tuple: (temp_path, size_bytes)
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        temp_path = tmp.name
+        try:
+            shutil.copyfileobj(src, tmp, UPLOAD_COPY_BUFFER)
+        except BaseException:
+            # Callers only learn temp_path on success, so clean up here
+            tmp.close()
+            os.unlink(temp_path)
+            raise
+    return temp_path, os.path.getsize(temp_path)
+
+
+def _gpx_segments_gpxpy(content):
+    """Fallback for _read_gpx_segments on files the streaming reader can't parse"""
+    gpx = gpxpy.parse(content.decode("utf-8"))
+    segments = []
+    for track in gpx.tracks:
+        for segment in track.segments:
+            points = segment.points
+            segments.append(
+                (
+                    np.array([p.latitude for p in points], dtype=float),
+                    np.array([p.longitude for p in points], dtype=float),
+                    np.array([p.elevation or 0 for p in points], dtype=float),
+                )
+            )
+    return segments
+
+
+def _read_gpx_segments(content):
+    """
+    Read the track segments of a GPX file as arrays, streaming the XML
+
+    Matches trkseg/trkpt/ele by local name, so GPX 1.0 and 1.1 files both
+    work, and clears each point once read instead of building gpxpy's
+    object tree. Missing elevations read as 0, as with gpxpy.
+
+    Args:
+        content: Raw GPX file bytes
+
+    Returns:
+        list: (lats, lons, elevations) float arrays, one tuple per segment
+            in file order
+    """
+    segments = []
+    lats, lons, eles = [], [], []
+    try:
+        for _, elem in ET.iterparse(io.BytesIO(content), events=("end",)):
+            tag = elem.tag.rpartition("}")[2]
+            if tag == "trkpt":
+                lats.append(float(elem.get("lat")))
+                lons.append(float(elem.get("lon")))
+                ele = next(
+                    (c.text for c in elem if c.tag.rpartition("}")[2] == "ele"), None
+                )
+                eles.append(float(ele) if ele and ele.strip() else 0.0)
+                elem.clear()
+            elif tag == "trkseg":
+                segments.append(
+                    (
+                        np.array(lats, dtype=float),
+                        np.array(lons, dtype=float),
+                        np.array(eles, dtype=float),
+                    )
+                )
+                lats, lons, eles = [], [], []
+                elem.clear()
+    except (ET.ParseError, TypeError, ValueError):
+        return _gpx_segments_gpxpy(content)
+    return segments
 
 
 @router.post("/upload-gpx")
@@ -24,8 +129,12 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
         overwrite: If True, will delete existing trail with same name/location before adding new one
     """
     # Convert overwrite string to boolean
-    print(f"📤 Uploading GPX file: {file.filename}")
-    print(f"   Raw overwrite value: '{overwrite}' (type: {type(overwrite).__name__})")
+    logger.info("📤 Uploading GPX file: %s", file.filename)
+    logger.info(
+        "   Raw overwrite value: '%s' (type: %s)",
+        overwrite,
+        type(overwrite).__name__,
+    )
 
     # Safety check for None or empty string
     if overwrite is None:
@@ -35,7 +144,7 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
     else:
         overwrite_bool = bool(overwrite)
 
-    print(f"   Converted to bool: {overwrite_bool}")
+    logger.info("   Converted to bool: %s", overwrite_bool)
 
     if not file.filename.lower().endswith(".gpx"):
         raise HTTPException(status_code=400, detail="File must be a GPX file")
@@ -43,86 +152,60 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
     try:
         # Read GPX content
         content = await file.read()
-        gpx_content = content.decode("utf-8")
 
         # Extract trail name from filename
         trail_name = file.filename.replace(".gpx", "").replace("_", " ").title()
 
         # Analyze trail data
-        gpx = gpxpy.parse(gpx_content)
-        coords = []
-        elevations = []
+        gpx_segments = _read_gpx_segments(content)
         distances = [0]
         slopes = [0]  # Start with 0 slope for first point
 
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for i, point in enumerate(segment.points):
-                    coords.append([point.latitude, point.longitude])
-                    elevations.append(point.elevation or 0)
-
-                    if i > 0:
-                        prev_point = segment.points[i - 1]
-                        dist = (
-                            haversine(
-                                prev_point.latitude,
-                                prev_point.longitude,
-                                point.latitude,
-                                point.longitude,
-                            )
-                            / 1000
-                        )
-                        distances.append(distances[-1] + dist)
-
-                        # Slope analysis (gradient in %)
-                        elev_diff = (point.elevation or 0) - (prev_point.elevation or 0)
-                        dist_m = haversine(
-                            prev_point.latitude,
-                            prev_point.longitude,
-                            point.latitude,
-                            point.longitude,
-                        )
-                        if dist_m > 0:
-                            gradient = (elev_diff / dist_m) * 100
-                            slopes.append(gradient)
-                        else:
-                            slopes.append(0)
+        for seg_lats, seg_lons, seg_elevations in gpx_segments:
+            if len(seg_lats) < 2:
+                continue
+
+            # Segment distances for every consecutive pair in one pass
+            dist_m = distance_array(seg_lats[:-1], seg_lons[:-1], seg_lats[1:], seg_lons[1:])
+            seg_distances = distances[-1] + np.cumsum(dist_m / 1000)
+            distances.extend(seg_distances.tolist())
+
+            # Slope analysis (gradient in %), 0 where points coincide
+            elev_diff = np.diff(seg_elevations)
+            gradients = np.zeros_like(dist_m)
+            np.divide(elev_diff, dist_m, out=gradients, where=dist_m > 0)
+            slopes.extend((gradients * 100).tolist())
 
-        if not coords:
+        if not any(len(seg_lats) for seg_lats, _, _ in gpx_segments):
             raise HTTPException(
                 status_code=400, detail="No track points found in GPX file"
             )
 
+        # Whole track as parallel lat/lon/elevation arrays
+        lats, lons, elev = (np.concatenate(column) for column in zip(*gpx_segments))
+        # Lists for the stored trail and the profile built from them
+        coords = np.column_stack((lats, lons)).tolist()
+        elevations = elev.tolist()
+
         # Calculate statistics
         total_distance = distances[-1] if len(distances) > 1 else 0
-        elevation_gain = (
-            sum(
-                max(0, elevations[i] - elevations[i - 1])
-                for i in range(1, len(elevations))
-            )
-            if len(elevations) > 1
-            else 0
-        )
-        elevation_loss = (
-            sum(
-                max(0, elevations[i - 1] - elevations[i])
-                for i in range(1, len(elevations))
-            )
-            if len(elevations) > 1
-            else 0
-        )
-        max_elevation = max(elevations) if elevations else 0
-        min_elevation = min(elevations) if elevations else 0
+        elev_steps = np.diff(elev)
+        elevation_gain = float(elev_steps[elev_steps > 0].sum())
+        elevation_loss = float(-elev_steps[elev_steps < 0].sum())
+        max_elevation = float(elev.max())
+        min_elevation = float(elev.min())
 
         # Rolling hills analysis (advanced) - returns index and count
         rolling_hills_index, rolling_hills_count = analyze_rolling_hills(
             elevations, distances
         )
         rolling_hills_index = round(rolling_hills_index, 2)
-        print(f"🔍 DEBUG: Rolling Hills Index calculated: {rolling_hills_index}")
-        print(f"🔍 DEBUG: Rolling Hills Count: {rolling_hills_count}")
-        print(
-            f"🔍 DEBUG: Elevations count: {len(elevations)}, Distance: {distances[-1] if distances else 0} km"
+        logger.debug("🔍 DEBUG: Rolling Hills Index calculated: %s", rolling_hills_index)
+        logger.debug("🔍 DEBUG: Rolling Hills Count: %s", rolling_hills_count)
+        logger.debug(
+            "🔍 DEBUG: Elevations count: %s, Distance: %s km",
+            len(elevations),
+            distances[-1] if distances else 0,
         )
 
         # Create elevation profile data
@@ -215,8 +298,9 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
             else:
                 # Delete existing trail and its associated LiDAR files
                 duplicate_trail_id = existing_trails_response.data[0]["id"]
-                print(
-                    f"🗑️  Overwrite mode: Deleting existing trail ID {duplicate_trail_id}"
+                logger.info(
+                    "🗑️  Overwrite mode: Deleting existing trail ID %s",
+                    duplicate_trail_id,
                 )
 
                 # Delete associated LiDAR files first
@@ -227,8 +311,9 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
                     .execute()
                 )
                 if lidar_files.data:
-                    print(
-                        f"   Deleting {len(lidar_files.data)} associated LiDAR file(s)"
+                    logger.info(
+                        "   Deleting %s associated LiDAR file(s)",
+                        len(lidar_files.data),
                     )
                     for lidar_file in lidar_files.data:
                         db_client = supabase_service if supabase_service else supabase
@@ -241,7 +326,8 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
                 db_client.table("trails").delete().eq(
                     "id", duplicate_trail_id
                 ).execute()
-                print(f"   ✅ Deleted trail and associated data")
+                app_state.bump_trails_version()
+                logger.info("   ✅ Deleted trail and associated data")
 
         # Check for similar starting coordinates (within ~100m radius)
         # This prevents uploading the same trail with different names
@@ -250,60 +336,67 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
             supabase.table("trails").select("id, name, coordinates").execute()
         )
 
-        for existing_trail in all_trails_response.data:
-            if existing_trail.get("coordinates"):
-                existing_start = existing_trail["coordinates"][0]
-                existing_lat, existing_lon = existing_start
-
-                # Calculate distance between starting points
-                distance_between_starts = haversine(
-                    start_lat, start_lon, existing_lat, existing_lon
-                )
+        existing_trails = [
+            t for t in all_trails_response.data if t.get("coordinates")
+        ]
+        # Distances from our start to every existing trail's start, in one call
+        existing_starts = np.array(
+            [t["coordinates"][0][:2] for t in existing_trails], dtype=float
+        ).reshape(-1, 2)
+        start_distances = distance_array(
+            start_lat, start_lon, existing_starts[:, 0], existing_starts[:, 1]
+        )
 
-                # If starts are within 100 meters, likely duplicate
-                if distance_between_starts < 100:
-                    if not overwrite_bool:
-                        raise HTTPException(
-                            status_code=409,
-                            detail=f"Trail starting near same location as existing trail '{existing_trail['name']}' (within 100m). Possible duplicate.",
+        for existing_trail, distance_between_starts in zip(
+            existing_trails, start_distances.tolist()
+        ):
+            # If starts are within 100 meters, likely duplicate
+            if distance_between_starts < 100:
+                if not overwrite_bool:
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Trail starting near same location as existing trail '{existing_trail['name']}' (within 100m). Possible duplicate.",
+                    )
+                else:
+                    # Delete this coordinate-duplicate trail too
+                    coord_dup_id = existing_trail["id"]
+                    if coord_dup_id != duplicate_trail_id:  # Don't delete twice
+                        logger.info(
+                            "🗑️  Overwrite mode: Deleting coordinate-duplicate trail ID %s",
+                            coord_dup_id,
                         )
-                    else:
-                        # Delete this coordinate-duplicate trail too
-                        coord_dup_id = existing_trail["id"]
-                        if coord_dup_id != duplicate_trail_id:  # Don't delete twice
-                            print(
-                                f"🗑️  Overwrite mode: Deleting coordinate-duplicate trail ID {coord_dup_id}"
-                            )
 
-                            # Delete associated LiDAR files
-                            lidar_files = (
-                                supabase.table("lidar_files")
-                                .select("*")
-                                .eq("trail_id", coord_dup_id)
-                                .execute()
+                        # Delete associated LiDAR files
+                        lidar_files = (
+                            supabase.table("lidar_files")
+                            .select("*")
+                            .eq("trail_id", coord_dup_id)
+                            .execute()
+                        )
+                        if lidar_files.data:
+                            logger.info(
+                                "   Deleting %s associated LiDAR file(s)",
+                                len(lidar_files.data),
                             )
-                            if lidar_files.data:
-                                print(
-                                    f"   Deleting {len(lidar_files.data)} associated LiDAR file(s)"
+                            for lidar_file in lidar_files.data:
+                                db_client = (
+                                    supabase_service
+                                    if supabase_service
+                                    else supabase
                                 )
-                                for lidar_file in lidar_files.data:
-                                    db_client = (
-                                        supabase_service
-                                        if supabase_service
-                                        else supabase
-                                    )
-                                    db_client.table("lidar_files").delete().eq(
-                                        "id", lidar_file["id"]
-                                    ).execute()
-
-                            # Delete the trail
-                            db_client = (
-                                supabase_service if supabase_service else supabase
-                            )
-                            db_client.table("trails").delete().eq(
-                                "id", coord_dup_id
-                            ).execute()
-                            print(f"   ✅ Deleted coordinate-duplicate trail")
+                                db_client.table("lidar_files").delete().eq(
+                                    "id", lidar_file["id"]
+                                ).execute()
+
+                        # Delete the trail
+                        db_client = (
+                            supabase_service if supabase_service else supabase
+                        )
+                        db_client.table("trails").delete().eq(
+                            "id", coord_dup_id
+                        ).execute()
+                        app_state.bump_trails_version()
+                        logger.info("   ✅ Deleted coordinate-duplicate trail")
 
         # Create new trail data for Supabase
         weather_exposure = get_trail_weather_exposure({"max_elevation": max_elevation})
@@ -368,6 +461,7 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
         # Insert trail into Supabase database (use service-role client if available to bypass RLS)
         db_client = supabase_service if supabase_service else supabase
         response = db_client.table("trails").insert(new_trail_data).execute()
+        app_state.bump_trails_version()
 
         if response.data:
             inserted_trail = response.data[0]
@@ -385,11 +479,7 @@ async def upload_gpx(file: UploadFile = File(...), overwrite: str = Form("false"
         # Re-raise HTTPExceptions (409, 400, etc.) without wrapping them
         raise
     except Exception as e:
-        import traceback
-
-        error_details = traceback.format_exc()
-        print(f"❌ Upload error: {type(e).__name__}: {e}")
-        print(f"❌ Full traceback:\n{error_details}")
+        logger.exception("❌ Upload error: %s: %s", type(e).__name__, e)
         raise HTTPException(
             status_code=500, detail=f"{type(e).__name__}: {str(e) or 'Unknown error'}"
         )
@@ -413,10 +503,12 @@ async def upload_lidar_file(
     temp_path = None
     try:
         # Convert overwrite string to boolean
-        print(f"📤 Uploading LiDAR file: {file.filename}")
-        print(f"   Trail ID: {trail_id}")
-        print(
-            f"   Raw overwrite value: '{overwrite}' (type: {type(overwrite).__name__})"
+        logger.info("📤 Uploading LiDAR file: %s", file.filename)
+        logger.info("   Trail ID: %s", trail_id)
+        logger.info(
+            "   Raw overwrite value: '%s' (type: %s)",
+            overwrite,
+            type(overwrite).__name__,
         )
 
         # Safety check for None or empty string
@@ -427,7 +519,7 @@ async def upload_lidar_file(
         else:
             overwrite_bool = bool(overwrite)
 
-        print(f"   Converted to bool: {overwrite_bool}")
+        logger.info("   Converted to bool: %s", overwrite_bool)
 
         # Validate file extension
         if not (file.filename.endswith(".las") or file.filename.endswith(".laz")):
@@ -436,10 +528,13 @@ async def upload_lidar_file(
                 detail="Invalid file format. Only .las and .laz files are supported.",
             )
 
-        # Read file content to check size
-        print(f"📊 Reading file to check size...")
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
+        # Stream the upload to disk; its size there decides whether it's accepted
+        logger.info("📊 Saving upload to check size...")
+        temp_path, size_bytes = await asyncio.to_thread(
+            _save_upload_to_temp, file.file, os.path.splitext(file.filename)[1]
+        )
+        file_size_mb = size_bytes / (1024 * 1024)
+        logger.info("💾 Saved temporary file for metadata extraction: %s", temp_path)
 
         # Check if file is too large (>= 1GB)
         if file_size_mb >= 1024:
@@ -450,8 +545,10 @@ async def upload_lidar_file(
             )
 
         # Check if trail already has LiDAR file(s)
-        print(
-            f"🔍 Checking trail LiDAR: trail_id={trail_id}, overwrite_bool={overwrite_bool}"
+        logger.info(
+            "🔍 Checking trail LiDAR: trail_id=%s, overwrite_bool=%s",
+            trail_id,
+            overwrite_bool,
         )
         if trail_id and not overwrite_bool:
             existing_trail_lidar = (
@@ -460,11 +557,12 @@ async def upload_lidar_file(
                 .eq("trail_id", trail_id)
                 .execute()
             )
-            print(
-                f"🔍 Existing trail LiDAR check: {len(existing_trail_lidar.data) if existing_trail_lidar.data else 0} file(s) found"
+            logger.info(
+                "🔍 Existing trail LiDAR check: %s file(s) found",
+                len(existing_trail_lidar.data) if existing_trail_lidar.data else 0,
             )
             if existing_trail_lidar.data:
-                print(f"⚠️  Trail already has LiDAR - raising 409 error")
+                logger.warning("⚠️  Trail already has LiDAR - raising 409 error")
                 raise HTTPException(
                     status_code=409,
                     detail=f"Trail ID {trail_id} already has LiDAR file(s): {', '.join([f['filename'] for f in existing_trail_lidar.data])}. "
@@ -472,7 +570,7 @@ async def upload_lidar_file(
                 )
 
         # Check for duplicates in database (by original filename)
-        print(f"🔍 Checking for existing file: {file.filename}")
+        logger.info("🔍 Checking for existing file: %s", file.filename)
         existing_check = (
             supabase.table("lidar_files")
             .select("id, filename, file_url, trail_id")
@@ -483,7 +581,7 @@ async def upload_lidar_file(
         if existing_check.data:
             if not overwrite_bool:
                 existing_file = existing_check.data[0]
-                print(f"⚠️  File already exists: {existing_file['filename']}")
+                logger.warning("⚠️  File already exists: %s", existing_file['filename'])
                 raise HTTPException(
                     status_code=409,
                     detail=f"File '{file.filename}' already exists in database. "
@@ -493,8 +591,9 @@ async def upload_lidar_file(
             else:
                 # Delete existing file(s) with same name
                 for existing_file in existing_check.data:
-                    print(
-                        f"🗑️  Overwrite mode: Deleting existing file ID {existing_file['id']}"
+                    logger.info(
+                        "🗑️  Overwrite mode: Deleting existing file ID %s",
+                        existing_file['id'],
                     )
                     try:
                         # Delete from storage
@@ -505,13 +604,13 @@ async def upload_lidar_file(
                                 [existing_file["filename"]]
                             )
                     except Exception as e:
-                        print(f"   ⚠️  Could not delete from storage: {e}")
+                        logger.warning("   ⚠️  Could not delete from storage: %s", e)
                     # Delete from database
                     db_client = supabase_service if supabase_service else supabase
                     db_client.table("lidar_files").delete().eq(
                         "id", existing_file["id"]
                     ).execute()
-                    print(f"   ✅ Deleted existing file")
+                    logger.info("   ✅ Deleted existing file")
 
         # If overwriting trail's LiDAR, delete existing trail LiDAR files
         if trail_id and overwrite_bool:
@@ -522,8 +621,10 @@ async def upload_lidar_file(
                 .execute()
             )
             if existing_trail_lidar.data:
-                print(
-                    f"🗑️  Overwrite mode: Deleting {len(existing_trail_lidar.data)} existing LiDAR file(s) for trail {trail_id}"
+                logger.info(
+                    "🗑️  Overwrite mode: Deleting %s existing LiDAR file(s) for trail %s",
+                    len(existing_trail_lidar.data),
+                    trail_id,
                 )
                 for lidar_file in existing_trail_lidar.data:
                     try:
@@ -535,31 +636,32 @@ async def upload_lidar_file(
                                 [lidar_file["filename"]]
                             )
                     except Exception as e:
-                        print(f"   ⚠️  Could not delete from storage: {e}")
+                        logger.warning("   ⚠️  Could not delete from storage: %s", e)
                     # Delete from database
                     db_client = supabase_service if supabase_service else supabase
                     db_client.table("lidar_files").delete().eq(
                         "id", lidar_file["id"]
                     ).execute()
-                print(f"   ✅ Deleted existing trail LiDAR files")
+                logger.info("   ✅ Deleted existing trail LiDAR files")
 
         # Generate unique filename to avoid conflicts in storage
         timestamp = uuid.uuid4().hex[:8]
         safe_filename = f"{timestamp}_{file.filename}"
 
-        print(f"📊 File size: {file_size_mb:.2f} MB")
+        logger.info("📊 File size: %.2f MB", file_size_mb)
 
         # Upload to Supabase Storage
-        print(f"☁️  Uploading {safe_filename} to Supabase Storage...")
+        logger.info("☁️  Uploading %s to Supabase Storage...", safe_filename)
         try:
-            storage_response = supabase.storage.from_("lidar-files").upload(
-                path=safe_filename,
-                file=content,
-                file_options={"content-type": "application/octet-stream"},
-            )
-            print(f"✅ Upload response: {storage_response}")
+            with open(temp_path, "rb") as fh:
+                storage_response = supabase.storage.from_("lidar-files").upload(
+                    path=safe_filename,
+                    file=fh,
+                    file_options={"content-type": "application/octet-stream"},
+                )
+            logger.info("✅ Upload response: %s", storage_response)
         except Exception as storage_error:
-            print(f"❌ Storage upload error: {storage_error}")
+            logger.error("❌ Storage upload error: %s", storage_error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to upload to storage: {str(storage_error)}",
@@ -567,13 +669,7 @@ async def upload_lidar_file(
 
         # Get public URL
         file_url = supabase.storage.from_("lidar-files").get_public_url(safe_filename)
-        print(f"🔗 File URL: {file_url}")
-
-        # Save temporarily to extract metadata
-        temp_path = os.path.join("/tmp", safe_filename)
-        print(f"💾 Saving temporary file for metadata extraction: {temp_path}")
-        with open(temp_path, "wb") as f:
-            f.write(content)
+        logger.info("🔗 File URL: %s", file_url)
 
         # Extract metadata from LiDAR file
         try:
@@ -600,10 +696,10 @@ async def upload_lidar_file(
             }
 
             las_data.close()
-            print(f"📈 Metadata extracted: {header.point_count} points")
+            logger.info("📈 Metadata extracted: %s points", header.point_count)
 
         except Exception as e:
-            print(f"⚠️  Error extracting LiDAR metadata: {e}")
+            logger.warning("⚠️  Error extracting LiDAR metadata: %s", e)
             # Use basic metadata if extraction fails
             metadata = {
                 "filename": safe_filename,
@@ -642,23 +738,19 @@ async def upload_lidar_file(
 
         try:
             db_response = supabase.table("lidar_files").insert(lidar_record).execute()
-            print(f"💾 LiDAR file metadata saved to database: {db_response.data}")
+            logger.info("💾 LiDAR file metadata saved to database: %s", db_response.data)
         except Exception as db_error:
-            print(f"❌ Database error: {db_error}")
+            logger.error("❌ Database error: %s", db_error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to save metadata to database: {str(db_error)}",
             )
 
-        # Reinitialize LiDAR extractor to pick up new file
-        import app_state
-
+        # Mark LiDAR extractor stale so it picks up the new file on next use
         lidar_extractor = app_state.get_lidar_extractor()
         if lidar_extractor:
-            lidar_extractor.lidar_files = lidar_extractor._find_lidar_files()
-            print(
-                f"🔄 LiDAR extractor reinitialized with {len(lidar_extractor.lidar_files)} files"
-            )
+            lidar_extractor.invalidate()
+            logger.info("🔄 LiDAR extractor marked for rescan")
 
         return {
             "success": True,
@@ -671,19 +763,128 @@ async def upload_lidar_file(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ LiDAR upload error: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("❌ LiDAR upload error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         # Clean up temporary file
-        if temp_path and os.path.exists(temp_path):
+        if temp_path:
             try:
                 os.remove(temp_path)
-                print(f"🗑️  Cleaned up temporary file: {temp_path}")
+                logger.info("🗑️  Cleaned up temporary file: %s", temp_path)
+            except FileNotFoundError:
+                pass
             except Exception as cleanup_error:
-                print(f"⚠️  Could not clean up temp file: {cleanup_error}")
+                logger.warning("⚠️  Could not clean up temp file: %s", cleanup_error)
+
+
+_XLSX_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_DOC_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_XLSX_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _xlsx_first_sheet_part(zf):
+    """
+    Find the first sheet's name and its XML part inside an XLSX archive
+
+    Only xl/workbook.xml and its (tiny) relationships file are read; styles,
+    shared strings, pivot caches and charts are never opened.
+
+    Returns:
+        tuple: (sheet_name, part_path), or ("", None) if the workbook has no sheets
+    """
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheet = workbook.find(f"{_XLSX_MAIN_NS}sheets/{_XLSX_MAIN_NS}sheet")
+    if sheet is None:
+        return "", None
+
+    part = "xl/worksheets/sheet1.xml"
+    rel_id = sheet.get(f"{_XLSX_DOC_REL_NS}id")
+    if rel_id and "xl/_rels/workbook.xml.rels" in zf.namelist():
+        rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+        for rel in rels.iter(f"{_XLSX_PKG_REL_NS}Relationship"):
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target", "")
+                if target.startswith("/"):
+                    part = target.lstrip("/")
+                else:
+                    part = posixpath.normpath(posixpath.join("xl", target))
+                break
+
+    return sheet.get("name", ""), part
+
+
+def _xlsx_count_rows(sheet_xml):
+    """
+    Count rows in a worksheet XML stream the way openpyxl's read-only mode does
+
+    Uses the <dimension> ref at the top of the sheet when it spans a real
+    range; otherwise streams <row> elements and takes the last row number.
+    """
+    last_row = 0
+    for event, elem in ET.iterparse(sheet_xml, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == f"{_XLSX_MAIN_NS}dimension":
+                rows = [int(r) for r in re.findall(r"\d+", elem.get("ref", ""))]
+                if len(rows) == 2 and rows != [1, 1]:
+                    return rows[1] - rows[0] + 1
+            continue
+        if tag == f"{_XLSX_MAIN_NS}row":
+            r = elem.get("r")
+            last_row = int(r) if r else last_row + 1
+            elem.clear()
+        elif tag == f"{_XLSX_MAIN_NS}sheetData":
+            break
+    return last_row
+
+
+def _read_xlsx_sheet_info_openpyxl(path):
+    """Fallback for _read_xlsx_sheet_info on workbooks the raw reader can't handle"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(filename=path, read_only=True, data_only=True)
+    sheet_name = wb.sheetnames[0] if wb.sheetnames else ""
+    ws = wb[sheet_name] if sheet_name else None
+    num_rows = 0
+    if ws:
+        # Read-only sheets are sized from the <dimension> element at the top
+        # of the sheet XML, so no cells need parsing. Some writers omit it or
+        # write a bogus "A1"; only then fall back to scanning every row.
+        if ws.max_row and not (ws.max_row == 1 and ws.max_column == 1):
+            num_rows = ws.max_row - ws.min_row + 1
+        else:
+            ws.reset_dimensions()
+            for _ in ws.rows:
+                num_rows += 1
+    wb.close()
+    return sheet_name, num_rows
+
+
+def _read_xlsx_sheet_info(path):
+    """
+    Read the first sheet name and its row count from an XLSX file
+
+    Args:
+        path: Path to the XLSX file on disk
+
+    Returns:
+        tuple: (sheet_name, num_rows); ("", None) if the workbook can't be read
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            sheet_name, part = _xlsx_first_sheet_part(zf)
+            if part is None:
+                return sheet_name, 0
+            with zf.open(part) as sheet_xml:
+                return sheet_name, _xlsx_count_rows(sheet_xml)
+    except Exception as e:
+        logger.warning("⚠️  Raw XLSX read failed, falling back to openpyxl: %s", e)
+
+    try:
+        return _read_xlsx_sheet_info_openpyxl(path)
+    except Exception as e:
+        logger.warning("⚠️  Failed to read XLSX with openpyxl: %s", e)
+        return "", None
 
 
 @router.post("/upload-xlsx")
@@ -698,7 +899,7 @@ async def upload_xlsx_file(
     """
     temp_path = None
     try:
-        print(f"📤 Uploading XLSX file: {file.filename}")
+        logger.info("📤 Uploading XLSX file: %s", file.filename)
         # Convert overwrite to bool
         if overwrite is None:
             overwrite_bool = False
@@ -713,51 +914,40 @@ async def upload_xlsx_file(
                 status_code=400, detail="Invalid file type. Use .xlsx or .xls"
             )
 
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
+        # Save temporarily to inspect
+        temp_path, size_bytes = await asyncio.to_thread(
+            _save_upload_to_temp, file.file, os.path.splitext(file.filename)[1]
+        )
+        file_size_mb = size_bytes / (1024 * 1024)
 
-        # Upload to Supabase Storage
         timestamp = uuid.uuid4().hex[:8]
         safe_filename = f"{timestamp}_{file.filename}"
+
+        def upload_to_storage():
+            with open(temp_path, "rb") as fh:
+                return supabase.storage.from_("xlsx-files").upload(
+                    path=safe_filename,
+                    file=fh,
+                    file_options={
+                        "content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    },
+                )
+
+        # Upload to Supabase Storage while reading sheet info from the temp file;
+        # neither depends on the other, so run them concurrently off the event loop
+        upload_task = asyncio.to_thread(upload_to_storage)
+        parse_task = asyncio.to_thread(_read_xlsx_sheet_info, temp_path)
         try:
-            storage_response = supabase.storage.from_("xlsx-files").upload(
-                path=safe_filename,
-                file=content,
-                file_options={
-                    "content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                },
+            storage_response, (sheet_name, num_rows) = await asyncio.gather(
+                upload_task, parse_task
             )
-            print(f"✅ XLSX upload response: {storage_response}")
+            logger.info("✅ XLSX upload response: %s", storage_response)
         except Exception as e:
-            print(f"❌ XLSX storage upload failed: {e}")
+            logger.error("❌ XLSX storage upload failed: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
 
         file_url = supabase.storage.from_("xlsx-files").get_public_url(safe_filename)
 
-        # Save temporarily to inspect
-        temp_path = os.path.join(tempfile.gettempdir(), safe_filename)
-        with open(temp_path, "wb") as f:
-            f.write(content)
-
-        # Read sheet info and number of rows
-        try:
-            from openpyxl import load_workbook
-
-            wb = load_workbook(filename=temp_path, read_only=True, data_only=True)
-            sheet_name = wb.sheetnames[0] if wb.sheetnames else ""
-            ws = wb[sheet_name] if sheet_name else None
-            num_rows = 0
-            if ws:
-                for _ in ws.rows:
-                    num_rows += 1
-            else:
-                num_rows = 0
-            wb.close()
-        except Exception as e:
-            print(f"⚠️  Failed to read XLSX with openpyxl: {e}")
-            sheet_name = ""
-            num_rows = None
-
         # Insert metadata into database
         xlsx_record = {
             "trail_id": trail_id,
@@ -772,9 +962,9 @@ async def upload_xlsx_file(
         try:
             db_client = supabase_service if supabase_service else supabase
             db_resp = db_client.table("xlsx_files").insert(xlsx_record).execute()
-            print(f"💾 XLSX metadata saved: {db_resp.data}")
+            logger.info("💾 XLSX metadata saved: %s", db_resp.data)
         except Exception as e:
-            print(f"❌ Failed to save XLSX metadata: {e}")
+            logger.error("❌ Failed to save XLSX metadata: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
 
         return {
@@ -787,28 +977,39 @@ async def upload_xlsx_file(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ XLSX upload error: {e}")
+        logger.error("❌ XLSX upload error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if temp_path and os.path.exists(temp_path):
+        if temp_path:
             try:
                 os.remove(temp_path)
-            except Exception:
+            except OSError:
                 pass
 
 
 @router.get("/lidar-files")
-async def get_lidar_files():
-    """Get list of all LiDAR files from database"""
+async def get_lidar_files(full: bool = False):
+    """Get list of all LiDAR files from database
+
+    Args:
+        full: If True, return every column (including bounds metadata)
+    """
     try:
-        response = supabase.table("lidar_files").select("*").execute()
+        # Only project the summary columns unless the full record is requested;
+        # PostgREST returns the exact count alongside the rows
+        columns = "*" if full else LIDAR_FILE_SUMMARY_COLUMNS
+        response = (
+            supabase.table("lidar_files").select(columns, count="exact").execute()
+        )
         return {
             "success": True,
             "lidar_files": response.data,
-            "count": len(response.data),
+            "count": (
+                response.count if response.count is not None else len(response.data)
+            ),
         }
     except Exception as e:
-        print(f"Error fetching LiDAR files: {e}")
+        logger.error("Error fetching LiDAR files: %s", e)
         return {"success": False, "error": str(e), "lidar_files": [], "count": 0}
 
 
@@ -822,7 +1023,7 @@ async def delete_lidar_file(lidar_id: int):
     """
     try:
         # Get file info from database
-        print(f"🔍 Looking up LiDAR file with ID: {lidar_id}")
+        logger.info("🔍 Looking up LiDAR file with ID: %s", lidar_id)
         file_response = (
             supabase.table("lidar_files").select("*").eq("id", lidar_id).execute()
         )
@@ -836,28 +1037,30 @@ async def delete_lidar_file(lidar_id: int):
         filename = file_record.get("filename")
         file_url = file_record.get("file_url")
 
-        print(f"📂 Found file: {filename}")
+        logger.info("📂 Found file: %s", filename)
 
         # Delete from storage (if not local file)
         if file_url and not file_url.startswith("local://") and filename:
             try:
                 supabase.storage.from_("lidar-files").remove([filename])
-                print(f"✅ Deleted from storage: {filename}")
+                logger.info("✅ Deleted from storage: %s", filename)
             except Exception as e:
-                print(f"⚠️  Could not delete from storage: {filename} - {e}")
+                logger.warning(
+                    "⚠️  Could not delete from storage: %s - %s",
+                    filename,
+                    e,
+                )
 
         # Delete from database
         db_client = supabase_service if supabase_service else supabase
         db_client.table("lidar_files").delete().eq("id", lidar_id).execute()
-        print(f"✅ Deleted from database")
+        logger.info("✅ Deleted from database")
 
         # Reinitialize LiDAR extractor
-        import app_state
-
         lidar_extractor = app_state.get_lidar_extractor()
         if lidar_extractor:
-            lidar_extractor.lidar_files = lidar_extractor._find_lidar_files()
-            print(f"🔄 LiDAR extractor reinitialized")
+            lidar_extractor.invalidate()
+            logger.info("🔄 LiDAR extractor marked for rescan")
 
         return {
             "success": True,
@@ -868,8 +1071,5 @@ async def delete_lidar_file(lidar_id: int):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error deleting LiDAR file: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("❌ Error deleting LiDAR file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
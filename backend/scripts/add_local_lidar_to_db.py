@@ -2,121 +2,216 @@
 Add local LiDAR file to database for testing (without uploading to Supabase Storage)
 
 Usage:
-    python3 add_local_lidar_to_db.py <file_path> <trail_id>
+    python3 add_local_lidar_to_db.py <file_or_dir> [<file_or_dir> ...] <trail_id>
 
 Examples:
     python3 add_local_lidar_to_db.py data/LiDAR/Coottha_Mt_1.las 51
     python3 add_local_lidar_to_db.py data/LiDAR/trail_1.las 51
+    python3 add_local_lidar_to_db.py data/LiDAR 51
 """
 
 import os
 import sys
-from supabase import create_client, Client
 from dotenv import load_dotenv
 import laspy
 
+# Make the backend package importable when run as scripts/add_local_lidar_to_db.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import get_supabase
+
 # Load environment variables
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("❌ Error: SUPABASE_URL and SUPABASE_KEY must be set in .env")
-    exit(1)
-
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# Parse command line arguments
-if len(sys.argv) < 3:
-    print("❌ Error: Missing required arguments")
-    print("\nUsage:")
-    print("  python3 add_local_lidar_to_db.py <file_path> <trail_id>")
-    print("\nExamples:")
-    print("  python3 add_local_lidar_to_db.py data/LiDAR/Coottha_Mt_1.las 51")
-    print("  python3 add_local_lidar_to_db.py data/LiDAR/trail_1.las 51")
-    exit(1)
-
-lidar_file_path = sys.argv[1]
-try:
-    trail_id = int(sys.argv[2])
-except ValueError:
-    print(f"❌ Error: trail_id must be a number, got: {sys.argv[2]}")
-    exit(1)
-
-print("=" * 60)
-print("Adding Local LiDAR File to Database")
-print("=" * 60)
-
-# Check if file exists
-if not os.path.exists(lidar_file_path):
-    print(f"❌ File not found: {lidar_file_path}")
-    print(f"   Current directory: {os.getcwd()}")
-    exit(1)
-
-print(f"\n📂 Reading LiDAR file: {lidar_file_path}")
-
-try:
-    # Read LiDAR file metadata
-    las = laspy.open(lidar_file_path)
-    header = las.header
-
-    file_size_mb = os.path.getsize(lidar_file_path) / (1024 * 1024)
-
-    print(f"\n📊 File Info:")
-    print(f"   Size: {file_size_mb:.2f} MB")
-    print(f"   Points: {header.point_count:,}")
-    print(f"   Bounds: X({header.x_min:.1f} to {header.x_max:.1f})")
-    print(f"           Y({header.y_min:.1f} to {header.y_max:.1f})")
-    print(f"           Z({header.z_min:.1f} to {header.z_max:.1f})")
-
-    # Create database record
-    filename = os.path.basename(lidar_file_path)
-    lidar_record = {
-        "trail_id": trail_id,
-        "filename": filename,
-        "file_url": f"local://{os.path.abspath(lidar_file_path)}",  # Special local:// URL
-        "file_size_mb": round(file_size_mb, 2),
-        "point_count": int(header.point_count),
-        "min_x": float(header.x_min),
-        "max_x": float(header.x_max),
-        "min_y": float(header.y_min),
-        "max_y": float(header.y_max),
-        "min_z": float(header.z_min),
-        "max_z": float(header.z_max),
-        "las_version": f"{header.version.major}.{header.version.minor}",
-        "point_format_id": header.point_format.id,
-        "crs_epsg": 28356,  # GDA94 MGA Zone 56
-    }
-
-    las.close()
-
-    print(f"\n💾 Inserting into database...")
-    print(f"   Trail ID: {lidar_record['trail_id']}")
-    print(f"   Filename: {lidar_record['filename']}")
-    print(f"   File URL: {lidar_record['file_url']}")
-
-    # Insert into database
-    response = supabase.table("lidar_files").insert(lidar_record).execute()
-
-    if response.data:
-        print(f"\n✅ Success! LiDAR file added to database")
-        print(f"   Database ID: {response.data[0]['id']}")
-        print(f"\n📍 This file is now associated with Trail ID: {trail_id}")
-        print(f"\n⚠️  Note: The file is stored locally, not in Supabase Storage")
-        print(f"   The backend will read it directly from: {lidar_file_path}")
+# Maximum records per PostgREST insert request
+INSERT_BATCH_SIZE = 100
+
+
+def build_record(lidar_file_path, trail_id):
+    """
+    Read a local LiDAR file's header and build its database record
+
+    Args:
+        lidar_file_path: Path to the local .las/.laz file
+        trail_id: Trail ID to associate the file with
+
+    Returns:
+        dict: lidar_files record, or None if the file can't be read
+    """
+    # Check if file exists
+    if not os.path.exists(lidar_file_path):
+        print(f"❌ File not found: {lidar_file_path}")
+        print(f"   Current directory: {os.getcwd()}")
+        return None
+
+    print(f"\n📂 Reading LiDAR file: {lidar_file_path}")
+
+    try:
+        # Read LiDAR file metadata
+        with laspy.open(lidar_file_path) as las:
+            header = las.header
+
+        file_size_mb = os.path.getsize(lidar_file_path) / (1024 * 1024)
+
+        print(f"\n📊 File Info:")
+        print(f"   Size: {file_size_mb:.2f} MB")
+        print(f"   Points: {header.point_count:,}")
+        print(f"   Bounds: X({header.x_min:.1f} to {header.x_max:.1f})")
+        print(f"           Y({header.y_min:.1f} to {header.y_max:.1f})")
+        print(f"           Z({header.z_min:.1f} to {header.z_max:.1f})")
+
+        filename = os.path.basename(lidar_file_path)
+        return {
+            "trail_id": trail_id,
+            "filename": filename,
+            "file_url": f"local://{os.path.abspath(lidar_file_path)}",  # Special local:// URL
+            "file_size_mb": round(file_size_mb, 2),
+            "point_count": int(header.point_count),
+            "min_x": float(header.x_min),
+            "max_x": float(header.x_max),
+            "min_y": float(header.y_min),
+            "max_y": float(header.y_max),
+            "min_z": float(header.z_min),
+            "max_z": float(header.z_max),
+            "las_version": f"{header.version.major}.{header.version.minor}",
+            "point_format_id": header.point_format.id,
+            "crs_epsg": 28356,  # GDA94 MGA Zone 56
+        }
+
+    except Exception as e:
+        print(f"\n❌ Error reading {lidar_file_path}: {e}")
+        import traceback
+
+        traceback.print_exc()
+        return None
+
+
+def ingest_many(lidar_file_paths, trail_id, client=None):
+    """
+    Insert records for several local LiDAR files, batching the inserts so
+    each batch of up to INSERT_BATCH_SIZE records is a single HTTP request
+
+    Args:
+        lidar_file_paths: Paths to local .las/.laz files
+        trail_id: Trail ID to associate the files with
+        client: Optional Supabase client (defaults to the shared client)
+
+    Returns:
+        list: Inserted database records
+    """
+    client = client or get_supabase()
+
+    records = []
+    for path in lidar_file_paths:
+        record = build_record(path, trail_id)
+        if record:
+            records.append(record)
+
+    if not records:
+        print(f"\n❌ No readable LiDAR files to insert")
+        return []
+
+    print(f"\n💾 Inserting {len(records)} record(s) into database...")
+    print(f"   Trail ID: {trail_id}")
+
+    inserted = []
+    for i in range(0, len(records), INSERT_BATCH_SIZE):
+        batch = records[i : i + INSERT_BATCH_SIZE]
+        try:
+            response = client.table("lidar_files").insert(batch).execute()
+        except Exception as e:
+            print(f"\n❌ Error inserting batch starting at {i}: {e}")
+            continue
+
+        if response.data:
+            inserted.extend(response.data)
+        else:
+            print(f"\n❌ Failed to insert batch starting at {i}")
+
+    for row in inserted:
+        print(f"   ✅ {row.get('filename')} -> Database ID: {row.get('id')}")
+
+    if inserted:
+        print(f"\n✅ Success! {len(inserted)} LiDAR file(s) added to database")
+        print(f"\n📍 These files are now associated with Trail ID: {trail_id}")
+        print(f"\n⚠️  Note: The files are stored locally, not in Supabase Storage")
+        print(f"   The backend will read them directly from their local paths")
         print(f"\n💡 To view this LiDAR data:")
         print(f"   1. Go to the frontend")
         print(f"   2. Select the trail with ID {trail_id}")
         print(f"   3. Choose 'LiDAR' from the elevation source dropdown")
-    else:
-        print(f"\n❌ Failed to insert into database")
-
-except Exception as e:
-    print(f"\n❌ Error: {e}")
-    import traceback
-
-    traceback.print_exc()
 
-print("\n" + "=" * 60)
+    return inserted
+
+
+def ingest(lidar_file_path, trail_id, client=None):
+    """
+    Insert the record for a single local LiDAR file
+
+    Args:
+        lidar_file_path: Path to the local .las/.laz file
+        trail_id: Trail ID to associate the file with
+        client: Optional Supabase client (defaults to the shared client)
+
+    Returns:
+        dict: Inserted database record, or None on failure
+    """
+    inserted = ingest_many([lidar_file_path], trail_id, client=client)
+    return inserted[0] if inserted else None
+
+
+def expand_lidar_paths(paths):
+    """Expand directories into the .las/.laz files they contain"""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".las") or name.endswith(".laz"):
+                    expanded.append(os.path.join(path, name))
+        else:
+            expanded.append(path)
+    return expanded
+
+
+if __name__ == "__main__":
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("❌ Error: SUPABASE_URL and SUPABASE_KEY must be set in .env")
+        exit(1)
+
+    # Parse command line arguments
+    if len(sys.argv) < 3:
+        print("❌ Error: Missing required arguments")
+        print("\nUsage:")
+        print("  python3 add_local_lidar_to_db.py <file_or_dir> [<file_or_dir> ...] <trail_id>")
+        print("\nExamples:")
+        print("  python3 add_local_lidar_to_db.py data/LiDAR/Coottha_Mt_1.las 51")
+        print("  python3 add_local_lidar_to_db.py data/LiDAR/trail_1.las 51")
+        print("  python3 add_local_lidar_to_db.py data/LiDAR 51")
+        exit(1)
+
+    # Validate trail_id up front so a typo fails before any file is read
+    try:
+        trail_id = int(sys.argv[-1])
+    except ValueError:
+        print(f"❌ Error: trail_id must be a number, got: {sys.argv[-1]}")
+        exit(1)
+
+    lidar_file_paths = expand_lidar_paths(sys.argv[1:-1])
+
+    print("=" * 60)
+    print("Adding Local LiDAR File(s) to Database")
+    print("=" * 60)
+
+    missing = [p for p in lidar_file_paths if not os.path.exists(p)]
+    if missing or not lidar_file_paths:
+        for path in missing:
+            print(f"❌ File not found: {path}")
+        print(f"   Current directory: {os.getcwd()}")
+        exit(1)
+
+    ingest_many(lidar_file_paths, trail_id)
+
+    print("\n" + "=" * 60)
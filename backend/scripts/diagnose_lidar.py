@@ -3,96 +3,182 @@ Diagnostic: Check LiDAR elevation data for trail_1.laz
 """
 
 import laspy
+import logging
 import numpy as np
 import os
 
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+log = logging.getLogger(__name__)
+
 # Path to the LiDAR file
 lidar_file = "data/LiDAR/trail_1.laz"
 
-print("=" * 60)
-print("LiDAR File Diagnostics: trail_1.laz")
-print("=" * 60)
+log.info("=" * 60)
+log.info("LiDAR File Diagnostics: trail_1.laz")
+log.info("=" * 60)
 
 # Check if file exists
 if not os.path.exists(lidar_file):
-    print(f"❌ File not found: {lidar_file}")
-    print("Looking for files in data/LiDAR/:")
+    log.error("❌ File not found: %s", lidar_file)
+    log.info("Looking for files in data/LiDAR/:")
     if os.path.exists("data/LiDAR"):
         for f in os.listdir("data/LiDAR"):
             if f.endswith(".las") or f.endswith(".laz"):
-                print(f"  - {f}")
+                log.info("  - %s", f)
     exit(1)
 
-# Read the LiDAR file
-print(f"\n📂 Reading file: {lidar_file}")
-las = laspy.read(lidar_file)
-
-print(f"\n📊 BASIC INFO:")
-print(f"  Total points: {len(las.points):,}")
-print(f"  Point format: {las.point_format}")
-
-print(f"\n🌍 SPATIAL BOUNDS:")
-print(f"  X (Easting):  {las.header.x_min:.2f} to {las.header.x_max:.2f} meters")
-print(f"  Y (Northing): {las.header.y_min:.2f} to {las.header.y_max:.2f} meters")
-print(f"  Z (Elevation): {las.header.z_min:.2f} to {las.header.z_max:.2f} meters")
-print(f"  Width:  {las.header.x_max - las.header.x_min:.2f} meters")
-print(f"  Height: {las.header.y_max - las.header.y_min:.2f} meters")
-print(f"  Elevation range: {las.header.z_max - las.header.z_min:.2f} meters")
-
-print(f"\n📈 ELEVATION STATISTICS:")
-z_values = las.z
-print(f"  Min elevation: {np.min(z_values):.2f} m")
-print(f"  Max elevation: {np.max(z_values):.2f} m")
-print(f"  Mean elevation: {np.mean(z_values):.2f} m")
-print(f"  Median elevation: {np.median(z_values):.2f} m")
-print(f"  Std deviation: {np.std(z_values):.2f} m")
-print(f"  Total elevation change: {np.max(z_values) - np.min(z_values):.2f} m")
-
-print(f"\n📍 SAMPLE POINTS (first 10):")
-for i in range(min(10, len(las.x))):
-    print(f"  Point {i+1}: X={las.x[i]:.2f}, Y={las.y[i]:.2f}, Z={las.z[i]:.2f}")
-
-print(f"\n🎯 ELEVATION DISTRIBUTION:")
-# Create bins for elevation histogram
-z_min, z_max = np.min(z_values), np.max(z_values)
-bins = np.linspace(z_min, z_max, 11)  # 10 bins
-hist, bin_edges = np.histogram(z_values, bins=bins)
-
-print(f"  Elevation range    | Point count")
-print(f"  {'-'*20}+{'-'*15}")
-for i in range(len(hist)):
-    bar = "█" * int(hist[i] / max(hist) * 30)
-    print(f"  {bin_edges[i]:6.2f} - {bin_edges[i+1]:6.2f} m | {hist[i]:7,} {bar}")
-
-print(f"\n🔍 DIAGNOSIS:")
-elevation_range = np.max(z_values) - np.min(z_values)
+# Stream the LiDAR file in chunks instead of decompressing every point at once
+CHUNK_SIZE = 10_000_000
+MEDIAN_SAMPLE_SIZE = 1_000_000
+
+log.info("\n📂 Reading file: %s", lidar_file)
+with laspy.open(lidar_file) as reader:
+    header = reader.header
+
+    # Histogram bins are seeded from the header so they can be filled per chunk
+    bins = np.linspace(header.z_min, header.z_max, 11)  # 10 bins
+    hist = np.zeros(len(bins) - 1, dtype=np.int64)
+
+    # Running statistics (Welford's algorithm for mean/variance)
+    n = 0
+    z_mean = 0.0
+    z_m2 = 0.0
+    z_min, z_max = np.inf, -np.inf
+    z_shift = (header.z_min + header.z_max) / 2
+
+    # Reservoir sample used to approximate the median in bounded memory
+    rng = np.random.default_rng(0)
+    reservoir = np.empty(0, dtype=np.float64)
+
+    sample_points = None
+
+    for chunk in reader.chunk_iterator(CHUNK_SIZE):
+        z = np.asarray(chunk.z, dtype=np.float64)
+        if len(z) == 0:
+            continue
+
+        if sample_points is None:
+            sample_points = (
+                np.asarray(chunk.x[:10]),
+                np.asarray(chunk.y[:10]),
+                z[:10].copy(),
+            )
+
+        # Merge this chunk's mean/M2 into the running totals (Chan et al.).
+        # Sum and sum-of-squares are taken in one go around the header midpoint
+        # (to limit cancellation) instead of a mean pass plus a deviation pass.
+        chunk_n = len(z)
+        shifted = z - z_shift
+        chunk_sum = shifted.sum()
+        chunk_sqsum = np.dot(shifted, shifted)
+        chunk_mean = z_shift + chunk_sum / chunk_n
+        chunk_m2 = max(chunk_sqsum - chunk_sum**2 / chunk_n, 0.0)
+        delta = chunk_mean - z_mean
+        total = n + chunk_n
+        z_mean += delta * chunk_n / total
+        z_m2 += chunk_m2 + delta**2 * n * chunk_n / total
+
+        z_min = min(z_min, z.min())
+        z_max = max(z_max, z.max())
+        hist += np.histogram(z, bins=bins)[0]
+
+        # Vectorised reservoir sampling: fill first, then replace with prob k/i
+        free = MEDIAN_SAMPLE_SIZE - len(reservoir)
+        if free > 0:
+            reservoir = np.concatenate([reservoir, z[:free]])
+        if chunk_n > free:
+            rest = z[max(free, 0):]
+            seen = n + max(free, 0) + np.arange(1, len(rest) + 1)
+            slots = (rng.random(len(rest)) * seen).astype(np.int64)
+            keep = slots < MEDIAN_SAMPLE_SIZE
+            reservoir[slots[keep]] = rest[keep]
+
+        n = total
+
+z_std = np.sqrt(z_m2 / n) if n else 0.0
+# O(N) selection instead of the full sort np.median performs
+if len(reservoir):
+    mid = len(reservoir) // 2
+    z_median = np.partition(reservoir, mid)[mid]
+else:
+    z_median = 0.0
+
+log.info("\n📊 BASIC INFO:")
+log.info("  Total points: %s", format(header.point_count, ","))
+log.info("  Point format: %s", header.point_format)
+
+log.info("\n🌍 SPATIAL BOUNDS:")
+log.info("  X (Easting):  %.2f to %.2f meters", header.x_min, header.x_max)
+log.info("  Y (Northing): %.2f to %.2f meters", header.y_min, header.y_max)
+log.info("  Z (Elevation): %.2f to %.2f meters", header.z_min, header.z_max)
+log.info("  Width:  %.2f meters", header.x_max - header.x_min)
+log.info("  Height: %.2f meters", header.y_max - header.y_min)
+log.info("  Elevation range: %.2f meters", header.z_max - header.z_min)
+
+log.info("\n📈 ELEVATION STATISTICS:")
+log.info("  Min elevation: %.2f m", z_min)
+log.info("  Max elevation: %.2f m", z_max)
+log.info("  Mean elevation: %.2f m", z_mean)
+log.info("  Median elevation: %.2f m", z_median)
+log.info("  Std deviation: %.2f m", z_std)
+log.info("  Total elevation change: %.2f m", z_max - z_min)
+
+log.info("\n📍 SAMPLE POINTS (first 10):")
+if sample_points is not None:
+    xs, ys, zs = sample_points
+    for i in range(len(zs)):
+        log.info("  Point %s: X=%.2f, Y=%.2f, Z=%.2f", i + 1, xs[i], ys[i], zs[i])
+
+log.info("\n🎯 ELEVATION DISTRIBUTION:")
+bin_edges = bins
+
+log.info("  Elevation range    | Point count")
+log.info("  %s+%s", "-" * 20, "-" * 15)
+# Bars and thousands-separated counts are only built when they'll be shown
+if log.isEnabledFor(logging.INFO):
+    hist_max = max(hist)
+    for i in range(len(hist)):
+        bar = "█" * int(hist[i] / hist_max * 30)
+        log.info(
+            "  %6.2f - %6.2f m | %s %s",
+            bin_edges[i],
+            bin_edges[i + 1],
+            format(hist[i], "7,"),
+            bar,
+        )
+
+log.info("\n🔍 DIAGNOSIS:")
+elevation_range = z_max - z_min
 
 if elevation_range < 5:
-    print(f"  ⚠️  VERY FLAT TERRAIN!")
-    print(
-        f"     The LiDAR file covers a nearly flat area with only {elevation_range:.2f}m elevation change."
+    log.warning("  ⚠️  VERY FLAT TERRAIN!")
+    log.info(
+        "     The LiDAR file covers a nearly flat area with only %.2fm elevation change.",
+        elevation_range,
     )
-    print(f"     This is normal for small urban areas or flat terrain.")
+    log.info("     This is normal for small urban areas or flat terrain.")
 elif elevation_range < 20:
-    print(f"  ℹ️  GENTLY SLOPING TERRAIN")
-    print(
-        f"     The area has {elevation_range:.2f}m elevation change - moderate slopes."
+    log.info("  ℹ️  GENTLY SLOPING TERRAIN")
+    log.info(
+        "     The area has %.2fm elevation change - moderate slopes.",
+        elevation_range,
     )
 else:
-    print(f"  ✅ SIGNIFICANT ELEVATION CHANGE")
-    print(
-        f"     The area has {elevation_range:.2f}m elevation change - good for visualization!"
+    log.info("  ✅ SIGNIFICANT ELEVATION CHANGE")
+    log.info(
+        "     The area has %.2fm elevation change - good for visualization!",
+        elevation_range,
     )
 
-print(f"\n💡 RECOMMENDATION:")
+log.info("\n💡 RECOMMENDATION:")
 if elevation_range < 5:
-    print(f"  - This LiDAR file is for a small, flat area")
-    print(f"  - The elevation profile will appear nearly flat (this is correct!)")
-    print(
-        f"  - Consider using a different LiDAR file if you need more elevation change"
+    log.info("  - This LiDAR file is for a small, flat area")
+    log.info("  - The elevation profile will appear nearly flat (this is correct!)")
+    log.info(
+        "  - Consider using a different LiDAR file if you need more elevation change",
     )
 else:
-    print(f"  - The elevation data looks good for visualization")
-    print(f"  - Make sure the chart Y-axis is properly scaled")
+    log.info("  - The elevation data looks good for visualization")
+    log.info("  - Make sure the chart Y-axis is properly scaled")
 
-print("\n" + "=" * 60)
+log.info("\n" + "=" * 60)
@@ -13,50 +13,56 @@ def inspect_las_file(las_path):
     print(f"Inspecting: {os.path.basename(las_path)}")
     print(f"{'='*60}")
 
-    las_data = laspy.read(las_path)
+    # Only the header and a 5-point sample are needed, so avoid decoding
+    # (and scaling) the whole point cloud
+    with laspy.open(las_path) as reader:
+        header = reader.header
+        sample = next(reader.chunk_iterator(5), None)
 
     print(f"\n📊 BASIC INFO:")
-    print(f"  Point format: {las_data.point_format}")
-    print(f"  Total points: {len(las_data.points):,}")
-    print(f"  LAS version: {las_data.header.version}")
+    print(f"  Point format: {header.point_format}")
+    print(f"  Total points: {header.point_count:,}")
+    print(f"  LAS version: {header.version}")
 
     print(f"\n📐 AVAILABLE DIMENSIONS:")
-    dims = list(las_data.point_format.dimension_names)
+    dims = list(header.point_format.dimension_names)
     for dim in dims:
         print(f"  - {dim}")
 
     print(f"\n🌍 COORDINATE SYSTEM INFO:")
-    print(f"  X range: {las_data.header.x_min:.2f} to {las_data.header.x_max:.2f}")
-    print(f"  Y range: {las_data.header.y_min:.2f} to {las_data.header.y_max:.2f}")
-    print(
-        f"  Z range (elevation): {las_data.header.z_min:.2f} to {las_data.header.z_max:.2f}"
-    )
+    print(f"  X range: {header.x_min:.2f} to {header.x_max:.2f}")
+    print(f"  Y range: {header.y_min:.2f} to {header.y_max:.2f}")
+    print(f"  Z range (elevation): {header.z_min:.2f} to {header.z_max:.2f}")
 
     print(f"\n🔢 SCALE & OFFSET:")
-    print(f"  X scale: {las_data.header.x_scale}, offset: {las_data.header.x_offset}")
-    print(f"  Y scale: {las_data.header.y_scale}, offset: {las_data.header.y_offset}")
-    print(f"  Z scale: {las_data.header.z_scale}, offset: {las_data.header.z_offset}")
+    print(f"  X scale: {header.x_scale}, offset: {header.x_offset}")
+    print(f"  Y scale: {header.y_scale}, offset: {header.y_offset}")
+    print(f"  Z scale: {header.z_scale}, offset: {header.z_offset}")
+
+    if sample is None or len(sample) == 0:
+        print(f"\n⚠️  File contains no points")
+        return header, sample
 
     print(f"\n📍 FIRST 5 POINTS SAMPLE:")
-    print(f"  X: {las_data.x[:5]}")
-    print(f"  Y: {las_data.y[:5]}")
-    print(f"  Z: {las_data.z[:5]}")
+    print(f"  X: {sample.x[:5]}")
+    print(f"  Y: {sample.y[:5]}")
+    print(f"  Z: {sample.z[:5]}")
 
     # Try to get CRS
     try:
-        crs = las_data.header.parse_crs()
+        crs = header.parse_crs()
         print(f"\n🗺️  CRS FOUND: {crs}")
     except Exception as e:
         print(f"\n⚠️  No CRS information found: {e}")
 
     # Check if coordinates look like lat/lon or projected
-    x_sample = las_data.x[0]
+    x_sample = sample.x[0]
     if -180 <= x_sample <= 180:
         print(f"\n💡 Coordinates appear to be in GEOGRAPHIC (lat/lon) format")
     else:
         print(f"\n💡 Coordinates appear to be in PROJECTED (e.g., UTM, MGA) format")
 
-    return las_data
+    return header, sample
 
 
 if __name__ == "__main__":
@@ -64,7 +70,7 @@ if __name__ == "__main__":
     las_file = os.path.join(os.path.dirname(__file__), "data", "LiDAR", "trail_1.las")
 
     if os.path.exists(las_file):
-        las_data = inspect_las_file(las_file)
+        header, sample = inspect_las_file(las_file)
 
         print(f"\n\n{'='*60}")
         print("SUMMARY: LiDAR Data Contains")
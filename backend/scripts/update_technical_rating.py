@@ -5,16 +5,23 @@ This fixes the issue where all trails were showing 10/10 technical rating.
 """
 
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import sys
+from collections import Counter
+import numpy as np
 
-# Load environment variables
-load_dotenv()
+# Make the backend package importable when run as scripts/update_technical_rating.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Initialize Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY") 
-supabase: Client = create_client(supabase_url, supabase_key)
+from utils.db import get_supabase
+
+# Shared Supabase client
+supabase = get_supabase()
+
+# Maximum rows per PostgREST upsert request
+UPSERT_BATCH_SIZE = 500
+
+# Only the columns the rating formula and the report need
+TRAIL_RATING_COLUMNS = "id,name,max_slope,avg_slope,rolling_hills_index,technical_rating"
 
 def calculate_technical_rating(max_slope, avg_slope, rolling_hills_index):
     """
@@ -42,42 +49,76 @@ def calculate_technical_rating(max_slope, avg_slope, rolling_hills_index):
     
     return technical_rating
 
+def calculate_technical_ratings(trails):
+    """
+    Vectorized calculate_technical_rating for a list of trail rows.
+    Returns a list of ints (1-10) in the same order as `trails`.
+    """
+    max_slope = np.array([t.get('max_slope') or 0 for t in trails], dtype=float)
+    avg_slope = np.array([t.get('avg_slope') or 0 for t in trails], dtype=float)
+    rolling_hills_index = np.array([t.get('rolling_hills_index') or 0 for t in trails], dtype=float)
+    
+    # Same formula as calculate_technical_rating; np.round matches round()'s half-to-even
+    technical_rating = np.clip(
+        1 + (max_slope / 100) * 3.5
+        + np.minimum(rolling_hills_index / 50, 1.0) * 3.5
+        + (avg_slope / 30) * 2.0,
+        1.0,
+        10.0,
+    )
+    return np.round(technical_rating).astype(int).tolist()
+
 def update_all_technical_ratings():
     """Update technical ratings for all trails in the database."""
     
     print("🔄 Fetching all trails from database...")
     
     # Fetch all trails
-    response = supabase.table('trails').select('*').execute()
+    response = supabase.table('trails').select(TRAIL_RATING_COLUMNS).execute()
     trails = response.data
     
     print(f"📊 Found {len(trails)} trails to update")
     print("=" * 80)
     
-    updated_count = 0
+    # Calculate new technical ratings for every trail at once
+    new_ratings = calculate_technical_ratings(trails)
+    
+    # name is NOT NULL without a default, so the upsert's insert half needs it
+    updates = [
+        {'id': trail['id'], 'name': trail['name'], 'technical_rating': rating}
+        for trail, rating in zip(trails, new_ratings)
+    ]
     
-    for trail in trails:
-        trail_id = trail['id']
+    # Write them back in a few bulk upserts instead of one UPDATE per trail
+    updated_ids = set()
+    for i in range(0, len(updates), UPSERT_BATCH_SIZE):
+        batch = updates[i : i + UPSERT_BATCH_SIZE]
+        try:
+            upsert_response = supabase.table('trails').upsert(batch).execute()
+        except Exception as e:
+            print(f"❌ Failed to update batch starting at {i}: {e}")
+            continue
+        updated_ids.update(row['id'] for row in upsert_response.data or [])
+    
+    updated_count = 0
+    rating_counts = Counter()
+    for trail, update in zip(trails, updates):
         name = trail['name']
         max_slope = trail.get('max_slope')
-        avg_slope = trail.get('avg_slope')  
+        avg_slope = trail.get('avg_slope')
         rolling_hills_index = trail.get('rolling_hills_index')
         old_rating = trail.get('technical_rating')
+        new_rating = update['technical_rating']
         
-        # Calculate new technical rating
-        new_rating = calculate_technical_rating(max_slope, avg_slope, rolling_hills_index)
-        
-        # Update in database
-        update_response = supabase.table('trails').update({
-            'technical_rating': new_rating
-        }).eq('id', trail_id).execute()
-        
-        if update_response.data:
+        if trail['id'] in updated_ids:
             updated_count += 1
+            rating_counts[new_rating] += 1
             print(f"✅ {name[:30]:30} | Old: {old_rating:2}/10 -> New: {new_rating:2}/10")
             print(f"   {'':30} | Max slope: {max_slope:.1f}% | Avg slope: {avg_slope:.1f}% | Rolling: {rolling_hills_index:.1f}")
             print()
         else:
+            # Failed updates keep their old rating in the distribution
+            rating_counts[old_rating] += 1
             print(f"❌ Failed to update {name}")
     
     print("=" * 80)
@@ -87,16 +128,6 @@ def update_all_technical_ratings():
     print("\n📈 Technical Rating Distribution:")
     print("-" * 40)
     
-    # Fetch updated trails
-    response = supabase.table('trails').select('name, technical_rating').execute()
-    updated_trails = response.data
-    
-    # Group by rating
-    rating_counts = {}
-    for trail in updated_trails:
-        rating = trail['technical_rating']
-        rating_counts[rating] = rating_counts.get(rating, 0) + 1
-    
     for rating in sorted(rating_counts.keys()):
         count = rating_counts[rating]
         print(f"Rating {rating}/10: {count} trail{'s' if count != 1 else ''}")
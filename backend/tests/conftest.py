@@ -2,14 +2,70 @@
 Test configuration and fixtures for pytest
 """
 import pytest
+import numpy as np
 import sys
 import os
+from types import SimpleNamespace
 from unittest.mock import Mock, MagicMock
+from fastapi.testclient import TestClient
 
 # Add backend directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 
+def pytest_collection_modifyitems(config, items):
+    """Keep @pytest.mark.serial tests together on a single xdist worker"""
+    for item in items:
+        if item.get_closest_marker("serial"):
+            item.add_marker(pytest.mark.xdist_group("serial"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    FastAPI test client, built once per test session (per xdist worker)
+
+    Route tests only patch the Supabase clients the routes import, so the
+    app itself can be shared rather than set up again for every test.
+    `main` is imported here rather than at module level because importing it
+    requires Supabase credentials, which the pure unit tests don't need.
+    """
+    from main import app
+
+    return TestClient(app)
+
+
+class FakeSupabase:
+    """
+    Lightweight stand-in for a Supabase client's query builder
+
+    Every builder call (table, select, eq, order, ...) returns the fake
+    itself and is recorded in `calls`; each execute() returns the next
+    preset response, repeating the last one once the queue is down to it.
+    """
+
+    def __init__(self, *responses):
+        self._responses = list(responses) or [[]]
+        self.calls = []
+
+    def __getattr__(self, name):
+        def builder(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return builder
+
+    def execute(self):
+        data = self._responses.pop(0) if len(self._responses) > 1 else self._responses[0]
+        return SimpleNamespace(data=data, count=len(data))
+
+
+@pytest.fixture
+def fake_supabase():
+    """Factory for FakeSupabase clients: fake_supabase(first_data, second_data, ...)"""
+    return FakeSupabase
+
+
 @pytest.fixture
 def mock_supabase():
     """Mock Supabase client"""
@@ -63,6 +119,12 @@ def sample_elevations():
     return [100, 110, 105, 120, 115, 130, 125, 140, 135, 150]
 
 
+@pytest.fixture
+def sample_elevations_np(sample_elevations):
+    """Sample elevation data as a pre-built float32 array"""
+    return np.asarray(sample_elevations, dtype=np.float32)
+
+
 @pytest.fixture
 def sample_coordinates():
     """Sample GPS coordinates for testing"""
@@ -73,3 +135,102 @@ def sample_coordinates():
         [-27.4720, 152.9645],
         [-27.4725, 152.9650],
     ]
+
+
+@pytest.fixture
+def synthetic_dem(tmp_path):
+    """
+    Small 1 m GeoTIFF DEM (EPSG:28356) centred on sample_coordinates[0]
+
+    Smooth rolling surface with a NaN hole and a -9999 strip, like the
+    nodata areas in the QSpatial tiles. Returns the .tif path.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+    from pyproj import Transformer
+
+    size = 800
+    cx, cy = Transformer.from_crs(4326, 28356, always_xy=True).transform(
+        152.9629, -27.4705
+    )
+    rows, cols = np.mgrid[0:size, 0:size]
+    elevation = (
+        50 + 20 * np.sin(cols / 60.0) + 15 * np.cos(rows / 45.0) + 0.01 * cols
+    ).astype(np.float32)
+    elevation[100:140, 200:260] = np.nan
+    elevation[500:520, :30] = -9999
+
+    path = tmp_path / "synthetic_dem.tif"
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        height=size,
+        width=size,
+        count=1,
+        dtype="float32",
+        crs="EPSG:28356",
+        transform=from_origin(cx - size / 2, cy + size / 2, 1.0, 1.0),
+    ) as dst:
+        dst.write(elevation, 1)
+    return str(path)
+
+
+@pytest.fixture
+def split_dem(synthetic_dem, tmp_path):
+    """synthetic_dem cut into two side-by-side tiles (west, east)"""
+    import rasterio
+    from rasterio.windows import Window
+
+    paths = []
+    with rasterio.open(synthetic_dem) as src:
+        for name, window in [
+            ("west.tif", Window(0, 0, 437, src.height)),
+            ("east.tif", Window(437, 0, src.width - 437, src.height)),
+        ]:
+            profile = dict(
+                src.profile,
+                width=int(window.width),
+                height=int(window.height),
+                transform=src.window_transform(window),
+            )
+            path = str(tmp_path / name)
+            with rasterio.open(path, "w", **profile) as dst:
+                dst.write(src.read(1, window=window), 1)
+            paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def synthetic_las(tmp_path):
+    """
+    Small LAS point cloud (EPSG:28356) centred on sample_coordinates[0]
+
+    120 m x 120 m of random points: ~60% ground (class 2) on a smooth
+    surface, the rest vegetation (class 5) 1-15 m above it. Returns the
+    .las path.
+    """
+    import laspy
+    from pyproj import Transformer
+
+    rng = np.random.default_rng(0)
+    n = 60_000
+    cx, cy = Transformer.from_crs(4326, 28356, always_xy=True).transform(
+        152.9629, -27.4705
+    )
+    x = cx + rng.uniform(-60, 60, n)
+    y = cy + rng.uniform(-60, 60, n)
+    ground = 40 + 5 * np.sin((x - cx) / 15.0) + 3 * np.cos((y - cy) / 10.0)
+    classification = np.where(rng.random(n) < 0.6, 2, 5).astype(np.uint8)
+    z = np.where(classification == 2, ground, ground + rng.uniform(1, 15, n))
+
+    header = laspy.LasHeader(point_format=3, version="1.2")
+    header.offsets = [np.floor(x.min()), np.floor(y.min()), 0.0]
+    header.scales = [0.001, 0.001, 0.001]
+    las = laspy.LasData(header)
+    las.x, las.y, las.z = x, y, z
+    las.classification = classification
+
+    path = tmp_path / "synthetic.las"
+    las.write(path)
+    return str(path)
@@ -2,12 +2,21 @@
 Unit tests for utils/calculations.py
 """
 import pytest
+import numpy as np
 from utils.calculations import (
+    PLANAR_MAX_DEGREES,
     haversine,
+    haversine_array,
+    haversine_planar,
+    distance,
+    distance_array,
+    cumulative_distances,
     count_rolling_hills,
     analyze_rolling_hills,
     calculate_trail_similarity,
+    calculate_trail_similarity_batch,
 )
+from utils._jit import _count_hills_jit, _cumulative_distance_loop
 
 
 class TestHaversine:
@@ -31,6 +40,81 @@ class TestHaversine:
         assert result > 15000  # Should be over 15,000 km
 
 
+class TestHaversineArray:
+    """Tests for vectorized haversine and cumulative distances"""
+
+    def test_matches_scalar(self, sample_coordinates):
+        """Vectorized distances should match the scalar function"""
+        lats = [c[0] for c in sample_coordinates]
+        lons = [c[1] for c in sample_coordinates]
+        result = haversine_array(lats[:-1], lons[:-1], lats[1:], lons[1:])
+        expected = [
+            haversine(lats[i], lons[i], lats[i + 1], lons[i + 1])
+            for i in range(len(lats) - 1)
+        ]
+        assert result == pytest.approx(expected)
+
+    def test_cumulative_distances(self, sample_coordinates):
+        """Cumulative distances should start at 0 and increase"""
+        result = cumulative_distances(sample_coordinates)
+        assert len(result) == len(sample_coordinates)
+        assert result[0] == 0
+        assert all(b > a for a, b in zip(result, result[1:]))
+
+    def test_cumulative_distances_single_point(self):
+        """A single point has zero distance"""
+        assert list(cumulative_distances([[-27.47, 152.96]])) == [0.0]
+
+    def test_cumulative_distance_kernel(self):
+        """The compiled kernel should match distance_array, across GPS gaps too"""
+        lats = np.array([-27.4705, -27.4710, -27.4715, -27.30, -27.3005])
+        lons = np.array([152.9629, 152.9635, 152.9640, 153.10, 153.1004])
+        expected = np.concatenate(
+            ([0.0], np.cumsum(distance_array(lats[:-1], lons[:-1], lats[1:], lons[1:])))
+        )
+
+        result = _cumulative_distance_loop(lats, lons, PLANAR_MAX_DEGREES)
+
+        assert result == pytest.approx(expected, rel=1e-12)
+        assert list(_cumulative_distance_loop(lats[:1], lons[:1], PLANAR_MAX_DEGREES)) == [0.0]
+
+
+class TestPlanarDistance:
+    """Tests for the small-distance planar approximation and its dispatch"""
+
+    @pytest.mark.parametrize(
+        "lat1,lon1,lat2,lon2",
+        [
+            (-27.47, 152.96, -27.4705, 152.9606),  # ~80 m
+            (-27.47, 152.96, -27.52, 153.01),  # ~7 km
+            (64.1, -21.9, 64.15, -21.85),  # high latitude
+        ],
+    )
+    def test_planar_close_to_haversine(self, lat1, lon1, lat2, lon2):
+        """Planar distance should be within 0.1% of haversine under ~10 km"""
+        expected = haversine(lat1, lon1, lat2, lon2)
+        assert haversine_planar(lat1, lon1, lat2, lon2) == pytest.approx(
+            expected, rel=1e-3
+        )
+        assert distance(lat1, lon1, lat2, lon2) == pytest.approx(expected, rel=1e-3)
+
+    def test_far_points_use_haversine(self):
+        """Points further apart (or across the antimeridian) use haversine"""
+        assert distance(-27.47, 152.96, -33.87, 151.21) == haversine(
+            -27.47, 152.96, -33.87, 151.21
+        )
+        assert distance(0, 179.99, 0, -179.99) == pytest.approx(2224, abs=1)
+
+    def test_array_matches_scalar(self):
+        """distance_array should agree with distance for near and far pairs"""
+        lat1 = np.array([-27.47, -27.47, 0.0])
+        lon1 = np.array([152.96, 152.96, 179.99])
+        lat2 = np.array([-27.4705, -33.87, 0.0])
+        lon2 = np.array([152.9606, 151.21, -179.99])
+        expected = [distance(*p) for p in zip(lat1, lon1, lat2, lon2)]
+        assert distance_array(lat1, lon1, lat2, lon2) == pytest.approx(expected)
+
+
 class TestCountRollingHills:
     """Tests for rolling hills counting"""
 
@@ -67,6 +151,40 @@ class TestCountRollingHills:
         assert result["rolling_hills_index"] == 0
         assert result["rolling_hills_count"] == 0
 
+    def test_jit_kernel_matches(self, sample_elevations_np):
+        """The optional Numba kernel should count hills the same way"""
+        profiles = [
+            sample_elevations_np,
+            np.array([100, 120, 110, 130, 115, 135, 120, 140], dtype=np.float64),
+            np.array([100, 100.5, 101, 101.5, 101, 100.5, 100]),
+        ]
+        for elev in profiles:
+            assert _count_hills_jit(elev) == count_rolling_hills(list(elev))
+
+    def test_gradual_peak_not_counted(self):
+        """Peaks count by the step to a neighbor, not topographic prominence"""
+        # 1.5 m of prominence, but no single step reaches the 1 m threshold
+        elevations = [100, 100.5, 101, 101.5, 101, 100.5, 100]
+        assert count_rolling_hills(elevations) == 0
+
+    @pytest.mark.parametrize("dtype", [None, np.float32, np.float64])
+    def test_exact_one_meter_step_counted(self, dtype):
+        """A recorded 1.0 m step is significant whatever the float rounding"""
+        # 3.1 -> 4.1 rounds below 1 m in float64, 0.3 -> 1.3 in float32
+        for low, high in [(3.1, 4.1), (0.3, 1.3)]:
+            elevations = [low, high, low]
+            if dtype is not None:
+                elevations = np.array(elevations, dtype=dtype)
+            assert count_rolling_hills(elevations) == 1
+
+    @pytest.mark.parametrize(
+        "fixture_name", ["sample_elevations", "sample_elevations_np"]
+    )
+    def test_list_and_array_inputs(self, fixture_name, request):
+        """Lists and ndarrays should give the same hill count"""
+        elevations = request.getfixturevalue(fixture_name)
+        assert count_rolling_hills(elevations) == 8
+
 
 class TestAnalyzeRollingHills:
     """Tests for detailed rolling hills analysis"""
@@ -157,6 +275,34 @@ class TestCalculateTrailSimilarity:
         result = calculate_trail_similarity(trail1, trail2)
         assert 0.8 < result < 0.95
 
+    def test_batch_matches_pairwise(self):
+        """Batch scores should equal pairwise scores, in input order"""
+        target = {
+            "distance": 5.0,
+            "elevation_gain": 200,
+            "difficulty_score": 6.5,
+            "rolling_hills_index": 0.5,
+        }
+        candidates = [
+            dict(target),
+            {
+                "distance": 5.5,
+                "elevation_gain": 220,
+                "difficulty_score": 6.8,
+                "rolling_hills_index": 0.55,
+                "surface_difficulty_score": 1.3,
+            },
+            {
+                "distance": 20.0,
+                "elevation_gain": 1000,
+                "difficulty_score": 9.0,
+                "rolling_hills_index": 0.9,
+            },
+        ]
+        result = calculate_trail_similarity_batch(target, candidates)
+        expected = [calculate_trail_similarity(target, c) for c in candidates]
+        assert list(result) == pytest.approx(expected)
+
     def test_missing_fields(self):
         """Should handle missing fields gracefully"""
         trail1 = {"distance": 5.0}
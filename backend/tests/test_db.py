@@ -0,0 +1,38 @@
+"""
+Unit tests for utils/db.py
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+from utils import db
+
+
+@pytest.fixture(autouse=True)
+def clear_client_cache():
+    """Each test starts without a cached client"""
+    db.get_supabase.cache_clear()
+    yield
+    db.get_supabase.cache_clear()
+
+
+class TestGetSupabase:
+    """Tests for the shared Supabase client"""
+
+    @patch("utils.db.create_client")
+    def test_client_is_reused(self, mock_create_client, monkeypatch):
+        """Repeated calls should return one client"""
+        monkeypatch.setenv("SUPABASE_URL", "http://localhost:1")
+        monkeypatch.setenv("SUPABASE_KEY", "key")
+        mock_create_client.return_value = MagicMock()
+
+        assert db.get_supabase() is db.get_supabase()
+        mock_create_client.assert_called_once_with("http://localhost:1", "key")
+
+    @patch("utils.db.load_dotenv")
+    def test_missing_credentials(self, mock_load_dotenv, monkeypatch):
+        """Missing credentials should raise"""
+        monkeypatch.delenv("SUPABASE_URL", raising=False)
+        monkeypatch.delenv("SUPABASE_KEY", raising=False)
+
+        with pytest.raises(Exception):
+            db.get_supabase()
@@ -2,7 +2,19 @@
 Unit tests for utils/dem_processing.py
 """
 import pytest
-from utils.dem_processing import find_relevant_dem_tiles, process_dem_for_trail
+import os
+import numpy as np
+from unittest.mock import patch
+from utils import dem_processing
+from utils.dem_processing import (
+    find_relevant_dem_tiles,
+    process_dem_for_trail,
+    _get_transformer,
+    _bilinear_sample,
+    _nearest_valid_cells,
+    _surface_grid_size,
+)
+from utils._jit import _bilinear_sample_loop, _nearest_valid_loop
 
 
 class TestFindRelevantDemTiles:
@@ -43,6 +55,165 @@ class TestFindRelevantDemTiles:
         assert isinstance(result, list)
 
 
+    def test_filters_tiles_by_bounds(self, synthetic_dem):
+        """Only tiles intersecting the trail's bounding box should be returned"""
+        dem_dir = os.path.dirname(synthetic_dem)
+
+        inside = find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+        outside = find_relevant_dem_tiles([[-27.60, 153.10]], dem_dir=dem_dir)
+
+        assert inside == [synthetic_dem]
+        assert outside == []
+
+    def test_bounds_index_reused(self, synthetic_dem):
+        """Tile bounds should be read once, then served from the JSON index"""
+        dem_dir = os.path.dirname(synthetic_dem)
+        find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+        assert os.path.exists(os.path.join(dem_dir, dem_processing.DEM_INDEX_FILENAME))
+
+        with patch.object(
+            dem_processing, "_tile_bounds_wgs84", side_effect=AssertionError
+        ):
+            result = find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+        assert result == [synthetic_dem]
+
+    def test_unreadable_tile_not_reopened(self, synthetic_dem):
+        """A tile whose bounds can't be read should be skipped until it changes"""
+        dem_dir = os.path.dirname(synthetic_dem)
+        broken = os.path.join(dem_dir, "broken.tif")
+        with open(broken, "wb") as f:
+            f.write(b"not a GeoTIFF")
+
+        result = find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+        assert result == [synthetic_dem]
+        assert not [n for n in os.listdir(dem_dir) if n.endswith(".tmp")]
+
+        with patch.object(
+            dem_processing, "_tile_bounds_wgs84", side_effect=AssertionError
+        ):
+            result = find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+        assert result == [synthetic_dem]
+
+    def test_directory_listing_cached(self, synthetic_dem, split_dem):
+        """The tile directory should only be listed again after it changes"""
+        dem_dir = os.path.dirname(synthetic_dem)
+        # The first call also creates the bounds index, which touches the dir
+        for _ in range(2):
+            find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+
+        with patch.object(dem_processing.glob, "glob", side_effect=AssertionError):
+            result = find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+        assert synthetic_dem in result
+
+        os.remove(synthetic_dem)
+        result = find_relevant_dem_tiles([[-27.4705, 152.9629]], dem_dir=dem_dir)
+        assert synthetic_dem not in result
+        assert result
+
+
+class TestGetTransformer:
+    """Tests for the cached CRS transformer"""
+
+    def test_transformer_is_cached(self):
+        """The same CRS pair should reuse one transformer"""
+        from rasterio.crs import CRS
+
+        wkt = CRS.from_epsg(28356).to_wkt()
+        assert _get_transformer(wkt, 4326) is _get_transformer(wkt, 4326)
+
+    def test_matches_rasterio_warp(self):
+        """Cached transformer should agree with rasterio.warp.transform"""
+        from rasterio.crs import CRS
+        from rasterio.warp import transform
+
+        xs, ys = [496000.0, 497500.0], [6961000.0, 6962000.0]
+        expected_lon, expected_lat = transform(
+            CRS.from_epsg(28356), CRS.from_epsg(4326), xs, ys
+        )
+        lon, lat = _get_transformer(CRS.from_epsg(28356).to_wkt(), 4326).transform(
+            xs, ys
+        )
+        assert lon == pytest.approx(expected_lon, abs=1e-9)
+        assert lat == pytest.approx(expected_lat, abs=1e-9)
+
+
+class TestValidElevationMask:
+    """Tests for the DEM nodata mask"""
+
+    def test_mask_values(self):
+        """NaN, infinities and fill values should be masked out"""
+        elevation = np.array(
+            [np.nan, np.inf, -np.inf, -9999.0, -10000.0, -9998.5, 0.0, 120.5],
+            dtype=np.float32,
+        )
+        expected = [False, False, False, False, False, True, True, True]
+        assert dem_processing._valid_elevation_mask(elevation).tolist() == expected
+
+
+class TestBilinearSample:
+    """Tests for regular-grid bilinear interpolation"""
+
+    @pytest.mark.parametrize("sampler", [_bilinear_sample, _bilinear_sample_loop])
+    def test_matches_regular_grid_interpolator(self, sampler):
+        """Should agree with scipy's linear RegularGridInterpolator"""
+        from scipy.interpolate import RegularGridInterpolator
+
+        rng = np.random.default_rng(0)
+        grid = rng.uniform(0, 100, (12, 9))
+        rows = rng.uniform(0, 11, 200)
+        cols = rng.uniform(0, 8, 200)
+        rows[:2], cols[:2] = 11.0, 8.0  # exact far edges
+
+        expected = RegularGridInterpolator((np.arange(12), np.arange(9)), grid)(
+            np.column_stack((rows, cols))
+        )
+        assert sampler(grid, rows, cols) == pytest.approx(expected)
+
+    def test_outside_and_nodata_are_nan(self):
+        """Samples off the grid or touching a NaN cell should be NaN"""
+        grid = np.arange(16, dtype=float).reshape(4, 4)
+        grid[0, 0] = np.nan
+        result = _bilinear_sample(
+            grid, np.array([-0.5, 1.0, 0.5, 2.5]), np.array([1.0, 3.5, 0.5, 2.5])
+        )
+        assert np.isnan(result[:3]).all()
+        assert result[3] == pytest.approx(12.5)
+
+
+class TestNearestValidCells:
+    """Tests for the NaN-fill nearest-cell lookup"""
+
+    def test_kernel_matches_distance_transform(self):
+        """The brute-force kernel should agree with the EDT fallback"""
+        rng = np.random.default_rng(0)
+        valid = rng.random((40, 50)) > 0.7
+        rows, cols = np.nonzero(valid)
+        q_rows = np.array([0, 5, 39, 20])
+        q_cols = np.array([0, 49, 7, 25])
+
+        idx = _nearest_valid_loop(rows, cols, q_rows, q_cols)
+        with patch.object(dem_processing, "NUMBA_AVAILABLE", False):
+            edt_rows, edt_cols = _nearest_valid_cells(valid, rows, cols, q_rows, q_cols)
+
+        # Ties may pick different cells, so compare distances
+        brute_d = (rows[idx] - q_rows) ** 2 + (cols[idx] - q_cols) ** 2
+        edt_d = (edt_rows - q_rows) ** 2 + (edt_cols - q_cols) ** 2
+        np.testing.assert_array_equal(brute_d, edt_d)
+        assert valid[rows[idx], cols[idx]].all()
+
+
+class TestSurfaceGridSize:
+    """Tests for sizing the surface grid to the DEM samples"""
+
+    @pytest.mark.parametrize(
+        "n_samples, expected",
+        [(100, 16), (1600, 20), (3600, 30), (1_000_000, 30)],
+    )
+    def test_grid_size(self, n_samples, expected):
+        """About half the samples per axis, clamped to 16..30"""
+        assert _surface_grid_size(n_samples) == expected
+
+
 class TestProcessDemForTrail:
     """Tests for processing DEM data for a trail"""
 
@@ -77,3 +248,93 @@ class TestProcessDemForTrail:
         result = process_dem_for_trail(trail_coords, dem_files)
         
         assert result is not None
+
+    def test_surface_from_dem(self, synthetic_dem):
+        """Should build a square surface and drape the trail over it"""
+        trail_coords = [
+            [-27.4705 + 0.0005 * np.sin(i / 10), 152.9609 + 0.00002 * i]
+            for i in range(200)
+        ]
+        result = process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=1)
+
+        assert result is not None
+        grid_size = result["metadata"]["grid_size"]
+        z = np.array(result["surface"]["z"], dtype=float)
+        assert z.shape == (grid_size, grid_size)
+        assert len(result["surface"]["x"]) == len(result["surface"]["y"]) == grid_size
+        assert not np.isnan(z).any()
+        # Nodata pixels (NaN, -9999) must not leak into the surface
+        assert 15 < result["surface"]["bounds"]["z_min"] < 95
+        assert result["trail_line"]
+        bounds = result["surface"]["bounds"]
+        for point in result["trail_line"]:
+            assert bounds["x_min"] <= point["x"] <= bounds["x_max"]
+            assert bounds["y_min"] <= point["y"] <= bounds["y_max"]
+
+    def test_coarse_dem_gets_smaller_grid(self, synthetic_dem):
+        """Fewer DEM samples should give a smaller grid, reported in metadata"""
+        trail_coords = [
+            [-27.4705 + 0.0005 * np.sin(i / 10), 152.9609 + 0.00002 * i]
+            for i in range(200)
+        ]
+        fine = process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=1)
+        coarse = process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=8)
+
+        fine_size = fine["metadata"]["grid_size"]
+        coarse_size = coarse["metadata"]["grid_size"]
+        assert 16 <= coarse_size < fine_size <= 30
+        assert np.array(coarse["surface"]["z"]).shape == (coarse_size, coarse_size)
+
+    def test_reads_only_trail_window(self, synthetic_dem):
+        """The surface should cover the padded trail bbox, not the whole tile"""
+        trail_coords = [[-27.4705, 152.9619], [-27.4700, 152.9639]]
+        tile_bounds = dem_processing._tile_bounds_wgs84(synthetic_dem)
+
+        result = process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=1)
+
+        bounds = result["surface"]["bounds"]
+        assert tile_bounds[0] < bounds["x_min"] < 152.9619
+        assert 152.9639 < bounds["x_max"] < tile_bounds[2]
+        assert tile_bounds[1] < bounds["y_min"] < -27.4705
+        assert -27.4700 < bounds["y_max"] < tile_bounds[3]
+
+    def test_results_memoized(self, synthetic_dem):
+        """Repeat calls should reuse the result until the tile changes"""
+        trail_coords = [[-27.4705, 152.9619], [-27.4700, 152.9639]]
+        first = process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=1)
+        first["trail_line"].clear()  # callers get a copy, not the cached dict
+
+        with patch.object(
+            dem_processing, "_build_dem_surface", side_effect=AssertionError
+        ):
+            second = process_dem_for_trail(
+                trail_coords, [synthetic_dem], resolution_factor=1
+            )
+        assert second["trail_line"]
+
+        os.utime(synthetic_dem, (0, 0))
+        with patch.object(
+            dem_processing, "_build_dem_surface", return_value=None
+        ) as build:
+            process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=1)
+        build.assert_called_once()
+
+    def test_trail_line_every_fifth_point(self, synthetic_dem):
+        """Trail line should sample every 5th point; extra columns are ignored"""
+        trail_coords = [[-27.4705, 152.9609 + 0.0001 * i, 42.0] for i in range(23)]
+        result = process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=1)
+
+        xs = [point["x"] for point in result["trail_line"]]
+        assert xs == pytest.approx([c[1] for c in trail_coords[::5]])
+        assert all(isinstance(point["z"], float) for point in result["trail_line"])
+
+    def test_trail_across_tiles(self, synthetic_dem, split_dem):
+        """A trail over two tiles should match the same area read from one tile"""
+        trail_coords = [[-27.4705, 152.9609 + 0.00002 * i] for i in range(200)]
+
+        whole = process_dem_for_trail(trail_coords, [synthetic_dem], resolution_factor=1)
+        split = process_dem_for_trail(trail_coords, split_dem, resolution_factor=1)
+
+        assert split["surface"]["bounds"] == whole["surface"]["bounds"]
+        assert split["surface"]["z"] == whole["surface"]["z"]
+        assert split["trail_line"] == whole["trail_line"]
@@ -0,0 +1,497 @@
+"""
+Unit tests for utils/lidar_extraction.py
+"""
+import pytest
+import os
+import shutil
+import numpy as np
+import laspy
+from pyproj import Transformer
+
+from unittest.mock import patch
+
+from utils import lidar_extraction
+from utils.lidar_extraction import (
+    LiDARExtractor,
+    _read_ground_points,
+    _build_point_grid,
+    _grid_min_z,
+    _kdtree_min_z,
+)
+from utils._jit import _grid_min_z_loop
+
+
+@pytest.fixture(autouse=True)
+def clear_tile_cache():
+    """Each test starts without cached LiDAR tiles"""
+    lidar_extraction._load_ground_points.cache_clear()
+    lidar_extraction._load_point_grid.cache_clear()
+    yield
+    lidar_extraction._load_ground_points.cache_clear()
+    lidar_extraction._load_point_grid.cache_clear()
+
+
+@pytest.fixture
+def extractor(tmp_path):
+    """Extractor with an empty local cache and no database"""
+    return LiDARExtractor(str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def trail_coords():
+    """[lat, lon] line crossing synthetic_las west to east"""
+    return [[-27.4705 + 0.0001 * np.sin(i / 5), 152.9624 + 0.00001 * i] for i in range(100)]
+
+
+@pytest.fixture
+def relative_las(tmp_path):
+    """Ground-only LAS in local coordinates around (0, 0), 1,050 points along X"""
+    rng = np.random.default_rng(1)
+    n = 1050
+    header = laspy.LasHeader(point_format=3, version="1.2")
+    header.scales = [0.001, 0.001, 0.001]
+    las = laspy.LasData(header)
+    las.x = np.linspace(-100, 100, n)
+    las.y = rng.uniform(-0.01, 0.01, n)
+    las.z = 10 + rng.uniform(0, 2, n)
+    las.classification = np.full(n, 2, dtype=np.uint8)
+    path = tmp_path / "relative.las"
+    las.write(path)
+    return str(path)
+
+
+def _record(path):
+    return {"filename": path.rsplit("/", 1)[-1], "file_url": f"local://{path}"}
+
+
+def _brute_force_min_z(las_path, trail_coords, radius):
+    """Lowest ground point within radius of each trail point (NaN if none)"""
+    las = laspy.read(las_path)
+    ground = np.asarray(las.classification) == 2
+    x, y, z = (np.asarray(a)[ground] for a in (las.x, las.y, las.z))
+    transformer = Transformer.from_crs(4326, 28356, always_xy=True)
+    expected = []
+    for lat, lon in trail_coords:
+        qx, qy = transformer.transform(lon, lat)
+        near = (x - qx) ** 2 + (y - qy) ** 2 <= radius**2
+        expected.append(z[near].min() if near.any() else np.nan)
+    return np.array(expected)
+
+
+class TestExtractElevationProfile:
+    """Tests for LiDAR elevation profile extraction"""
+
+    @pytest.mark.parametrize("radius", [0.5, 2.0])
+    def test_lowest_ground_point_in_radius(self, extractor, synthetic_las, trail_coords, radius):
+        """Each elevation should be the lowest ground point within the radius"""
+        result = extractor.extract_elevation_profile(
+            trail_coords, lidar_record=_record(synthetic_las), search_radius=radius
+        )
+
+        assert result["success"]
+        expected = _brute_force_min_z(synthetic_las, trail_coords, radius)
+        assert not np.isnan(expected).all()
+        # Points with no LiDAR nearby repeat the previous elevation
+        first = int(np.argmax(~np.isnan(expected)))
+        for i in range(first + 1, len(expected)):
+            if np.isnan(expected[i]):
+                expected[i] = expected[i - 1]
+        np.testing.assert_allclose(result["elevations"], expected[first:], atol=1e-3)
+        assert result["coordinates"] == trail_coords[first:]
+
+    def test_points_before_first_match_dropped(self, extractor, synthetic_las, trail_coords):
+        """Trail points before the LiDAR coverage starts should be skipped"""
+        outside = [[-27.4705, 152.9500]] * 3
+        result = extractor.extract_elevation_profile(
+            outside + trail_coords, lidar_record=_record(synthetic_las)
+        )
+
+        assert result["success"]
+        assert result["coordinates"] == trail_coords
+        assert len(result["elevations"]) == len(trail_coords)
+
+    def test_tile_cached_between_calls(self, extractor, synthetic_las, trail_coords):
+        """A second trail on the same file should not read it again"""
+        first = extractor.extract_elevation_profile(
+            trail_coords, lidar_record=_record(synthetic_las)
+        )
+        with patch.object(laspy, "open", side_effect=AssertionError):
+            second = extractor.extract_elevation_profile(
+                trail_coords[::-1], lidar_record=_record(synthetic_las)
+            )
+
+        assert second["success"]
+        assert second["elevations"][::-1] == first["elevations"]
+
+    def test_ground_points_reloaded_from_sidecar(self, synthetic_las):
+        """After a restart the ground points should come from the side-car"""
+        mtime_ns = os.stat(synthetic_las).st_mtime_ns
+        first = lidar_extraction._load_ground_points(synthetic_las, mtime_ns)
+        assert os.path.isdir(synthetic_las + lidar_extraction.GROUND_SIDECAR_SUFFIX)
+
+        lidar_extraction._load_ground_points.cache_clear()
+        with patch.object(lidar_extraction, "_read_ground_points", side_effect=AssertionError):
+            second = lidar_extraction._load_ground_points(synthetic_las, mtime_ns)
+
+        assert isinstance(second[0], np.memmap)
+        assert second[3] == first[3]
+        for a, b in zip(first[:3], second[:3]):
+            np.testing.assert_array_equal(a, b)
+
+    def test_rewritten_file_read_again(self, extractor, synthetic_las, trail_coords):
+        """A changed mtime should invalidate the cached tile"""
+        extractor.extract_elevation_profile(trail_coords, lidar_record=_record(synthetic_las))
+        stat = os.stat(synthetic_las)
+        os.utime(synthetic_las, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        with patch.object(laspy, "open", side_effect=OSError("reread")):
+            result = extractor.extract_elevation_profile(
+                trail_coords, lidar_record=_record(synthetic_las)
+            )
+        assert not result["success"]
+        assert "reread" in result["error"]
+
+    def test_non_overlapping_tile_rejected_from_header(self, extractor, synthetic_las):
+        """A trail outside the tile bounds should fail without decoding points"""
+        far_away = [[-27.48, 152.95 + 0.0001 * i] for i in range(10)]
+
+        with patch.object(lidar_extraction, "_read_ground_points", side_effect=AssertionError):
+            result = extractor.extract_elevation_profile(
+                far_away, lidar_record=_record(synthetic_las)
+            )
+
+        assert not result["success"]
+        assert "does not overlap" in result["error"]
+
+    def test_missing_file(self, extractor, tmp_path, trail_coords):
+        """An inaccessible LiDAR file should fail cleanly"""
+        result = extractor.extract_elevation_profile(
+            trail_coords, lidar_record=_record(str(tmp_path / "missing.las"))
+        )
+
+        assert not result["success"]
+        assert result["elevations"] == []
+
+
+class TestExtractMany:
+    """Tests for extracting several trails against shared tiles"""
+
+    def test_matches_single_trail_extraction(self, extractor, synthetic_las, trail_coords):
+        """Each result should equal extract_elevation_profile for that trail"""
+        trails = [trail_coords, trail_coords[::-1], trail_coords[10:60], trail_coords[::3]]
+        record = _record(synthetic_las)
+
+        expected = [
+            extractor.extract_elevation_profile(t, lidar_record=record) for t in trails
+        ]
+        lidar_extraction._load_ground_points.cache_clear()
+        lidar_extraction._load_point_grid.cache_clear()
+        shutil.rmtree(synthetic_las + lidar_extraction.GROUND_SIDECAR_SUFFIX)
+        with patch.object(
+            lidar_extraction,
+            "_read_ground_points",
+            wraps=lidar_extraction._read_ground_points,
+        ) as read:
+            results = extractor.extract_many(trails, lidar_record=record)
+
+        assert results == expected
+        assert read.call_count == 1
+
+    def test_unmatched_trail_fails(self, extractor, trail_coords):
+        """Trails without a LiDAR file should get a failure result"""
+        results = extractor.extract_many([trail_coords, trail_coords])
+
+        assert [r["success"] for r in results] == [False, False]
+
+
+class TestReadGroundPoints:
+    """Tests for streaming ground points out of a LAS file"""
+
+    def test_chunked_read_keeps_ground_only(self, synthetic_las):
+        """Chunks should be filtered to class 2 and joined in file order"""
+        las = laspy.read(synthetic_las)
+        ground = np.asarray(las.classification) == 2
+
+        with patch.object(lidar_extraction, "LAS_CHUNK_POINTS", 7_000):
+            x, y, z, origin, header = _read_ground_points(synthetic_las)
+
+        # float32 offsets from the tile origin, still millimetre-exact
+        assert x.dtype == y.dtype == np.float32
+        np.testing.assert_allclose(x + origin[0], np.asarray(las.x)[ground], atol=1e-3)
+        np.testing.assert_allclose(y + origin[1], np.asarray(las.y)[ground], atol=1e-3)
+        np.testing.assert_array_equal(z, np.asarray(las.z)[ground])
+        assert header.point_count == len(ground)
+
+    def test_laz_matches_las(self, synthetic_las, tmp_path):
+        """Selective LAZ decompression should yield the same ground points"""
+        las = laspy.convert(laspy.read(synthetic_las), point_format_id=6)
+        path = str(tmp_path / "tile.laz")
+        las.write(path)
+
+        expected = _read_ground_points(synthetic_las)
+        actual = _read_ground_points(path)
+
+        for a, b in zip(expected[:3], actual[:3]):
+            np.testing.assert_array_equal(a, b)
+        assert actual[3] == expected[3]
+
+    def test_unclassified_uses_all_points(self, relative_las, tmp_path):
+        """Files with no ground-classified points should keep every point"""
+        las = laspy.read(relative_las)
+        las.classification[:] = 1
+        path = str(tmp_path / "unclassified.las")
+        las.write(path)
+
+        x, y, z, _, _ = _read_ground_points(path)
+        assert len(x) == len(las.points)
+
+
+class TestMinZWithinRadius:
+    """Tests for the fixed-radius minimum elevation search"""
+
+    @pytest.fixture
+    def cloud(self):
+        rng = np.random.default_rng(2)
+        x, y = rng.uniform(0, 50, 5000), rng.uniform(0, 50, 5000)
+        return x, y, rng.uniform(0, 10, 5000)
+
+    @pytest.mark.parametrize("radius", [0.5, 1.0, 2.5])
+    def test_grid_matches_kdtree(self, cloud, radius):
+        """Grid index and KD-tree should give identical minima"""
+        x, y, z = cloud
+        # Includes queries on cell edges and outside the cloud
+        qx = np.concatenate([np.linspace(-5, 55, 200), [0.0, 50.0, radius * 3]])
+        qy = np.concatenate([np.linspace(55, -5, 200), [0.0, 50.0, radius * 7]])
+
+        grid = _build_point_grid(x, y, z, radius)
+        assert grid is not None
+        np.testing.assert_array_equal(
+            _grid_min_z(grid, qx, qy, radius), _kdtree_min_z(x, y, z, qx, qy, radius)
+        )
+
+    def test_loop_kernel_matches_kdtree(self, cloud):
+        """The Numba kernel (run here as plain Python) should agree too"""
+        x, y, z = cloud
+        grid = _build_point_grid(x, y, z, 1.5)
+        # Cell centres put a whole cell inside the radius
+        centres = grid.x0 + (np.arange(10) + 0.5) * 1.5
+        qx = np.concatenate([np.linspace(-2, 52, 40), centres])
+        qy = np.concatenate([np.linspace(3, 47, 40), centres[::-1] + grid.y0 - grid.x0])
+
+        result = _grid_min_z_loop(
+            qx, qy, grid.x, grid.y, grid.z, grid.starts, grid.cell_min_z,
+            grid.x0, grid.y0, grid.cell_size, grid.nx, grid.ny, 1.5,
+        )
+        np.testing.assert_array_equal(result, _kdtree_min_z(x, y, z, qx, qy, 1.5))
+
+    def test_cell_min_z_raster(self, cloud):
+        """cell_min_z should hold the lowest z of every cell"""
+        x, y, z = cloud
+        grid = _build_point_grid(x, y, z, 2.0)
+        col = ((x - grid.x0) / 2.0).astype(int)
+        row = ((y - grid.y0) / 2.0).astype(int)
+
+        expected = np.full(grid.nx * grid.ny, np.inf)
+        np.minimum.at(expected, col * grid.ny + row, z)
+        np.testing.assert_array_equal(grid.cell_min_z, expected)
+
+    def test_sparse_cloud_has_no_grid(self, cloud):
+        """Too many cells per point should leave the search to the KD-tree"""
+        x, y, z = cloud
+        assert _build_point_grid(x, y, z, 0.05) is None
+
+
+class TestRelativeCoordinateProfile:
+    """Tests for LiDAR files in local (relative) coordinates"""
+
+    def test_segment_minimum_elevations(self, extractor, relative_las, trail_coords):
+        """Points sorted along X are split into equal segments, lowest z each"""
+        result = extractor.extract_elevation_profile(
+            trail_coords, lidar_record=_record(relative_las)
+        )
+
+        assert result["success"]
+        z = np.asarray(laspy.read(relative_las).z)
+        # 1,050 points, 100 trail points -> 100 segments of 10; the last 50 are unused
+        expected = z[:1000].reshape(100, 10).min(axis=1)
+        np.testing.assert_allclose(result["elevations"], expected)
+        assert result["distances"][0] == 0.0
+        assert result["distances"][-1] == pytest.approx(0.2, abs=0.01)
+
+
+class TestFindLidarFiles:
+    """Tests for building the LiDAR file list"""
+
+    def test_local_files_not_duplicated(self, tmp_path, fake_supabase):
+        """Local files already in the database, or seen in another folder, are skipped"""
+        cache = tmp_path / "cache"
+        (cache / "sub").mkdir(parents=True)
+        for name in ["db.laz", "local.las", "sub/local.las", "notes.txt"]:
+            (cache / name).write_bytes(b"")
+
+        records = [{"filename": "db.laz", "file_url": "https://x/db.laz"}]
+        extractor = LiDARExtractor(str(cache), supabase_client=fake_supabase(records))
+
+        assert sorted(r["filename"] for r in extractor.lidar_files) == ["db.laz", "local.las"]
+
+
+class TestCoordsToMga56:
+    """Tests for the WGS84 -> MGA56 conversion"""
+
+    def test_matches_pyproj(self, extractor, trail_coords):
+        """Batched conversion should match per-point pyproj transforms"""
+        transformer = Transformer.from_crs(4326, 28356, always_xy=True)
+        expected = [transformer.transform(lon, lat) for lat, lon in trail_coords]
+
+        result = extractor._coords_to_mga56(trail_coords)
+
+        assert result.shape == (len(trail_coords), 2)
+        np.testing.assert_allclose(result, expected, atol=1e-6)
+
+    def test_empty(self, extractor):
+        """No coordinates should give an empty (0, 2) array"""
+        assert extractor._coords_to_mga56([]).shape == (0, 2)
+
+
+class TestFindMatchingLidarFile:
+    """Tests for picking the LiDAR file that covers a trail"""
+
+    def test_bounds_from_local_header(self, extractor, synthetic_las, trail_coords):
+        """Records without stored bounds should use the local file's header"""
+        record = _record(synthetic_las)
+        extractor.lidar_files = [{"filename": "elsewhere.las"}, record]
+
+        assert extractor.find_matching_lidar_file(trail_coords) is record
+
+    def test_stored_bounds_used_without_file(self, extractor, trail_coords):
+        """Bounds from the database should match without opening any file"""
+        mga = extractor._coords_to_mga56(trail_coords)
+        record = {
+            "filename": "remote.laz",
+            "file_url": "https://example.invalid/remote.laz",
+            "min_x": mga[:, 0].min() - 10,
+            "max_x": mga[:, 0].max() + 10,
+            "min_y": mga[:, 1].min() - 10,
+            "max_y": mga[:, 1].max() + 10,
+        }
+        extractor.lidar_files = [record]
+
+        with patch.object(laspy, "open", side_effect=AssertionError):
+            assert extractor.find_matching_lidar_file(trail_coords) is record
+
+    def test_best_overlap_wins(self, extractor, trail_coords):
+        """The file covering most of the trail bbox should be chosen"""
+        mga = extractor._coords_to_mga56(trail_coords)
+        min_x, max_x = mga[:, 0].min(), mga[:, 0].max()
+        min_y, max_y = mga[:, 1].min(), mga[:, 1].max()
+        width = max_x - min_x
+
+        def record(name, left, right):
+            return {
+                "filename": name, "file_url": "https://x/" + name,
+                "min_x": left, "max_x": right, "min_y": min_y - 1, "max_y": max_y + 1,
+            }
+
+        sliver = record("sliver.laz", max_x - 0.01 * width, max_x + 100)
+        half = record("half.laz", min_x + 0.5 * width, max_x + 100)
+        most = record("most.laz", min_x + 0.2 * width, max_x + 100)
+        extractor.lidar_files = [sliver, half, {"filename": "nobounds.laz"}, most]
+
+        assert extractor.find_matching_lidar_file(trail_coords) is most
+
+        # Under the 2% threshold on its own
+        extractor.lidar_files = [sliver]
+        assert extractor.find_matching_lidar_file(trail_coords) is None
+
+    def test_bounds_array_rebuilt_after_invalidate(self, extractor):
+        """Stored bounds are cached until the record list changes"""
+        extractor.lidar_files = [{"filename": "a.laz", "min_x": 0, "max_x": 1, "min_y": 0, "max_y": 1}]
+        _, first = extractor._stored_bounds()
+        assert extractor._stored_bounds()[1] is first
+
+        extractor.invalidate()
+        records, rebuilt = extractor._stored_bounds()
+        assert records == []
+        assert rebuilt.shape == (0, 4)
+
+
+class _FakeResponse:
+    def __init__(self, body=b"", status_code=200, headers=None):
+        self.body, self.status_code, self.headers = body, status_code, headers or {}
+        self.ok = status_code < 400
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise lidar_extraction.requests.HTTPError(str(self.status_code))
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i : i + chunk_size]
+
+
+class _FakeSession:
+    """Serves one file; honours Range requests unless ranges=False"""
+
+    def __init__(self, body, ranges=True):
+        self.body, self.ranges, self.requests = body, ranges, []
+
+    def head(self, url, **kwargs):
+        headers = {"Content-Length": str(len(self.body))}
+        if self.ranges:
+            headers["Accept-Ranges"] = "bytes"
+        return _FakeResponse(headers=headers)
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((headers or {}).get("Range"))
+        if self.ranges and headers and "Range" in headers:
+            start, end = map(int, headers["Range"][len("bytes="):].split("-"))
+            return _FakeResponse(self.body[start : end + 1], status_code=206)
+        return _FakeResponse(self.body)
+
+
+class TestDownloadLidarFile:
+    """Tests for downloading LiDAR files into the local cache"""
+
+    @pytest.fixture
+    def body(self):
+        return np.random.default_rng(3).bytes(100_003)
+
+    @pytest.fixture(autouse=True)
+    def small_parallel_threshold(self):
+        with patch.object(lidar_extraction, "DOWNLOAD_PARALLEL_MIN_BYTES", 1000):
+            yield
+
+    @pytest.mark.parametrize("ranges", [True, False])
+    def test_download(self, extractor, tmp_path, body, ranges):
+        """Range-capable servers get parallel parts, others a single stream"""
+        session = _FakeSession(body, ranges=ranges)
+        path = str(tmp_path / "dl" / "tile.laz")
+        with patch.object(lidar_extraction, "_http_session", return_value=session):
+            assert extractor._download_lidar_file("https://x/tile.laz", path) == path
+
+        with open(path, "rb") as f:
+            assert f.read() == body
+        if ranges:
+            assert len(session.requests) == lidar_extraction.DOWNLOAD_PARTS
+        else:
+            assert session.requests == [None]
+        assert not os.path.exists(path + ".part")
+
+    def test_failed_download_not_cached(self, extractor, tmp_path, body):
+        """A failed download should leave nothing that looks cached"""
+        session = _FakeSession(body)
+        session.get = lambda *a, **k: _FakeResponse(status_code=500)
+        path = str(tmp_path / "tile.laz")
+
+        with patch.object(lidar_extraction, "_http_session", return_value=session):
+            with pytest.raises(Exception):
+                extractor._download_lidar_file("https://x/tile.laz", path)
+
+        assert not os.path.exists(path)
+        assert not os.path.exists(path + ".part")
@@ -0,0 +1,306 @@
+"""
+Unit tests for utils/real_dem_analysis.py
+"""
+import pytest
+import os
+import numpy as np
+import rasterio
+from pyproj import Transformer
+from shapely.geometry import LineString
+from unittest.mock import patch
+
+from utils.real_dem_analysis import RealDEMAnalyzer
+from utils._jit import _terrain_features_loop
+
+
+@pytest.fixture
+def analyzer(synthetic_dem):
+    """Analyzer over the directory holding synthetic_dem"""
+    return RealDEMAnalyzer(os.path.dirname(synthetic_dem))
+
+
+def _pixel_elevations(dem_path, trail_coords, interval=10):
+    """Pixel value under every sample point, one point at a time"""
+    transformer = Transformer.from_crs(4326, 28356, always_xy=True)
+    line = LineString([transformer.transform(lon, lat) for lat, lon in trail_coords])
+    with rasterio.open(dem_path) as dataset:
+        band = dataset.read(1)
+        expected = []
+        for d in np.arange(0, line.length, interval):
+            point = line.interpolate(d)
+            row, col = dataset.index(point.x, point.y)
+            expected.append(float(band[row, col]))
+    return expected
+
+
+def _features_by_loop(elevations, distances, slopes):
+    """(type, distance) of each terrain feature, found point by point"""
+    features = []
+    for i in range(1, len(elevations) - 1):
+        window = elevations[max(0, i - 10) : i + 10]
+        if elevations[i - 1] < elevations[i] > elevations[i + 1]:
+            if elevations[i] - min(window) > 20:
+                features.append(("Peak", distances[i]))
+    for i in range(1, len(elevations) - 1):
+        window = elevations[max(0, i - 10) : i + 10]
+        if elevations[i - 1] > elevations[i] < elevations[i + 1]:
+            if max(window) - elevations[i] > 20:
+                features.append(("Valley", distances[i]))
+    for i, slope in enumerate(slopes):
+        if abs(slope) > 25:
+            features.append(("Steep Grade" if slope > 0 else "Steep Descent", distances[i]))
+    return features
+
+
+class TestFindRelevantDemTiles:
+    """Tests for DEM tile lookup"""
+
+    def test_lookup_uses_bounds_read_at_init(self, analyzer, synthetic_dem, sample_coordinates):
+        """Lookups should not reopen the tiles"""
+        with patch.object(rasterio, "open", side_effect=AssertionError):
+            assert analyzer._find_relevant_dem_tiles(sample_coordinates) == [synthetic_dem]
+            assert analyzer._find_relevant_dem_tiles([[-28.0, 153.5]]) == []
+
+    def test_unreadable_tile_skipped(self, synthetic_dem, sample_coordinates):
+        """A file that is not a raster should never match"""
+        with open(os.path.join(os.path.dirname(synthetic_dem), "broken.tif"), "w") as f:
+            f.write("not a tiff")
+        analyzer = RealDEMAnalyzer(os.path.dirname(synthetic_dem))
+
+        assert analyzer._find_relevant_dem_tiles(sample_coordinates) == [synthetic_dem]
+
+    def test_grid_named_tile_not_opened(self, tmp_path):
+        """Bounds of a tile named by its 1 km cell should come from the name"""
+        name = "Brisbane_2014_SW_502000_6965000_1K_DEM_1m.tif"
+        (tmp_path / name).write_bytes(b"")
+
+        with patch.object(rasterio, "open", side_effect=AssertionError):
+            analyzer = RealDEMAnalyzer(str(tmp_path))
+
+        np.testing.assert_array_equal(
+            analyzer._tile_bounds, [[502000.0, 6965000.0, 503000.0, 6966000.0]]
+        )
+
+
+class TestExtractElevationProfile:
+    """Tests for DEM elevation profile extraction"""
+
+    def test_elevations_match_raster(self, analyzer, synthetic_dem, sample_coordinates):
+        """Each sample should be the DEM pixel under it"""
+        result = analyzer.extract_elevation_profile(sample_coordinates)
+
+        assert result["success"]
+        profile = result["elevation_profile"]
+        np.testing.assert_array_equal(
+            profile["elevations"], _pixel_elevations(synthetic_dem, sample_coordinates)
+        )
+        assert len(profile["coordinates"]) == len(profile["elevations"])
+
+    def test_statistics(self, analyzer, sample_coordinates):
+        """Summary statistics should agree with the returned profile"""
+        result = analyzer.extract_elevation_profile(sample_coordinates)
+
+        elevations = result["elevation_profile"]["elevations"]
+        rises = [b - a for a, b in zip(elevations, elevations[1:])]
+        stats = result["statistics"]
+        assert result["elevation_profile"]["slopes"] == pytest.approx([0] + [r * 10 for r in rises])
+        assert stats["min_elevation"] == min(elevations)
+        assert stats["max_elevation"] == max(elevations)
+        assert stats["elevation_gain"] == pytest.approx(sum(r for r in rises if r > 0))
+        assert stats["elevation_loss"] == pytest.approx(sum(-r for r in rises if r < 0))
+        assert stats["max_slope"] == pytest.approx(max(rises) * 10)
+        assert stats["avg_slope"] == pytest.approx(np.mean(np.abs(rises)) * 10)
+
+    def test_tile_kept_open_between_calls(self, analyzer, sample_coordinates):
+        """A second profile over the same tile should not reopen it"""
+        first = analyzer.extract_elevation_profile(sample_coordinates)
+        analyzer._profile_cache.clear()
+        with patch.object(rasterio, "open", side_effect=AssertionError):
+            second = analyzer.extract_elevation_profile(sample_coordinates)
+
+        assert second["success"]
+        assert second["elevation_profile"] == first["elevation_profile"]
+
+    def test_profile_cached_per_trail(self, analyzer, sample_coordinates):
+        """Repeat requests for a trail should reuse its profile"""
+        first = analyzer.extract_elevation_profile(sample_coordinates)
+        first["elevation_profile"]["elevations"].clear()
+
+        with patch(
+            "utils.real_dem_analysis._open_dataset", side_effect=AssertionError
+        ):
+            second = analyzer.extract_elevation_profile(sample_coordinates)
+            features = analyzer.analyze_terrain_features(sample_coordinates)
+
+        assert second["elevation_profile"]["elevations"]
+        assert features["success"]
+        other = analyzer.extract_elevation_profile(sample_coordinates[:3])
+        assert other["elevation_profile"] != second["elevation_profile"]
+
+    def test_replaced_tile_reopened(self, analyzer, synthetic_dem, sample_coordinates):
+        """A tile rewritten on disk should be read again"""
+        analyzer.extract_elevation_profile(sample_coordinates)
+        with rasterio.open(synthetic_dem, "r+") as dataset:
+            dataset.write(np.full((dataset.height, dataset.width), 7.0, dtype=np.float32), 1)
+        stat = os.stat(synthetic_dem)
+        os.utime(synthetic_dem, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        result = analyzer.extract_elevation_profile(sample_coordinates)
+        assert set(result["elevation_profile"]["elevations"]) == {7.0}
+
+    def test_replaced_tile_old_handle_closed(self, synthetic_dem):
+        """Reopening a replaced tile should close this thread's old handle"""
+        from utils.real_dem_analysis import _open_dataset
+
+        old = _open_dataset(synthetic_dem)
+        stat = os.stat(synthetic_dem)
+        os.utime(synthetic_dem, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        new = _open_dataset(synthetic_dem)
+
+        assert new is not old
+        assert old.closed
+        assert _open_dataset(synthetic_dem) is new
+
+    def test_trail_across_tiles(self, synthetic_dem, split_dem, sample_coordinates, tmp_path):
+        """A trail crossing a tile edge should sample as if the DEM were one tile"""
+        for name, paths in [("single", [synthetic_dem]), ("split", split_dem)]:
+            os.mkdir(tmp_path / name)
+            for path in paths:
+                os.replace(path, tmp_path / name / os.path.basename(path))
+
+        single = RealDEMAnalyzer(str(tmp_path / "single"))
+        split = RealDEMAnalyzer(str(tmp_path / "split"))
+        expected = single.extract_elevation_profile(sample_coordinates)
+        result = split.extract_elevation_profile(sample_coordinates)
+
+        assert len(result["data_sources"]) == 2
+        assert result["elevation_profile"] == expected["elevation_profile"]
+        assert result["statistics"] == expected["statistics"]
+
+    def test_tiles_read_in_pool(self, split_dem, sample_coordinates):
+        """Each tile of a multi-tile trail should be read on a pool thread"""
+        import threading
+        from utils import real_dem_analysis
+
+        analyzer = RealDEMAnalyzer(os.path.dirname(split_dem[0]))
+        sample_tile = real_dem_analysis._sample_tile
+        threads = []
+
+        def recording(*args):
+            threads.append(threading.current_thread().name)
+            return sample_tile(*args)
+
+        with patch.object(real_dem_analysis, "_sample_tile", side_effect=recording):
+            result = analyzer.extract_elevation_profile(sample_coordinates)
+
+        assert result["success"]
+        assert len(threads) == 2
+        assert all(name.startswith("dem-tile") for name in threads)
+
+    def test_interpolation_matches_shapely(self):
+        """Sample points should match LineString.interpolate, repeated vertices included"""
+        xy = np.array([[0.0, 0.0], [35.0, 0.0], [35.0, 0.0], [35.0, 47.5], [12.0, 60.0]])
+        line = LineString(xy)
+        expected = [line.interpolate(d).coords[0] for d in np.arange(0, line.length, 10)]
+
+        result = RealDEMAnalyzer._interpolate_along(xy, 10)
+
+        np.testing.assert_allclose(result, expected, atol=1e-9)
+
+    def test_single_point_trail(self, analyzer, sample_coordinates):
+        """A one-point trail has no profile to sample"""
+        result = analyzer.extract_elevation_profile(sample_coordinates[:1])
+
+        assert "error" in result
+
+    def test_no_tiles(self, analyzer):
+        """A trail outside every tile should report an error"""
+        result = analyzer.extract_elevation_profile([[-28.0, 153.5], [-28.001, 153.501]])
+
+        assert "error" in result
+
+
+class TestAnalyzeTerrainFeatures:
+    """Tests for peak, valley and steep section detection"""
+
+    def test_matches_point_by_point_scan(self, analyzer):
+        """Vectorized detection should find the same features in the same order"""
+        rng = np.random.default_rng(3)
+        elevations = (100 + np.cumsum(rng.normal(0, 4, 300))).tolist()
+        distances = [10.0 * i for i in range(300)]
+        slopes = [0] + [(b - a) * 10 for a, b in zip(elevations, elevations[1:])]
+        profile = {
+            "success": True,
+            "elevation_profile": {
+                "elevations": elevations,
+                "distances": distances,
+                "slopes": slopes,
+            },
+        }
+
+        with patch.object(analyzer, "extract_elevation_profile", return_value=profile):
+            result = analyzer.analyze_terrain_features([])
+
+        found = [(f["type"], f["distance"]) for f in result["features"]]
+        assert found == _features_by_loop(elevations, distances, slopes)
+        assert result["summary"]["peaks"] > 0
+        assert result["summary"]["valleys"] > 0
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64])
+    def test_kernel_matches_numpy(self, dtype):
+        """The compiled kernel's loop should agree with the NumPy path"""
+        rng = np.random.default_rng(5)
+        elev = (100 + np.cumsum(rng.normal(0, 4, 500))).astype(dtype)
+        slopes = np.concatenate([[0.0], np.diff(elev.astype(float)) * 10])
+
+        kinds, indices = _terrain_features_loop(elev, slopes, 20.0, 10)
+        expected_kinds, expected_indices = RealDEMAnalyzer._feature_indices(
+            elev.astype(float), slopes
+        )
+
+        np.testing.assert_array_equal(kinds, expected_kinds)
+        np.testing.assert_array_equal(indices, expected_indices)
+        assert set(kinds.tolist()) == {0, 1, 2}
+
+
+class TestCreate3DTerrainVisualization:
+    """Tests for the interactive 3D terrain view"""
+
+    @pytest.mark.parametrize("overviews", [False, True])
+    def test_surface_is_decimated_read(self, synthetic_dem, sample_coordinates, overviews):
+        """The surface should come from a reduced-resolution read of the trail window"""
+        import plotly.io as pio
+
+        if overviews:
+            with rasterio.open(synthetic_dem, "r+") as dataset:
+                dataset.build_overviews([2, 4, 8])
+        analyzer = RealDEMAnalyzer(os.path.dirname(synthetic_dem))
+
+        with patch.object(pio, "to_html", return_value="<div></div>") as to_html:
+            result = analyzer.create_3d_terrain_visualization(sample_coordinates)
+
+        assert result["success"]
+        assert result["type"] == "interactive"
+        # Plotly itself comes from the CDN rather than inline in every page
+        assert to_html.call_args.kwargs["include_plotlyjs"] == "cdn"
+        surface, trail = to_html.call_args[0][0].data[:2]
+        z = np.asarray(surface.z)
+        assert z.shape == np.asarray(surface.x).shape
+        # Rows are several full-resolution pixels apart
+        assert np.diff(np.asarray(surface.y)[:, 0])[0] > 1
+        # Trail points sit on the surface cells they fall in
+        assert np.isin(np.asarray(trail.z) - 1.0, z).all()
+
+    def test_static_fallback_renders_png(self, analyzer, synthetic_dem, sample_coordinates):
+        """The matplotlib fallback should return a PNG without pyplot figures left open"""
+        import base64
+        import matplotlib.pyplot as plt
+
+        gda94_coords = analyzer._coords_to_gda94(sample_coordinates)
+        with rasterio.open(synthetic_dem) as dataset:
+            result = analyzer._create_static_3d_plot(dataset.read(1), gda94_coords, dataset)
+
+        assert result["success"]
+        assert base64.b64decode(result["image_base64"]).startswith(b"\x89PNG")
+        assert plt.get_fignums() == []
@@ -2,22 +2,12 @@
 Unit tests for API routes
 """
 import pytest
+import numpy as np
 from httpx import AsyncClient
 from unittest.mock import Mock, patch, MagicMock
-import sys
 import os
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-
-from main import app
-
-
-@pytest.fixture
-def client():
-    """Create test client"""
-    from fastapi.testclient import TestClient
-    return TestClient(app)
+import app_state
 
 
 class TestRootEndpoint:
@@ -48,11 +38,9 @@ class TestRootEndpoint:
 class TestTrailsEndpoint:
     """Tests for /trails endpoint"""
 
-    @patch("routes.trails.supabase")
-    def test_get_trails_success(self, mock_supabase, client):
+    def test_get_trails_success(self, client, fake_supabase, monkeypatch):
         """Should return trails list successfully"""
-        mock_response = MagicMock()
-        mock_response.data = [
+        trails = [
             {
                 "id": 1,
                 "name": "Test Trail",
@@ -61,7 +49,7 @@ class TestTrailsEndpoint:
                 "difficulty_level": "Moderate",
             }
         ]
-        mock_supabase.table.return_value.select.return_value.order.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase(trails))
 
         response = client.get("/trails")
         assert response.status_code == 200
@@ -69,12 +57,9 @@ class TestTrailsEndpoint:
         assert "success" in data
         assert "trails" in data
 
-    @patch("routes.trails.supabase")
-    def test_get_trails_empty(self, mock_supabase, client):
+    def test_get_trails_empty(self, client, fake_supabase, monkeypatch):
         """Should handle empty trails list"""
-        mock_response = MagicMock()
-        mock_response.data = []
-        mock_supabase.table.return_value.select.return_value.order.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase([]))
 
         response = client.get("/trails")
         assert response.status_code == 200
@@ -86,11 +71,9 @@ class TestTrailsEndpoint:
 class TestAnalyticsEndpoint:
     """Tests for /analytics/overview endpoint"""
 
-    @patch("routes.trails.supabase")
-    def test_analytics_success(self, mock_supabase, client):
+    def test_analytics_success(self, client, fake_supabase, monkeypatch):
         """Should return analytics data"""
-        mock_response = MagicMock()
-        mock_response.data = [
+        trails = [
             {
                 "id": 1,
                 "distance": 5.0,
@@ -106,7 +89,7 @@ class TestAnalyticsEndpoint:
                 "difficulty_score": 8.5,
             },
         ]
-        mock_supabase.table.return_value.select.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase(trails))
 
         response = client.get("/analytics/overview")
         assert response.status_code == 200
@@ -116,12 +99,9 @@ class TestAnalyticsEndpoint:
         assert "total_distance_km" in data
         assert "difficulty_distribution" in data
 
-    @patch("routes.trails.supabase")
-    def test_analytics_empty_database(self, mock_supabase, client):
+    def test_analytics_empty_database(self, client, fake_supabase, monkeypatch):
         """Should handle empty database gracefully"""
-        mock_response = MagicMock()
-        mock_response.data = []
-        mock_supabase.table.return_value.select.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase([]))
 
         response = client.get("/analytics/overview")
         assert response.status_code == 200
@@ -130,29 +110,85 @@ class TestAnalyticsEndpoint:
         assert data["total_trails"] == 0
 
 
+class TestDem3dEndpoint:
+    """Tests for /trail/{trail_id}/dem3d endpoint"""
+
+    def test_surface_formats(self, client, fake_supabase, monkeypatch, synthetic_dem):
+        """Binary surface should decode to the same grid as format=json"""
+        import base64
+
+        trail = [
+            {
+                "id": 1,
+                "name": "Test Trail",
+                "coordinates": [[-27.4705, 152.9619], [-27.4700, 152.9639]],
+            }
+        ]
+        monkeypatch.setattr("routes.analysis.supabase", fake_supabase(trail))
+        monkeypatch.setattr(
+            "routes.analysis.find_relevant_dem_tiles", lambda coords: [synthetic_dem]
+        )
+
+        binary = client.get("/trail/1/dem3d").json()["dem_data"]["surface"]
+        as_json = client.get("/trail/1/dem3d?format=json").json()["dem_data"]["surface"]
+
+        assert "z" not in binary
+        z = np.frombuffer(base64.b64decode(binary["z_f32_b64"]), dtype="<f4")
+        expected = np.array(as_json["z"])
+        assert z.reshape(binary["z_shape"]) == pytest.approx(expected, rel=1e-6)
+
+    def test_unknown_format_rejected(self, client):
+        """Unsupported formats should be rejected by validation"""
+        response = client.get("/trail/1/dem3d?format=xml")
+        assert response.status_code == 422
+
+
+class TestTerrain3dJsonEndpoint:
+    """Tests for /trail/{trail_id}/3d-terrain.json endpoint"""
+
+    @patch("app_state.get_lidar_extractor", return_value=None)
+    def test_returns_figure_spec(self, mock_lidar, client, fake_supabase, monkeypatch, synthetic_dem):
+        """Should return the Plotly data/layout/config spec, not HTML"""
+        from utils.real_dem_analysis import RealDEMAnalyzer
+
+        trail = [
+            {
+                "id": 1,
+                "name": "Test Trail",
+                "coordinates": [[-27.4705, 152.9629], [-27.4710, 152.9635]],
+            }
+        ]
+        monkeypatch.setattr("routes.analysis.supabase", fake_supabase(trail))
+        analyzer = RealDEMAnalyzer(os.path.dirname(synthetic_dem))
+        monkeypatch.setattr(app_state, "get_dem_analyzer", lambda: analyzer)
+
+        response = client.get("/trail/1/3d-terrain.json")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        spec = response.json()
+        assert set(spec) == {"data", "layout", "config"}
+        assert spec["data"][0]["type"] == "surface"
+
+
 class TestElevationSourcesEndpoint:
     """Tests for /trail/{trail_id}/elevation-sources endpoint"""
 
-    @patch("routes.analysis.supabase")
-    def test_elevation_sources_invalid_trail(self, mock_supabase, client):
+    def test_elevation_sources_invalid_trail(self, client, fake_supabase, monkeypatch):
         """Should return 404 for invalid trail ID"""
-        mock_response = MagicMock()
-        mock_response.data = []
-        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.analysis.supabase", fake_supabase([]))
 
         response = client.get("/trail/99999/elevation-sources")
         assert response.status_code == 404
 
-    @patch("routes.analysis.supabase")
     @patch("routes.analysis.app_state.get_dem_analyzer")
     @patch("routes.analysis.app_state.get_lidar_extractor")
     def test_elevation_sources_success(
-        self, mock_lidar, mock_dem, mock_supabase, client
+        self, mock_lidar, mock_dem, client, fake_supabase, monkeypatch
     ):
         """Should return elevation sources for valid trail"""
-        # Mock trail data
-        mock_response = MagicMock()
-        mock_response.data = [
+        # Trail row, then no LiDAR/XLSX files for it
+        trail = [
             {
                 "id": 1,
                 "name": "Test Trail",
@@ -163,7 +199,7 @@ class TestElevationSourcesEndpoint:
                 ],
             }
         ]
-        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.analysis.supabase", fake_supabase(trail, []))
 
         # Mock DEM analyzer
         mock_dem.return_value = None
@@ -179,23 +215,25 @@ class TestElevationSourcesEndpoint:
 class TestSimilarTrailsEndpoint:
     """Tests for /trail/{trail_id}/similar endpoint"""
 
-    @patch("routes.trails.supabase")
-    def test_similar_trails_invalid_trail(self, mock_supabase, client):
+    @pytest.fixture(autouse=True)
+    def fresh_similar_cache(self):
+        """Start each test with no cached rankings"""
+        app_state.bump_trails_version()
+
+    def test_similar_trails_invalid_trail(self, client, fake_supabase, monkeypatch):
         """Should return 404 for invalid trail ID"""
-        mock_response = MagicMock()
-        mock_response.data = []
-        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase([]))
 
         response = client.get("/trail/99999/similar")
         assert response.status_code == 404
 
-    @patch("routes.trails.supabase")
-    @patch("routes.trails.calculate_trail_similarity")
-    def test_similar_trails_success(self, mock_similarity, mock_supabase, client):
+    @patch("routes.trails.calculate_trail_similarity_batch")
+    def test_similar_trails_success(
+        self, mock_similarity, client, fake_supabase, monkeypatch
+    ):
         """Should return similar trails"""
-        # Mock target trail
-        mock_response_target = MagicMock()
-        mock_response_target.data = [
+        # Target trail
+        target = [
             {
                 "id": 1,
                 "name": "Target Trail",
@@ -205,9 +243,8 @@ class TestSimilarTrailsEndpoint:
             }
         ]
 
-        # Mock all trails
-        mock_response_all = MagicMock()
-        mock_response_all.data = [
+        # All other trails
+        others = [
             {
                 "id": 1,
                 "name": "Target Trail",
@@ -224,39 +261,177 @@ class TestSimilarTrailsEndpoint:
             },
         ]
 
-        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response_target
-        mock_supabase.table.return_value.select.return_value.execute.return_value = mock_response_all
-        mock_similarity.return_value = 0.85
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase(target, others))
+        mock_similarity.return_value = np.array([0.6, 0.85])
 
         response = client.get("/trail/1/similar")
         assert response.status_code == 200
         data = response.json()
         assert "success" in data
         assert "similar_trails" in data
+        assert data["similar_trails"][0]["trail"]["id"] == 2
+        assert data["similar_trails"][0]["similarity_score"] == 0.85
+
+    @patch("routes.trails.calculate_trail_similarity_batch")
+    def test_similar_trails_cached_until_trails_change(
+        self, mock_similarity, client, fake_supabase, monkeypatch
+    ):
+        """Repeat requests should reuse the ranking until trails change"""
+        target = [{"id": 1, "name": "Target Trail"}]
+        others = [{"id": 2, "name": "Trail A"}, {"id": 3, "name": "Trail B"}]
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase(target, others))
+        mock_similarity.return_value = np.array([0.4, 0.9])
+
+        first = client.get("/trail/1/similar").json()
+        second = client.get("/trail/1/similar?limit=1").json()
+        assert mock_similarity.call_count == 1
+        assert second["similar_trails"] == first["similar_trails"][:1]
+
+        app_state.bump_trails_version()
+        client.get("/trail/1/similar")
+        assert mock_similarity.call_count == 2
 
 
 class TestDeleteTrailEndpoint:
     """Tests for DELETE /trail/{trail_id} endpoint"""
 
-    @patch("routes.trails.supabase")
-    def test_delete_trail_success(self, mock_supabase, client):
+    def test_delete_trail_success(self, client, fake_supabase, monkeypatch):
         """Should successfully delete a trail"""
-        mock_response = MagicMock()
-        mock_response.data = [{"id": 1}]
-        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response
-        mock_supabase.table.return_value.delete.return_value.eq.return_value.execute.return_value = mock_response
+        # Trail lookup, LiDAR file lookup (none), then the delete
+        fake = fake_supabase([{"id": 1}], [], [{"id": 1}])
+        monkeypatch.setattr("routes.trails.supabase", fake)
+        monkeypatch.setattr("routes.trails.supabase_service", None)
 
+        version = app_state.get_trails_version()
         response = client.delete("/trail/1")
         assert response.status_code == 200
+        assert app_state.get_trails_version() > version
         data = response.json()
         assert data["success"] is True
+        assert ("delete", (), {}) in fake.calls
 
-    @patch("routes.trails.supabase")
-    def test_delete_trail_not_found(self, mock_supabase, client):
+    def test_delete_trail_not_found(self, client, fake_supabase, monkeypatch):
         """Should return 404 for non-existent trail"""
-        mock_response = MagicMock()
-        mock_response.data = []
-        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response
+        monkeypatch.setattr("routes.trails.supabase", fake_supabase([]))
 
         response = client.delete("/trail/99999")
         assert response.status_code == 404
+
+
+class TestLidarFilesEndpoint:
+    """Tests for /lidar-files endpoint"""
+
+    def test_get_lidar_files_uses_server_count(self, client, fake_supabase, monkeypatch):
+        """Should project summary columns and use the PostgREST exact count"""
+        fake = fake_supabase([{"id": 1, "filename": "trail_1.laz"}])
+        monkeypatch.setattr("routes.uploads.supabase", fake)
+
+        response = client.get("/lidar-files")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is True
+        assert data["count"] == 1
+        _, args, kwargs = next(c for c in fake.calls if c[0] == "select")
+        assert args[0] != "*"
+        assert kwargs["count"] == "exact"
+
+
+class TestUploadXlsxEndpoint:
+    """Tests for /upload-xlsx endpoint"""
+
+    XLSX_PATH = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "data", "LiDAR", "Trail2.xlsx"
+    )
+
+    @patch("routes.uploads.supabase_service", None)
+    @patch("routes.uploads.supabase")
+    def test_upload_xlsx_success(self, mock_supabase, client):
+        """Should upload to storage and record sheet metadata"""
+        mock_supabase.storage.from_.return_value.get_public_url.return_value = (
+            "https://example.com/trail2.xlsx"
+        )
+        mock_response = MagicMock()
+        mock_response.data = [{"id": 1}]
+        mock_supabase.table.return_value.insert.return_value.execute.return_value = mock_response
+
+        with open(self.XLSX_PATH, "rb") as f:
+            response = client.post(
+                "/upload-xlsx",
+                files={"file": ("Trail2.xlsx", f.read())},
+                data={"trail_id": "1"},
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is True
+        assert data["metadata"]["sheet_name"]
+        assert data["metadata"]["num_rows"] > 1
+        mock_supabase.storage.from_.return_value.upload.assert_called_once()
+
+    def test_sheet_info_matches_openpyxl(self):
+        """Raw XML sheet reader should agree with openpyxl"""
+        from routes.uploads import _read_xlsx_sheet_info, _read_xlsx_sheet_info_openpyxl
+
+        assert _read_xlsx_sheet_info(self.XLSX_PATH) == _read_xlsx_sheet_info_openpyxl(
+            self.XLSX_PATH
+        )
+
+
+class TestReadGpxSegments:
+    """Tests for the streaming GPX track reader"""
+
+    GPX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <wpt lat="-27.0" lon="152.0"><ele>5</ele></wpt>
+  <trk><name>Test</name>
+    <trkseg>
+      <trkpt lat="-27.4705" lon="152.9629"><ele>100.5</ele><time>2024-01-01T00:00:00Z</time></trkpt>
+      <trkpt lat="-27.4710" lon="152.9635"><ele>110</ele></trkpt>
+    </trkseg>
+    <trkseg>
+      <trkpt lat="-27.4715" lon="152.9640"></trkpt>
+      <trkpt lat="-27.4720" lon="152.9645"><ele>120.25</ele></trkpt>
+    </trkseg>
+  </trk>
+</gpx>"""
+
+    def test_matches_gpxpy(self):
+        """Streamed segments should match gpxpy's track points"""
+        from routes.uploads import _read_gpx_segments, _gpx_segments_gpxpy
+
+        result = _read_gpx_segments(self.GPX)
+        expected = _gpx_segments_gpxpy(self.GPX)
+
+        assert len(result) == len(expected) == 2
+        for got, want in zip(result, expected):
+            for got_values, want_values in zip(got, want):
+                np.testing.assert_array_equal(got_values, want_values)
+        assert result[1][2].tolist() == [0.0, 120.25]
+
+    def test_malformed_xml_falls_back(self):
+        """Files the XML parser rejects should go through gpxpy"""
+        from routes import uploads
+
+        with patch.object(uploads, "_gpx_segments_gpxpy", return_value=[]) as fallback:
+            assert uploads._read_gpx_segments(b"<gpx><trk>") == []
+        fallback.assert_called_once()
+
+
+class TestSaveUploadToTemp:
+    """Tests for streaming uploads to a temp file"""
+
+    def test_failed_copy_removes_temp_file(self, tmp_path, monkeypatch):
+        """A copy that fails part way should not leave the temp file behind"""
+        import tempfile
+        from routes.uploads import _save_upload_to_temp
+
+        class BrokenUpload:
+            def read(self, size=-1):
+                raise ConnectionResetError("client went away")
+
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+        with pytest.raises(ConnectionResetError):
+            _save_upload_to_temp(BrokenUpload(), ".laz")
+
+        assert list(tmp_path.iterdir()) == []
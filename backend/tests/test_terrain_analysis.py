@@ -2,9 +2,15 @@
 Unit tests for utils/terrain_analysis.py
 """
 import pytest
+import numpy as np
+from unittest.mock import patch
+
+from utils import terrain_analysis
+from utils._jit import _terrain_variety_loop
 from utils.terrain_analysis import (
     get_trail_weather_exposure,
     calculate_terrain_variety,
+    calculate_terrain_variety_batch,
     get_terrain_variety_description,
     get_surface_difficulty_multiplier,
     estimate_surface_type_from_terrain,
@@ -83,6 +89,63 @@ class TestCalculateTerrainVariety:
         result = calculate_terrain_variety([100])
         assert result == 0
 
+    def test_bands_truncate_toward_zero(self):
+        """Elevations just below sea level share the 0-100m band"""
+        elevations = [-50, 50, -20, 80, -10, 30, 60, -40, 10, 90]
+        result = calculate_terrain_variety(elevations)
+
+        # One band, plus 2 for an average change above 20m
+        assert result == 3
+
+    def test_kernel_matches_numpy(self):
+        """The compiled kernel should agree with the NumPy path"""
+        rng = np.random.default_rng(0)
+        profiles = [
+            np.cumsum(rng.normal(0, 15, 500)) + 300,
+            np.cumsum(rng.normal(0, 40, 200)) - 50,
+            np.linspace(95, 105, 20),
+        ]
+        for elev in profiles:
+            n_bands, avg_change = _terrain_variety_loop(elev)
+            assert n_bands == np.unique(np.trunc(elev / 100)).size
+            assert avg_change == pytest.approx(np.abs(np.diff(elev)).mean())
+
+            with patch.object(terrain_analysis, "NUMBA_AVAILABLE", False):
+                expected = calculate_terrain_variety(list(elev))
+            assert calculate_terrain_variety(list(elev)) == expected
+
+    def test_outlier_elevation_spans_many_bands(self):
+        """One absurd reading should be counted as a band, not sized into a bitmap"""
+        elev = np.append(np.arange(100.0, 112.0), 1e13)
+
+        n_bands, _ = _terrain_variety_loop(elev)
+
+        assert n_bands == 2
+        assert calculate_terrain_variety(list(elev)) == 4
+
+    def test_infinite_elevations_not_counted(self):
+        """Infinite readings should be skipped like NaN"""
+        elev = np.append(np.arange(100.0, 112.0), [np.inf, -np.inf])
+
+        n_bands, _ = _terrain_variety_loop(elev)
+
+        assert n_bands == 1
+        with patch.object(terrain_analysis, "NUMBA_AVAILABLE", False):
+            assert calculate_terrain_variety(list(elev)) == 3
+
+    def test_batch_matches_per_trail(self):
+        """Packed batch scoring should match scoring each trail alone"""
+        rng = np.random.default_rng(1)
+        profiles = [
+            np.cumsum(rng.normal(0, rng.uniform(1, 40), rng.integers(0, 300)))
+            for _ in range(40)
+        ]
+        expected = [calculate_terrain_variety(list(elev)) for elev in profiles]
+
+        with patch.object(terrain_analysis, "NUMBA_AVAILABLE", True):
+            scores = calculate_terrain_variety_batch(profiles)
+        assert scores.tolist() == expected
+
 
 class TestGetTerrainVarietyDescription:
     """Tests for terrain variety descriptions"""
@@ -107,6 +170,12 @@ class TestGetTerrainVarietyDescription:
         result = get_terrain_variety_description(0.95)
         assert "extreme" in result.lower() or "technical" in result.lower()
 
+    def test_thresholds_inclusive(self):
+        """A score on a threshold should get the higher description"""
+        assert get_terrain_variety_description(8) == get_terrain_variety_description(10)
+        assert get_terrain_variety_description(7.9) == get_terrain_variety_description(6)
+        assert get_terrain_variety_description(1.9).startswith("Flat")
+
 
 class TestGetSurfaceDifficultyMultiplier:
     """Tests for surface difficulty multipliers"""
@@ -159,6 +228,27 @@ class TestEstimateSurfaceTypeFromTerrain:
         assert "surface_type" in result
         assert "confidence" in result
 
+    def test_variance_picks_rocky_terrain(self):
+        """High, varied elevations should estimate rock (population variance)"""
+        coordinates = [[-27.4705, 152.9629], [-27.4710, 152.9635]]
+        # Mean 900 m, population variance exactly 1600 (sample variance 3200)
+        elevation_profile = [{"elevation": e} for e in (860, 940)]
+
+        result = estimate_surface_type_from_terrain(coordinates, elevation_profile)
+
+        assert result[0]["surface"] == "rock"
+
+    def test_same_terrain_shares_segments(self):
+        """Matching terrain should return the same shared segments"""
+        coordinates = [[-27.4705, 152.9629], [-27.4710, 152.9635]]
+        profile = [{"elevation": e} for e in (40, 60)]
+
+        first = estimate_surface_type_from_terrain(coordinates, profile)
+        second = estimate_surface_type_from_terrain(coordinates, profile)
+
+        assert first is second
+        assert [seg["surface"] for seg in first] == ["dirt", "sand", "grass"]
+
 
 class TestCalculateSurfaceDifficultyScore:
     """Tests for surface difficulty scoring"""
@@ -212,3 +302,11 @@ class TestGetWeatherExposureFromScore:
         """Should handle invalid scores gracefully"""
         result = get_weather_exposure_from_score(-1.0)
         assert isinstance(result, str)
+
+    def test_thresholds_inclusive(self):
+        """A score on a threshold should get the higher exposure level"""
+        levels = [
+            get_weather_exposure_from_score(score)["exposure_level"]
+            for score in (1.0, 1.05, 1.15, 1.25, float("nan"), "bad")
+        ]
+        assert levels == ["Low", "Low-Moderate", "Moderate", "High", "Low", "Low"]
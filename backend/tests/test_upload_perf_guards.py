@@ -0,0 +1,96 @@
+"""
+Regression guards for memory/CPU-sensitive behaviour of the upload routes
+"""
+import pytest
+import os
+from unittest.mock import patch, MagicMock
+
+import openpyxl
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+TRAIL2_XLSX = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "LiDAR", "Trail2.xlsx"
+)
+
+
+@pytest.fixture
+def tiny_xlsx(tmp_path):
+    """Small workbook with a <dimension> element (as written by openpyxl)"""
+    path = tmp_path / "tiny.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["layer", "distance", "elevation"])
+    for i in range(5):
+        ws.append(["ground", i * 10, 100 + i])
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def workbook_calls():
+    """Record every openpyxl.load_workbook / calculate_dimension call"""
+    calls = {"load_workbook": [], "calculate_dimension": 0}
+    real_load_workbook = openpyxl.load_workbook
+    real_calculate_dimension = ReadOnlyWorksheet.calculate_dimension
+
+    def record_load_workbook(*args, **kwargs):
+        calls["load_workbook"].append(kwargs)
+        return real_load_workbook(*args, **kwargs)
+
+    def record_calculate_dimension(self, *args, **kwargs):
+        calls["calculate_dimension"] += 1
+        return real_calculate_dimension(self, *args, **kwargs)
+
+    with patch("openpyxl.load_workbook", side_effect=record_load_workbook), patch.object(
+        ReadOnlyWorksheet, "calculate_dimension", record_calculate_dimension
+    ):
+        yield calls
+
+
+def _post_xlsx(client, path):
+    with open(path, "rb") as f:
+        return client.post(
+            "/upload-xlsx",
+            files={"file": (os.path.basename(path), f.read())},
+            data={"trail_id": "1"},
+        )
+
+
+@patch("routes.uploads.supabase_service", None)
+@patch("routes.uploads.supabase", new_callable=MagicMock)
+class TestXlsxUploadGuards:
+    """upload-xlsx must never load a full workbook into memory"""
+
+    @pytest.mark.parametrize("xlsx", ["tiny", "trail2"])
+    def test_raw_reader_skips_openpyxl(
+        self, mock_supabase, xlsx, client, tiny_xlsx, workbook_calls
+    ):
+        """The raw XML reader should handle normal uploads on its own"""
+        path = tiny_xlsx if xlsx == "tiny" else TRAIL2_XLSX
+        response = _post_xlsx(client, path)
+
+        assert response.status_code == 200
+        assert response.json()["metadata"]["num_rows"] > 1
+        assert workbook_calls["load_workbook"] == []
+
+    @pytest.mark.parametrize("xlsx", ["tiny", "trail2"])
+    def test_openpyxl_fallback_is_read_only(
+        self, mock_supabase, xlsx, client, tiny_xlsx, workbook_calls
+    ):
+        """The openpyxl fallback must open workbooks read_only + data_only"""
+        path = tiny_xlsx if xlsx == "tiny" else TRAIL2_XLSX
+        with patch(
+            "routes.uploads._xlsx_first_sheet_part", side_effect=ValueError("bad xml")
+        ):
+            response = _post_xlsx(client, path)
+
+        assert response.status_code == 200
+        assert response.json()["metadata"]["num_rows"] > 1
+        assert workbook_calls["load_workbook"]
+        assert all(
+            c.get("read_only") and c.get("data_only")
+            for c in workbook_calls["load_workbook"]
+        )
+        # Row counts come from <dimension> or a streamed scan, never a full
+        # calculate_dimension() pass over the sheet
+        assert workbook_calls["calculate_dimension"] == 0
@@ -3,13 +3,21 @@ Utility modules for MAPENU backend.
 """
 from .calculations import (
     haversine,
+    haversine_array,
+    haversine_planar,
+    haversine_planar_array,
+    distance,
+    distance_array,
+    cumulative_distances,
     count_rolling_hills,
     analyze_rolling_hills,
-    calculate_trail_similarity
+    calculate_trail_similarity,
+    calculate_trail_similarity_batch
 )
 from .terrain_analysis import (
     get_trail_weather_exposure,
     calculate_terrain_variety,
+    calculate_terrain_variety_batch,
     get_terrain_variety_description,
     get_surface_difficulty_multiplier,
     estimate_surface_type_from_terrain,
@@ -24,11 +32,19 @@ from .dem_processing import (
 
 __all__ = [
     'haversine',
+    'haversine_array',
+    'haversine_planar',
+    'haversine_planar_array',
+    'distance',
+    'distance_array',
+    'cumulative_distances',
     'count_rolling_hills',
     'analyze_rolling_hills',
     'calculate_trail_similarity',
+    'calculate_trail_similarity_batch',
     'get_trail_weather_exposure',
     'calculate_terrain_variety',
+    'calculate_terrain_variety_batch',
     'get_terrain_variety_description',
     'get_surface_difficulty_multiplier',
     'estimate_surface_type_from_terrain',
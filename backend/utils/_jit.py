@@ -0,0 +1,411 @@
+"""
+Optional Numba-compiled kernels.
+
+Numba is not a hard dependency: when it isn't installed the kernels below
+run as plain Python and callers should keep using their NumPy paths
+(check NUMBA_AVAILABLE).
+"""
+import numpy as np
+
+try:
+    import numba
+    from numba import prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    prange = range
+    NUMBA_AVAILABLE = False
+
+
+def _count_hills_loop(elev, min_prominence=1.0):
+    """
+    Scalar peak/valley count, the same rules as count_rolling_hills.
+
+    Args:
+        elev: 1-D float array of elevations in meters
+        min_prominence: Minimum step to a neighbor for a significant hill
+
+    Returns:
+        int: Number of significant peaks + valleys
+    """
+    hills = 0
+    for i in range(1, elev.shape[0] - 1):
+        prev_elev = elev[i - 1]
+        curr_elev = elev[i]
+        next_elev = elev[i + 1]
+
+        if curr_elev > prev_elev and curr_elev > next_elev:
+            if (curr_elev - prev_elev >= min_prominence) or (
+                curr_elev - next_elev >= min_prominence
+            ):
+                hills += 1
+        elif curr_elev < prev_elev and curr_elev < next_elev:
+            if (prev_elev - curr_elev >= min_prominence) or (
+                next_elev - curr_elev >= min_prominence
+            ):
+                hills += 1
+    return hills
+
+
+def _bilinear_sample_loop(grid, rows, cols):
+    """
+    Bilinear interpolation on a regular grid at fractional (row, col) indices.
+
+    Args:
+        grid: 2-D float array; NaN cells propagate to any sample touching them
+        rows, cols: 1-D float arrays of fractional indices into grid
+
+    Returns:
+        np.ndarray: Interpolated values, NaN outside the grid
+    """
+    n_rows, n_cols = grid.shape
+    out = np.empty(rows.shape[0])
+    for k in prange(rows.shape[0]):
+        r = rows[k]
+        c = cols[k]
+        # Also false for NaN indices
+        if not (0.0 <= r <= n_rows - 1 and 0.0 <= c <= n_cols - 1):
+            out[k] = np.nan
+            continue
+        r0 = min(int(r), n_rows - 2)
+        c0 = min(int(c), n_cols - 2)
+        fr = r - r0
+        fc = c - c0
+        top = grid[r0, c0] * (1.0 - fc) + grid[r0, c0 + 1] * fc
+        bottom = grid[r0 + 1, c0] * (1.0 - fc) + grid[r0 + 1, c0 + 1] * fc
+        out[k] = top * (1.0 - fr) + bottom * fr
+    return out
+
+
+def _nearest_valid_loop(valid_rows, valid_cols, query_rows, query_cols):
+    """
+    Index of the nearest valid grid cell for each query cell (brute force).
+
+    Meant for the handful of cells left NaN after interpolation: cost is
+    len(query) * len(valid) with no temporary arrays. Ties go to the first
+    valid cell in the given order.
+
+    Args:
+        valid_rows, valid_cols: 1-D int arrays of valid cell indices
+        query_rows, query_cols: 1-D int arrays of cells to fill
+
+    Returns:
+        np.ndarray: For each query, an index into valid_rows/valid_cols
+    """
+    out = np.empty(query_rows.shape[0], dtype=np.int64)
+    for k in prange(query_rows.shape[0]):
+        best = 0
+        best_dist = np.inf
+        for i in range(valid_rows.shape[0]):
+            dr = valid_rows[i] - query_rows[k]
+            dc = valid_cols[i] - query_cols[k]
+            dist = dr * dr + dc * dc
+            if dist < best_dist:
+                best_dist = dist
+                best = i
+        out[k] = best
+    return out
+
+
+def _grid_min_z_loop(
+    qx, qy, px, py, pz, starts, cell_min_z, x0, y0, cell_size, nx, ny, radius
+):
+    """
+    Lowest z within radius of each query, scanning the 3x3 grid cells around it.
+
+    Points px/py/pz are sorted by cell (cell = col * ny + row) and
+    starts[cell]:starts[cell + 1] spans each cell, as built by
+    lidar_extraction._build_point_grid. Cells whose minimum can't beat the
+    current best are skipped, and cells lying wholly inside the radius
+    contribute their minimum without scanning points.
+
+    Args:
+        qx, qy: 1-D float arrays of query coordinates
+        px, py, pz: 1-D float arrays of grid-sorted points
+        starts: 1-D int array, nx * ny + 1 cell offsets
+        cell_min_z: 1-D float array, lowest z per cell (inf if empty)
+        x0, y0, cell_size, nx, ny: Grid origin, cell edge and shape
+        radius: Search radius (<= cell_size)
+
+    Returns:
+        np.ndarray: Minimum z per query, NaN where no point is in range
+    """
+    r2 = radius * radius
+    out = np.empty(qx.shape[0])
+    for k in prange(qx.shape[0]):
+        qcol = int(np.floor((qx[k] - x0) / cell_size))
+        qrow = int(np.floor((qy[k] - y0) / cell_size))
+        best = np.inf
+        for col in range(max(qcol - 1, 0), min(qcol + 2, nx)):
+            for row in range(max(qrow - 1, 0), min(qrow + 2, ny)):
+                cell = col * ny + row
+                if cell_min_z[cell] >= best:
+                    continue
+                # Farthest corner of the cell within the radius: whole cell counts
+                left = x0 + col * cell_size
+                bottom = y0 + row * cell_size
+                fx = max(abs(qx[k] - left), abs(qx[k] - left - cell_size))
+                fy = max(abs(qy[k] - bottom), abs(qy[k] - bottom - cell_size))
+                if fx * fx + fy * fy <= r2:
+                    best = cell_min_z[cell]
+                    continue
+                for i in range(starts[cell], starts[cell + 1]):
+                    dx = px[i] - qx[k]
+                    dy = py[i] - qy[k]
+                    if dx * dx + dy * dy <= r2 and pz[i] < best:
+                        best = pz[i]
+        out[k] = best if best < np.inf else np.nan
+    return out
+
+
+def _terrain_features_loop(elev, slopes, min_relief, half_window):
+    """
+    Peaks, valleys and steep sections of a profile in one left-to-right pass.
+
+    Same rules as RealDEMAnalyzer.analyze_terrain_features: a peak (valley)
+    is a strict local maximum (minimum) standing more than min_relief above
+    (below) the extreme of elev[i - half_window:i + half_window], and a
+    steep section is any |slope| above 25%. The window is only scanned for
+    local extrema, which are a small fraction of the points.
+
+    Args:
+        elev: 1-D float array of elevations in meters
+        slopes: 1-D float array of grades in percent, same length as elev
+        min_relief: Minimum height of a peak (depth of a valley) in meters
+        half_window: Points either side of i in the relief window
+
+    Returns:
+        tuple: (kinds, indices) int64 arrays, kind 0 = peak, 1 = valley,
+            2 = steep; peaks first, then valleys, then steep sections, each
+            in profile order
+    """
+    n = elev.shape[0]
+    peaks = np.empty(n, dtype=np.int64)
+    valleys = np.empty(n, dtype=np.int64)
+    steep = np.empty(n, dtype=np.int64)
+    n_peaks = 0
+    n_valleys = 0
+    n_steep = 0
+    for i in range(n):
+        if abs(slopes[i]) > 25.0:
+            steep[n_steep] = i
+            n_steep += 1
+        if i == 0 or i == n - 1:
+            continue
+        curr_elev = elev[i]
+        if curr_elev > elev[i - 1] and curr_elev > elev[i + 1]:
+            lowest = curr_elev
+            for j in range(max(0, i - half_window), min(n, i + half_window)):
+                lowest = min(lowest, elev[j])
+            if curr_elev - lowest > min_relief:
+                peaks[n_peaks] = i
+                n_peaks += 1
+        elif curr_elev < elev[i - 1] and curr_elev < elev[i + 1]:
+            highest = curr_elev
+            for j in range(max(0, i - half_window), min(n, i + half_window)):
+                highest = max(highest, elev[j])
+            if highest - curr_elev > min_relief:
+                valleys[n_valleys] = i
+                n_valleys += 1
+
+    total = n_peaks + n_valleys + n_steep
+    kinds = np.empty(total, dtype=np.int64)
+    indices = np.empty(total, dtype=np.int64)
+    kinds[:n_peaks] = 0
+    indices[:n_peaks] = peaks[:n_peaks]
+    kinds[n_peaks : n_peaks + n_valleys] = 1
+    indices[n_peaks : n_peaks + n_valleys] = valleys[:n_valleys]
+    kinds[n_peaks + n_valleys :] = 2
+    indices[n_peaks + n_valleys :] = steep[:n_steep]
+    return kinds, indices
+
+
+def _cumulative_distance_loop(lats, lons, planar_max):
+    """
+    Cumulative distance along a path in one pass, same rules as
+    calculations.distance(): equirectangular for steps under planar_max
+    degrees in both lat and lon, full haversine otherwise.
+
+    Args:
+        lats, lons: 1-D float64 arrays of point coordinates (degrees)
+        planar_max: Largest lat/lon step (degrees) measured as planar
+
+    Returns:
+        np.ndarray: Cumulative distances in meters, starting at 0
+    """
+    R = 6371000.0  # Earth radius in meters
+    n = lats.shape[0]
+    out = np.zeros(n)
+    total = 0.0
+    for i in range(1, n):
+        lat1 = lats[i - 1]
+        lat2 = lats[i]
+        dlat = lat2 - lat1
+        dlon = lons[i] - lons[i - 1]
+        if abs(dlat) < planar_max and abs(dlon) < planar_max:
+            x = np.radians(dlon) * np.cos(np.radians((lat1 + lat2) / 2))
+            total += R * np.hypot(np.radians(dlat), x)
+        else:
+            phi1 = np.radians(lat1)
+            phi2 = np.radians(lat2)
+            a = (
+                np.sin((phi2 - phi1) / 2) ** 2
+                + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(dlon) / 2) ** 2
+            )
+            total += R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        out[i] = total
+    return out
+
+
+# Widest band span (in 100 m bands) _terrain_variety_loop marks in a bitmap
+_VARIETY_BITMAP_MAX_BANDS = 4096
+
+
+def _terrain_variety_loop(elev):
+    """
+    100 m elevation bands and mean absolute step of a profile, for
+    calculate_terrain_variety.
+
+    Bands are trunc(elev / 100) (toward zero), marked in a bitmap spanning
+    the lowest to highest band; NaN and infinite elevations are not counted
+    as a band. A span wider than _VARIETY_BITMAP_MAX_BANDS (one bad reading
+    can make it billions of bands) is counted with np.unique instead.
+
+    Args:
+        elev: 1-D float array of elevations in meters, at least 2 long
+
+    Returns:
+        tuple: (number of distinct bands, mean |elev[i] - elev[i - 1]|)
+    """
+    n = elev.shape[0]
+    lo = np.inf
+    hi = -np.inf
+    sum_abs_diff = 0.0
+    for i in range(n):
+        e = elev[i]
+        if np.isfinite(e):
+            if e < lo:
+                lo = e
+            if e > hi:
+                hi = e
+        if i > 0:
+            sum_abs_diff += abs(e - elev[i - 1])
+    avg_change = sum_abs_diff / (n - 1)
+    if lo > hi:
+        # No finite elevations
+        return 0, avg_change
+
+    lo_band = int(lo / 100.0)
+    span = int(hi / 100.0) - lo_band + 1
+    if span > _VARIETY_BITMAP_MAX_BANDS:
+        finite = elev[np.isfinite(elev)]
+        return np.unique(np.trunc(finite / 100.0)).size, avg_change
+
+    seen = np.zeros(span, dtype=np.bool_)
+    for i in range(n):
+        e = elev[i]
+        if np.isfinite(e):
+            seen[int(e / 100.0) - lo_band] = True
+    return int(seen.sum()), avg_change
+
+
+def _terrain_variety_batch_loop(elev_all, offsets):
+    """
+    _terrain_variety_loop for many profiles, one profile per thread.
+
+    Profiles are stored back to back: profile t is
+    elev_all[offsets[t]:offsets[t + 1]]. Profiles under 2 points get
+    (0, 0.0).
+
+    Args:
+        elev_all: 1-D float64 array of all profiles' elevations
+        offsets: 1-D int64 array, number of profiles + 1 start offsets
+
+    Returns:
+        tuple: (bands, avg_change) arrays, one entry per profile
+    """
+    n_profiles = offsets.shape[0] - 1
+    bands = np.zeros(n_profiles, dtype=np.int64)
+    avg_change = np.zeros(n_profiles)
+    for t in prange(n_profiles):
+        start = offsets[t]
+        end = offsets[t + 1]
+        if end - start < 2:
+            continue
+        bands[t], avg_change[t] = _terrain_variety_jit(elev_all[start:end])
+    return bands, avg_change
+
+
+def _precompiled(loop, signatures, **options):
+    """
+    Numba-compile loop with cache=True for each explicit signature now.
+
+    Signatures compile (or load from the on-disk cache in __pycache__) at
+    import instead of on the first request; other argument types still
+    compile lazily on first use.
+    """
+    kernel = numba.njit(cache=True, **options)(loop)
+    for signature in signatures:
+        kernel.compile(signature)
+    return kernel
+
+
+if NUMBA_AVAILABLE:
+    # No fastmath: it may reorder or drop NaN handling in the comparisons,
+    # which would let results drift from the NumPy implementation
+    _count_hills_jit = _precompiled(
+        _count_hills_loop,
+        ["int64(float64[:], float64)", "int64(float32[:], float64)"],
+    )
+    _bilinear_sample_jit = _precompiled(
+        _bilinear_sample_loop,
+        [
+            "float64[:](float64[:, :], float64[:], float64[:])",
+            "float64[:](float32[:, :], float64[:], float64[:])",
+        ],
+        parallel=True,
+    )
+    _nearest_valid_jit = _precompiled(
+        _nearest_valid_loop,
+        ["int64[:](int64[:], int64[:], int64[:], int64[:])"],
+        parallel=True,
+    )
+    _grid_min_z_jit = _precompiled(
+        _grid_min_z_loop,
+        [
+            f"float64[:](float64[:], float64[:], {xy}[:], {xy}[:], float64[:],"
+            " int64[:], float64[:], float64, float64, float64, int64, int64, float64)"
+            for xy in ("float32", "float64")
+        ],
+        parallel=True,
+    )
+    _terrain_features_jit = _precompiled(
+        _terrain_features_loop,
+        [
+            f"Tuple((int64[:], int64[:]))({dtype}[:], float64[:], float64, int64)"
+            for dtype in ("float32", "float64")
+        ],
+    )
+    _terrain_variety_jit = _precompiled(
+        _terrain_variety_loop,
+        ["Tuple((int64, float64))(float64[:])"],
+    )
+    _terrain_variety_batch_jit = _precompiled(
+        _terrain_variety_batch_loop,
+        ["Tuple((int64[:], float64[:]))(float64[:], int64[:])"],
+        parallel=True,
+    )
+    _cumulative_distance_jit = _precompiled(
+        _cumulative_distance_loop,
+        ["float64[:](float64[:], float64[:], float64)"],
+    )
+else:
+    _count_hills_jit = _count_hills_loop
+    _bilinear_sample_jit = _bilinear_sample_loop
+    _nearest_valid_jit = _nearest_valid_loop
+    _grid_min_z_jit = _grid_min_z_loop
+    _terrain_features_jit = _terrain_features_loop
+    _terrain_variety_jit = _terrain_variety_loop
+    _terrain_variety_batch_jit = _terrain_variety_batch_loop
+    _cumulative_distance_jit = _cumulative_distance_loop
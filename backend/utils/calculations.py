@@ -1,8 +1,27 @@
 """
 Mathematical calculations and trail analysis functions.
 """
+import logging
 import math
 
+import numpy as np
+
+from ._jit import NUMBA_AVAILABLE, _count_hills_jit, _cumulative_distance_jit
+
+logger = logging.getLogger(__name__)
+
+# Elevation profiles are stored as float32: half the bytes of float64, and
+# still ~0.5 mm resolution at Everest's height
+_ELEVATION_DTYPE = np.float32
+
+# Slack on the 1 m significance checks so a step recorded as exactly 1.0 m
+# (e.g. 123.4 -> 124.4) counts whether rounding left it a hair above or below
+_STEP_TOLERANCE = 0.005  # meters
+
+# Largest lat/lon difference (degrees, ~11 km) for which distance() uses the
+# planar approximation instead of the full haversine formula
+PLANAR_MAX_DEGREES = 0.1
+
 
 def haversine(lat1, lon1, lat2, lon2):
     """
@@ -26,6 +45,146 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
+def haversine_array(lat1, lon1, lat2, lon2):
+    """
+    Vectorized haversine: great circle distances between arrays of points.
+
+    Args:
+        lat1, lon1: First points' coordinates (degrees, array-like)
+        lat2, lon2: Second points' coordinates (degrees, array-like, broadcastable)
+
+    Returns:
+        np.ndarray: Distances in meters
+    """
+    R = 6371000  # Earth radius in meters
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_planar(lat1, lon1, lat2, lon2):
+    """
+    Equirectangular approximation of the distance between two nearby points.
+
+    Treats the Earth as flat around the points' mean latitude. Within ~10 km
+    (consecutive GPS fixes, nearby trail starts) it stays within 0.1% of
+    haversine() for a single cos + sqrt, with no atan2 and fewer sin calls.
+    Do not use it across larger distances or the antimeridian.
+
+    Args:
+        lat1, lon1: First point coordinates (degrees)
+        lat2, lon2: Second point coordinates (degrees)
+
+    Returns:
+        float: Distance in meters
+    """
+    R = 6371000  # Earth radius in meters
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return R * math.sqrt(dphi * dphi + dlambda * dlambda)
+
+
+def haversine_planar_array(lat1, lon1, lat2, lon2):
+    """
+    Vectorized haversine_planar (same small-distance regime).
+
+    Args:
+        lat1, lon1: First points' coordinates (degrees, array-like)
+        lat2, lon2: Second points' coordinates (degrees, array-like, broadcastable)
+
+    Returns:
+        np.ndarray: Distances in meters
+    """
+    R = 6371000  # Earth radius in meters
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dlambda = np.radians(np.subtract(lon2, lon1)) * np.cos(
+        np.radians(np.add(lat1, lat2) / 2)
+    )
+    return R * np.hypot(dphi, dlambda)
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """
+    Distance between two points, planar when they are close.
+
+    Uses haversine_planar() when both the lat and lon differences are under
+    PLANAR_MAX_DEGREES, otherwise the full haversine().
+
+    Args:
+        lat1, lon1: First point coordinates (degrees)
+        lat2, lon2: Second point coordinates (degrees)
+
+    Returns:
+        float: Distance in meters
+    """
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    if -PLANAR_MAX_DEGREES < dlat < PLANAR_MAX_DEGREES and (
+        -PLANAR_MAX_DEGREES < dlon < PLANAR_MAX_DEGREES
+    ):
+        # haversine_planar() inlined: this is called per point pair
+        x = math.radians(dlon) * math.cos(math.radians((lat1 + lat2) / 2))
+        return 6371000 * math.hypot(math.radians(dlat), x)
+    return haversine(lat1, lon1, lat2, lon2)
+
+
+def distance_array(lat1, lon1, lat2, lon2):
+    """
+    Vectorized distance(): planar for close pairs, haversine for the rest.
+
+    Args:
+        lat1, lon1: First points' coordinates (degrees, array-like)
+        lat2, lon2: Second points' coordinates (degrees, array-like, broadcastable)
+
+    Returns:
+        np.ndarray: Distances in meters
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (lat1, lon1, lat2, lon2))
+    )
+    result = haversine_planar_array(lat1, lon1, lat2, lon2)
+
+    # Far pairs are rare along a track (GPS gaps), so recompute just those
+    far = np.maximum(np.abs(lat2 - lat1), np.abs(lon2 - lon1)) >= PLANAR_MAX_DEGREES
+    if far.any():
+        result[far] = haversine_array(lat1[far], lon1[far], lat2[far], lon2[far])
+    return result
+
+
+def cumulative_distances(coords):
+    """
+    Cumulative distance along a path of [lat, lon, ...] points.
+
+    Args:
+        coords: Sequence or (N, >=2) array of [lat, lon] points (extra
+            columns such as elevation are ignored)
+
+    Returns:
+        np.ndarray: N cumulative distances in meters, starting at 0
+    """
+    if isinstance(coords, np.ndarray):
+        lats, lons = coords[:, 0].astype(float), coords[:, 1].astype(float)
+    else:
+        n = len(coords)
+        lats = np.fromiter((c[0] for c in coords), dtype=float, count=n)
+        lons = np.fromiter((c[1] for c in coords), dtype=float, count=n)
+
+    if NUMBA_AVAILABLE:
+        # Compiled single pass, no per-step temporary arrays
+        return _cumulative_distance_jit(lats, lons, PLANAR_MAX_DEGREES)
+
+    distances = np.zeros(len(lats))
+    if len(lats) > 1:
+        np.cumsum(
+            distance_array(lats[:-1], lons[:-1], lats[1:], lons[1:]),
+            out=distances[1:],
+        )
+    return distances
+
+
 def count_rolling_hills(elevations):
     """
     Count the number of distinct "hills" (peaks and valleys) in the elevation profile.
@@ -39,7 +198,8 @@ def count_rolling_hills(elevations):
     to filter out GPS noise.
 
     Args:
-        elevations: List of elevation values in meters
+        elevations: List or float ndarray of elevation values in meters
+            (float arrays are used as-is, anything else becomes float32)
 
     Returns:
         int: Number of distinct hills (peaks + valleys)
@@ -47,39 +207,50 @@ def count_rolling_hills(elevations):
     if len(elevations) < 3:
         return 0
 
+    elev = _as_elevation_array(elevations)
+    if NUMBA_AVAILABLE:
+        # Compiled single pass, no temporary diff/mask arrays
+        return int(_count_hills_jit(elev, 1.0 - _STEP_TOLERANCE))
+    return _count_hills_from_diffs(np.diff(elev))
+
+
+def _as_elevation_array(elevations):
+    """Float ndarrays are used as-is; anything else becomes a float32 array"""
+    if isinstance(elevations, np.ndarray) and elevations.dtype.kind == "f":
+        return elevations
+    return np.asarray(elevations, dtype=_ELEVATION_DTYPE)
+
+
+def _count_hills_from_diffs(diffs):
+    """
+    count_rolling_hills on consecutive elevation differences (np.diff of the
+    profile), so callers that already have the diffs don't recompute them.
+    For interior point i: curr - prev == diffs[i-1], next - curr == diffs[i].
+    """
     # Minimum elevation change to be considered significant
     # 1m threshold catches most noticeable hills while filtering extreme GPS noise
-    min_prominence = 1.0  # meters
-
-    peaks = 0
-    valleys = 0
-
-    for i in range(1, len(elevations) - 1):
-        prev_elev = elevations[i - 1]
-        curr_elev = elevations[i]
-        next_elev = elevations[i + 1]
-
-        # Check if this is a local peak (higher than both neighbors)
-        if curr_elev > prev_elev and curr_elev > next_elev:
-            # Check if it's significant enough
-            if (curr_elev - prev_elev >= min_prominence) or (
-                curr_elev - next_elev >= min_prominence
-            ):
-                peaks += 1
-
-        # Check if this is a local valley (lower than both neighbors)
-        elif curr_elev < prev_elev and curr_elev < next_elev:
-            # Check if it's significant enough
-            if (prev_elev - curr_elev >= min_prominence) or (
-                next_elev - curr_elev >= min_prominence
-            ):
-                valleys += 1
+    min_prominence = 1.0 - _STEP_TOLERANCE  # meters
+
+    rise_in = diffs[:-1]  # curr - prev
+    rise_out = diffs[1:]  # next - curr
+
+    # Local peaks (higher than both neighbors) that are significant enough
+    peaks = (
+        (rise_in > 0)
+        & (rise_out < 0)
+        & ((rise_in >= min_prominence) | (-rise_out >= min_prominence))
+    )
+
+    # Local valleys (lower than both neighbors) that are significant enough
+    valleys = (
+        (rise_in < 0)
+        & (rise_out > 0)
+        & ((-rise_in >= min_prominence) | (rise_out >= min_prominence))
+    )
 
     # Total number of hills = peaks + valleys
     # Each represents a change in terrain direction
-    total_hills = peaks + valleys
-
-    return total_hills
+    return int(np.count_nonzero(peaks) + np.count_nonzero(valleys))
 
 
 def analyze_rolling_hills(elevations, distances):
@@ -100,16 +271,16 @@ def analyze_rolling_hills(elevations, distances):
     if len(elevations) < 3:
         return 0.0, 0
 
+    # One diff pass feeds both hill counting and change detection
+    diffs = np.diff(_as_elevation_array(elevations))
+
     # Count actual hills (peaks and valleys)
-    hills_count = count_rolling_hills(elevations)
+    hills_count = _count_hills_from_diffs(diffs)
 
     # For the rolling index calculation, count significant elevation changes
-    threshold = 1  # meters, what counts as a significant change
-    significant_changes = []
-    for i in range(1, len(elevations)):
-        change = elevations[i] - elevations[i - 1]
-        if abs(change) >= threshold:
-            significant_changes.append(abs(change))
+    threshold = 1 - _STEP_TOLERANCE  # meters, what counts as a significant change
+    abs_changes = np.abs(diffs)
+    significant_changes = abs_changes[abs_changes >= threshold]
 
     # Frequency: how many significant changes per km
     total_distance = distances[-1] if distances else 1
@@ -119,8 +290,8 @@ def analyze_rolling_hills(elevations, distances):
 
     # Amplitude: average size of significant changes
     avg_change_size = (
-        sum(significant_changes) / len(significant_changes)
-        if significant_changes
+        float(significant_changes.mean(dtype=np.float64))
+        if len(significant_changes)
         else 0
     )
 
@@ -129,14 +300,16 @@ def analyze_rolling_hills(elevations, distances):
         avg_change_size / 20
     )  # typical big hills are ~20 m per hill
 
-    # Debug output
-    print(f"🔍 Rolling Hills Debug:")
-    print(f"   - Actual hills (peaks + valleys): {hills_count}")
-    print(f"   - Significant elevation changes: {len(significant_changes)}")
-    print(f"   - Total distance: {total_distance:.2f} km")
-    print(f"   - Changes per km: {changes_per_km:.2f}")
-    print(f"   - Avg change size: {avg_change_size:.2f} m")
-    print(f"   - Rolling index (UNCAPPED): {rolling_index:.4f}")
+    logger.debug(
+        "🔍 Rolling hills: hills=%d changes=%d distance=%.2f km "
+        "per_km=%.2f avg_change=%.2f m index=%.4f (uncapped)",
+        hills_count,
+        len(significant_changes),
+        total_distance,
+        changes_per_km,
+        avg_change_size,
+        rolling_index,
+    )
 
     # Return both the rolling index and the count
     return rolling_index, hills_count
@@ -199,3 +372,43 @@ def calculate_trail_similarity(trail1, trail2):
     )
 
     return similarity
+
+
+# Feature columns, similarity scales and weights used by calculate_trail_similarity
+_SIMILARITY_FEATURES = (
+    "distance",
+    "elevation_gain",
+    "difficulty_score",
+    "rolling_hills_index",
+)
+_SIMILARITY_SCALES = np.array([1000, 500, 5, 0.5, 0.5])
+_SIMILARITY_WEIGHTS = np.array([0.25, 0.25, 0.20, 0.15, 0.15])
+
+
+def _similarity_features(trail):
+    """Feature vector for one trail, in _SIMILARITY_SCALES order"""
+    return [trail[key] for key in _SIMILARITY_FEATURES] + [
+        trail.get("surface_difficulty_score", 1.0)
+    ]
+
+
+def calculate_trail_similarity_batch(target, trails):
+    """
+    Similarity of one trail against many, scored exactly like
+    calculate_trail_similarity but in a single vectorized pass.
+
+    Args:
+        target: Trail dict with metrics
+        trails: List of candidate trail dicts
+
+    Returns:
+        np.ndarray: Similarity score (0-1) for each candidate, in input order
+    """
+    if not trails:
+        return np.zeros(0)
+
+    target_feat = np.array(_similarity_features(target), dtype=float)
+    feat = np.array([_similarity_features(t) for t in trails], dtype=float)
+
+    sims = np.maximum(0, 1 - np.abs(feat - target_feat) / _SIMILARITY_SCALES)
+    return sims @ _SIMILARITY_WEIGHTS
@@ -0,0 +1,27 @@
+"""
+Shared Supabase client for scripts and other code outside the FastAPI app.
+"""
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+
+@lru_cache(maxsize=1)
+def get_supabase() -> Client:
+    """
+    Return the process-wide Supabase client, creating it on first use.
+
+    Reusing one client keeps its HTTP sessions (and their keep-alive
+    connections) alive across every table/storage call in the process.
+
+    Returns:
+        Client: Supabase client for SUPABASE_URL / SUPABASE_KEY
+    """
+    load_dotenv()
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise Exception("SUPABASE_URL and SUPABASE_KEY must be set in .env")
+    return create_client(url, key)
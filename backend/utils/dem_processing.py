@@ -2,49 +2,377 @@
 DEM (Digital Elevation Model) processing utilities.
 """
 import os
+import base64
+import copy
 import glob
+import json
+import logging
+import math
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
 import rasterio
-from rasterio.crs import CRS
-from rasterio.warp import transform
-from scipy.interpolate import griddata
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.transform import Affine
+from pyproj import CRS, Transformer
+from pyproj.enums import TransformDirection
+from scipy.ndimage import distance_transform_edt
 
+from ._jit import NUMBA_AVAILABLE, _bilinear_sample_jit, _nearest_valid_jit
 
-def find_relevant_dem_tiles(trail_coords):
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=16)
+def _get_transformer(src_wkt, dst_epsg):
+    """
+    Cached pyproj transformer from a DEM's CRS (as WKT) to an EPSG code.
+
+    Building a Transformer parses the CRS definitions and looks up the
+    operation pipeline, so it is done once per DEM CRS rather than per call.
+
+    Args:
+        src_wkt: Source CRS as WKT (e.g. dem.crs.to_wkt())
+        dst_epsg: Target EPSG code
+
+    Returns:
+        Transformer: always_xy transformer (x/lon first)
+    """
+    return Transformer.from_crs(
+        CRS.from_wkt(src_wkt), CRS.from_epsg(dst_epsg), always_xy=True
+    )
+
+
+def _bilinear_sample(grid, rows, cols):
+    """
+    Bilinear interpolation on a regular grid at fractional (row, col) indices.
+
+    Uses the Numba kernel when available, otherwise the same arithmetic in NumPy.
+
+    Args:
+        grid: 2-D float array; NaN cells propagate to any sample touching them
+        rows, cols: Fractional indices into grid (any matching shape)
+
+    Returns:
+        np.ndarray: Interpolated values shaped like rows, NaN outside the grid
+    """
+    rows = np.asarray(rows, dtype=float)
+    cols = np.asarray(cols, dtype=float)
+    if NUMBA_AVAILABLE:
+        return _bilinear_sample_jit(grid, rows.ravel(), cols.ravel()).reshape(rows.shape)
+
+    n_rows, n_cols = grid.shape
+    inside = (rows >= 0) & (rows <= n_rows - 1) & (cols >= 0) & (cols <= n_cols - 1)
+    r = np.where(inside, rows, 0.0)
+    c = np.where(inside, cols, 0.0)
+    r0 = np.minimum(r.astype(int), n_rows - 2)
+    c0 = np.minimum(c.astype(int), n_cols - 2)
+    fr = r - r0
+    fc = c - c0
+    top = grid[r0, c0] * (1 - fc) + grid[r0, c0 + 1] * fc
+    bottom = grid[r0 + 1, c0] * (1 - fc) + grid[r0 + 1, c0 + 1] * fc
+    return np.where(inside, top * (1 - fr) + bottom * fr, np.nan)
+
+
+DEM_DIR = os.path.join("data", "QSpatial", "DEM", "1 Metre")
+
+# Per-directory cache of tile bounds, so tiles are only opened when they change
+DEM_INDEX_FILENAME = ".dem_bounds_index.json"
+
+# GDAL settings for DEM reads. rasterio.Env is per-thread, so it is entered
+# around each read rather than once at import (requests run in a threadpool).
+# - GDAL_CACHEMAX: block cache in MB, shared by the whole process
+# - GDAL_DISABLE_READDIR_ON_OPEN: don't list the (large) tile directory on
+#   every open; TRUE still probes for sidecar .ovr/.aux.xml files directly
+GDAL_ENV_OPTIONS = {
+    "GDAL_CACHEMAX": 512,
+    "GDAL_DISABLE_READDIR_ON_OPEN": "TRUE",
+    "VSI_CACHE": True,
+}
+
+# Elevations at or below this are fill values (tiles without declared nodata)
+DEM_NODATA_FLOOR = -9999.0
+
+# Concurrent tile reads when a trail spans several DEM tiles
+DEM_READ_WORKERS = 4
+
+# Recent process_dem_for_trail results (LRU). Keys include each tile's mtime,
+# so replacing a tile invalidates results built from it.
+DEM_RESULT_CACHE_SIZE = 128
+_dem_result_cache = OrderedDict()
+
+# Surface grid is sized to the number of DEM samples (about half their
+# per-axis count), within these limits
+SURFACE_GRID_MIN = 16
+SURFACE_GRID_MAX = 30
+
+
+def _surface_grid_size(n_samples):
+    """
+    Side length of the interpolated surface grid for a number of DEM samples.
+
+    Args:
+        n_samples: Number of valid DEM samples under the trail
+
+    Returns:
+        int: Grid size between SURFACE_GRID_MIN and SURFACE_GRID_MAX
+    """
+    return max(SURFACE_GRID_MIN, min(SURFACE_GRID_MAX, math.isqrt(n_samples) // 2))
+
+
+def _tile_bounds_wgs84(path):
+    """
+    Bounds of a DEM tile in lon/lat, read from its header (no pixels decoded).
+
+    Args:
+        path: Path to a .tif DEM tile
+
+    Returns:
+        list: [min_lon, min_lat, max_lon, max_lat]
+    """
+    with rasterio.Env(**GDAL_ENV_OPTIONS), rasterio.open(path, sharing=False) as dem:
+        return list(
+            _get_transformer(dem.crs.to_wkt(), 4326).transform_bounds(*dem.bounds)
+        )
+
+
+@lru_cache(maxsize=4)
+def _glob_dem(dem_dir, mtime_ns):
+    """
+    Sorted .tif paths in dem_dir.
+
+    Cached per directory mtime: adding, removing or renaming a tile changes
+    it, so the directory is only listed again when its contents change.
+
+    Args:
+        dem_dir: Directory holding the DEM tiles
+        mtime_ns: os.stat(dem_dir).st_mtime_ns (cache key only)
+
+    Returns:
+        tuple: Paths of the .tif files in dem_dir
+    """
+    return tuple(sorted(glob.glob(os.path.join(dem_dir, "*.tif"))))
+
+
+def _load_dem_index(dem_dir, dem_files):
+    """
+    Load the tile bounds index for dem_dir, refreshing stale or missing entries.
+
+    Entries are keyed by filename and invalidated by mtime/size, so only new
+    or modified tiles are opened; tiles whose bounds can't be read are kept
+    with bounds None so they aren't retried until they change. The refreshed
+    index is written back atomically when the directory is writable.
+
+    Args:
+        dem_dir: Directory holding the DEM tiles
+        dem_files: Paths of the .tif files currently in dem_dir
+
+    Returns:
+        dict: filename -> {"mtime", "size", "bounds" (or None)}
+    """
+    index_path = os.path.join(dem_dir, DEM_INDEX_FILENAME)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    fresh = {}
+    changed = False
+    for path in dem_files:
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        entry = index.get(name)
+        if entry is None or entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size:
+            try:
+                bounds = _tile_bounds_wgs84(path)
+            except Exception as e:
+                logger.warning("Could not read DEM bounds for %s: %s", name, e)
+                bounds = None
+            entry = {"mtime": stat.st_mtime, "size": stat.st_size, "bounds": bounds}
+            changed = True
+        fresh[name] = entry
+
+    if changed or len(fresh) != len(index):
+        # Write a temp file and swap it in, so concurrent requests never read
+        # a half-written index or interleave their writes
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=dem_dir, prefix=DEM_INDEX_FILENAME + ".", suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(fresh, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logger.warning("Could not write DEM index %s: %s", index_path, e)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    return fresh
+
+
+def find_relevant_dem_tiles(trail_coords, dem_dir=DEM_DIR):
     """
     Find DEM tiles that cover the trail coordinates.
     
     Args:
         trail_coords: List of [lat, lon] coordinates
+        dem_dir: Directory holding the DEM .tif tiles
     
     Returns:
-        list: Paths to relevant DEM .tif files
+        list: Paths to DEM .tif files whose bounds intersect the trail's bounding box
     """
     if not trail_coords:
         return []
 
-    dem_dir = os.path.join("data", "QSpatial", "DEM", "1 Metre")
-
-    if not os.path.exists(dem_dir):
-        print(f"DEM directory not found: {dem_dir}")
+    try:
+        dir_mtime_ns = os.stat(dem_dir).st_mtime_ns
+    except FileNotFoundError:
+        logger.warning("DEM directory not found: %s", dem_dir)
         return []
 
     # Get all available DEM files
-    dem_files = glob.glob(os.path.join(dem_dir, "*.tif"))
+    dem_files = _glob_dem(dem_dir, dir_mtime_ns)
+    index = _load_dem_index(dem_dir, dem_files)
+
+    lats = [coord[0] for coord in trail_coords]
+    lons = [coord[1] for coord in trail_coords]
+    min_lon, min_lat, max_lon, max_lat = min(lons), min(lats), max(lons), max(lats)
+
+    relevant = []
+    for path in dem_files:
+        entry = index.get(os.path.basename(path))
+        if entry is None or entry["bounds"] is None:
+            continue
+        tile_min_lon, tile_min_lat, tile_max_lon, tile_max_lat = entry["bounds"]
+        if (
+            min_lon <= tile_max_lon
+            and max_lon >= tile_min_lon
+            and min_lat <= tile_max_lat
+            and max_lat >= tile_min_lat
+        ):
+            relevant.append(path)
+    return relevant
+
+
+def _nearest_valid_cells(valid, valid_rows, valid_cols, query_rows, query_cols):
+    """
+    Nearest valid grid cell (in grid index space) for each query cell.
+
+    With Numba, a compiled search over just the query cells; otherwise one
+    C-level distance transform over the whole grid.
+
+    Args:
+        valid: 2-D boolean mask of usable cells
+        valid_rows, valid_cols: np.nonzero(valid)
+        query_rows, query_cols: Integer cell indices to look up
+
+    Returns:
+        tuple: (rows, cols) of the nearest valid cells
+    """
+    if NUMBA_AVAILABLE:
+        idx = _nearest_valid_jit(
+            valid_rows.astype(np.int64),
+            valid_cols.astype(np.int64),
+            query_rows.astype(np.int64),
+            query_cols.astype(np.int64),
+        )
+        return valid_rows[idx], valid_cols[idx]
+
+    _, (nearest_row, nearest_col) = distance_transform_edt(~valid, return_indices=True)
+    return nearest_row[query_rows, query_cols], nearest_col[query_rows, query_cols]
+
+
+def _valid_elevation_mask(elevation):
+    """
+    Boolean mask of usable DEM cells, in one vectorized pass.
+
+    Args:
+        elevation: float array of elevations
+
+    Returns:
+        np.ndarray: True where the value is finite and above DEM_NODATA_FLOOR
+    """
+    # NaN/inf compare False, so the isfinite check only needs to catch +inf
+    valid = elevation > DEM_NODATA_FLOOR
+    valid &= elevation != np.inf
+    return valid
+
+
+def _read_tile_onto_grid(path, dst_crs, dst_transform, dst_shape):
+    """
+    Read one DEM tile resampled (nearest) onto an output grid.
+
+    GDAL only decodes the blocks that overlap the grid, and handles tiles
+    whose CRS or pixel alignment differs from the grid.
+
+    Args:
+        path: Path to a .tif DEM tile
+        dst_crs: CRS of the output grid
+        dst_transform: Affine transform of the output grid
+        dst_shape: (height, width) of the output grid
+
+    Returns:
+        np.ndarray: float32 grid, NaN where the tile has no data
+    """
+    height, width = dst_shape
+    with rasterio.Env(**GDAL_ENV_OPTIONS), rasterio.open(
+        path, sharing=False, num_threads="all_cpus"
+    ) as dem, WarpedVRT(
+        dem,
+        crs=dst_crs,
+        transform=dst_transform,
+        width=width,
+        height=height,
+        # Nearest (not average) so nodata pixels never get blended into
+        # real elevations
+        resampling=Resampling.nearest,
+        nodata=np.nan,
+        dtype="float32",
+    ) as vrt:
+        return vrt.read(1)
+
 
-    # For simplified version, return first 4 tiles
-    # In production, filter by bounds
-    return dem_files[:4]
+def _encode_surface_z(zi_grid, z_format):
+    """
+    Encode the surface elevation grid for the response.
 
+    Args:
+        zi_grid: 2-D elevation grid
+        z_format: "json" for a nested list under "z", or "binary" for
+            little-endian float32 bytes, base64-encoded under "z_f32_b64"
+            (decode with new Float32Array(bytes.buffer) and z_shape)
 
-def process_dem_for_trail(trail_coords, dem_files, resolution_factor=4):
+    Returns:
+        dict: Surface keys to merge into the surface payload
+    """
+    if z_format == "binary":
+        return {
+            "z_f32_b64": base64.b64encode(zi_grid.astype("<f4").tobytes()).decode("ascii"),
+            "z_shape": list(zi_grid.shape),
+        }
+    if z_format == "json":
+        return {"z": zi_grid.tolist()}
+    raise ValueError(f"Unknown surface format: {z_format}")
+
+
+def process_dem_for_trail(trail_coords, dem_files, resolution_factor=4, z_format="json"):
     """
     Process DEM data for 3D visualization of a trail.
+
+    Results are memoized on the trail coordinates, DEM files (and their
+    mtimes) and resolution; callers get their own copy of a cached result.
     
     Args:
         trail_coords: List of [lat, lon] trail coordinates
         dem_files: List of DEM file paths
         resolution_factor: Downsampling factor (higher = faster but lower quality)
+        z_format: Surface elevation encoding, "json" (nested list) or "binary"
+            (base64 float32, see _encode_surface_z)
     
     Returns:
         dict: Processed terrain data with surface and trail_line, or None
@@ -53,136 +381,236 @@ def process_dem_for_trail(trail_coords, dem_files, resolution_factor=4):
         return None
 
     try:
-        print(
-            f"Processing DEM with {len(dem_files)} files and {len(trail_coords)} trail coordinates"
+        key = (
+            tuple((coord[0], coord[1]) for coord in trail_coords),
+            tuple((path, os.path.getmtime(path)) for path in dem_files),
+            resolution_factor,
         )
+    except OSError:
+        key = None
+
+    cached = _dem_result_cache.get(key) if key is not None else None
+    if cached is not None:
+        _dem_result_cache.move_to_end(key)
+    else:
+        cached = _build_dem_surface(trail_coords, dem_files, resolution_factor)
+        if cached is None:
+            # Failures aren't cached, so a transient read error can be retried
+            return None
+        if key is not None:
+            _dem_result_cache[key] = cached
+            while len(_dem_result_cache) > DEM_RESULT_CACHE_SIZE:
+                _dem_result_cache.popitem(last=False)
 
-        # Calculate bounding box for the trail
-        lats = [coord[0] for coord in trail_coords]
-        lons = [coord[1] for coord in trail_coords]
+    # The cached result keeps z as an array; encode it into a fresh copy
+    result = copy.deepcopy(cached)
+    result["surface"].update(_encode_surface_z(result["surface"].pop("z"), z_format))
+    return result
 
-        min_lat, max_lat = min(lats), max(lats)
-        min_lon, max_lon = min(lons), max(lons)
 
-        print(
-            f"Trail bounds: lat {min_lat:.6f} to {max_lat:.6f}, lon {min_lon:.6f} to {max_lon:.6f}"
+def _build_dem_surface(trail_coords, dem_files, resolution_factor):
+    """Uncached body of process_dem_for_trail"""
+    try:
+        logger.debug(
+            "Processing DEM with %d files and %d trail coordinates",
+            len(dem_files),
+            len(trail_coords),
+        )
+
+        # Calculate bounding box for the trail (extra columns, e.g. elevation,
+        # are ignored)
+        coords = np.asarray(trail_coords, dtype=float)[:, :2]
+        lats, lons = coords[:, 0], coords[:, 1]
+
+        min_lat, max_lat = float(lats.min()), float(lats.max())
+        min_lon, max_lon = float(lons.min()), float(lons.max())
+
+        logger.debug(
+            "Trail bounds: lat %.6f to %.6f, lon %.6f to %.6f",
+            min_lat,
+            max_lat,
+            min_lon,
+            max_lon,
         )
 
         # Try to process real DEM data
         try:
-            with rasterio.open(dem_files[0]) as dem:
-                print(f"DEM CRS: {dem.crs}")
-                print(f"DEM bounds: {dem.bounds}")
-                print(f"DEM shape: {dem.shape}")
-
-                elevation_data = dem.read(1)
-                transform_matrix = dem.transform
-
-                # Get subset for performance
-                height, width = elevation_data.shape
-                step = resolution_factor * 10
-
-                subset_height = height // step
-                subset_width = width // step
-
-                if subset_height < 10 or subset_width < 10:
-                    raise ValueError("DEM subset too small")
-
-                # Extract elevation points
-                x_coords = []
-                y_coords = []
-                elevations = []
-
-                for i in range(0, subset_height):
-                    for j in range(0, subset_width):
-                        row = i * step
-                        col = j * step
-                        if row < height and col < width:
-                            elevation = float(elevation_data[row, col])
-                            if not np.isnan(elevation) and elevation > -9999:
-                                x, y = rasterio.transform.xy(transform_matrix, row, col)
-                                lon, lat = transform(
-                                    dem.crs, CRS.from_epsg(4326), [x], [y]
-                                )
-                                x_coords.append(lon[0])
-                                y_coords.append(lat[0])
-                                elevations.append(elevation)
-
-                print(f"Extracted {len(elevations)} elevation points from DEM")
-
-                if len(elevations) >= 100:
-                    # Create regular grid for 3D surface
-                    grid_size = 30
-                    x_min, x_max = min(x_coords), max(x_coords)
-                    y_min, y_max = min(y_coords), max(y_coords)
-
-                    xi = np.linspace(x_min, x_max, grid_size)
-                    yi = np.linspace(y_min, y_max, grid_size)
-                    xi_grid, yi_grid = np.meshgrid(xi, yi)
-
-                    # Interpolate elevations onto regular grid
-                    points = np.column_stack((x_coords, y_coords))
-                    zi_grid = griddata(
-                        points, elevations, (xi_grid, yi_grid), method="linear"
+            # The first tile defines the working CRS and native pixel grid
+            with rasterio.Env(**GDAL_ENV_OPTIONS), rasterio.open(
+                dem_files[0], sharing=False
+            ) as dem:
+                dem_crs = dem.crs
+                origin_x, origin_y = dem.transform.c, dem.transform.f
+                res_x, res_y = dem.res
+            logger.debug("DEM CRS: %s", dem_crs)
+
+            to_wgs84 = _get_transformer(dem_crs.to_wkt(), 4326)
+            step = resolution_factor * 10
+
+            # Output grid over the trail's bounding box (in the DEM's CRS),
+            # padded by 10 cells on each side, snapped to the native pixel grid,
+            # one cell per step x step native pixels
+            minx, miny, maxx, maxy = to_wgs84.transform_bounds(
+                min_lon, min_lat, max_lon, max_lat, direction=TransformDirection.INVERSE
+            )
+            cell_x, cell_y = step * res_x, step * res_y
+            left = origin_x + np.floor((minx - 10 * cell_x - origin_x) / res_x) * res_x
+            top = origin_y - np.floor((origin_y - maxy - 10 * cell_y) / res_y) * res_y
+            subset_width = int(np.ceil((maxx + 10 * cell_x - left) / cell_x))
+            subset_height = int(np.ceil((top - miny + 10 * cell_y) / cell_y))
+            transform_matrix = Affine(cell_x, 0.0, left, 0.0, -cell_y, top)
+
+            if subset_height < 10 or subset_width < 10:
+                raise ValueError("DEM subset too small")
+
+            # Resample every tile onto the grid concurrently (GDAL releases the
+            # GIL while reading), then mosaic: first valid value wins
+            def read_tile(path):
+                return _read_tile_onto_grid(
+                    path, dem_crs, transform_matrix, (subset_height, subset_width)
+                )
+
+            # Preallocated mosaic; each tile is merged in (in file order) as
+            # soon as it is read, so at most one finished tile is held at once
+            sub = np.full((subset_height, subset_width), np.nan, dtype=np.float32)
+            valid = np.zeros((subset_height, subset_width), dtype=bool)
+
+            def merge_tile(tile):
+                fill = _valid_elevation_mask(tile)
+                fill &= ~valid
+                np.copyto(sub, tile, where=fill)
+                valid[fill] = True
+
+            if len(dem_files) == 1:
+                merge_tile(read_tile(dem_files[0]))
+            else:
+                with ThreadPoolExecutor(
+                    max_workers=min(DEM_READ_WORKERS, len(dem_files))
+                ) as pool:
+                    for tile in pool.map(read_tile, dem_files):
+                        merge_tile(tile)
+            logger.debug(
+                "Read %d DEM tile(s) onto a %dx%d grid",
+                len(dem_files),
+                subset_height,
+                subset_width,
+            )
+
+            # Row/col of every valid cell (row-major, same order as sub[valid])
+            rows, cols = np.nonzero(valid)
+            elevations = sub[valid].astype(float)
+
+            # Sample centres in the DEM's CRS (affine math, as rasterio.transform.xy),
+            # then one batched reprojection to lon/lat with a cached transformer
+            xs, ys = transform_matrix * (cols + 0.5, rows + 0.5)
+            x_coords, y_coords = to_wgs84.transform(xs, ys)
+
+            logger.debug("Extracted %d elevation points from DEM", len(elevations))
+
+            if len(elevations) >= 100:
+                # Create regular grid for 3D surface, no finer than the samples
+                grid_size = _surface_grid_size(len(elevations))
+                x_min, x_max = x_coords.min(), x_coords.max()
+                y_min, y_max = y_coords.min(), y_coords.max()
+
+                xi = np.linspace(x_min, x_max, grid_size)
+                yi = np.linspace(y_min, y_max, grid_size)
+                xi_grid, yi_grid = np.meshgrid(xi, yi)
+
+                # The samples already sit on a regular grid in the DEM's CRS,
+                # so interpolate there: map lon/lat back to fractional
+                # indices into `sub` and blend the 4 surrounding samples
+                grid = np.where(valid, sub, np.nan)
+                to_pixel = ~transform_matrix
+
+                def sample_index(lon, lat):
+                    shape = np.shape(lon)
+                    # Lists, as pyproj's single-point fast path would call
+                    # float() on a 1-element array
+                    x, y = to_wgs84.transform(
+                        np.ravel(lon).tolist(),
+                        np.ravel(lat).tolist(),
+                        direction=TransformDirection.INVERSE,
                     )
+                    col, row = to_pixel * (
+                        np.reshape(x, shape),
+                        np.reshape(y, shape),
+                    )
+                    # sub[i, j] is the sample centred on (i + 0.5, j + 0.5)
+                    return row - 0.5, col - 0.5
 
-                    # Fill NaN values
-                    mask = np.isnan(zi_grid)
-                    if np.any(mask):
-                        zi_grid_filled = griddata(
-                            points, elevations, (xi_grid, yi_grid), method="nearest"
+                def sample_elevation(lon, lat):
+                    sub_row, sub_col = sample_index(lon, lat)
+                    z = _bilinear_sample(grid, sub_row, sub_col)
+                    # Fill NaN (nodata or off-grid) from the nearest valid sample
+                    missing = np.isnan(z)
+                    if np.any(missing):
+                        r = np.clip(np.rint(sub_row[missing]), 0, subset_height - 1)
+                        c = np.clip(np.rint(sub_col[missing]), 0, subset_width - 1)
+                        near_r, near_c = _nearest_valid_cells(
+                            valid, rows, cols, r.astype(int), c.astype(int)
                         )
-                        zi_grid[mask] = zi_grid_filled[mask]
-
-                    # Process trail line
-                    trail_line = []
-                    for coord in trail_coords[::5]:
-                        lat, lon = coord
-                        if x_min <= lon <= x_max and y_min <= lat <= y_max:
-                            trail_elev = griddata(
-                                points, elevations, (lon, lat), method="linear"
-                            )
-                            if np.isnan(trail_elev):
-                                trail_elev = griddata(
-                                    points, elevations, (lon, lat), method="nearest"
-                                )
-
-                            if not np.isnan(trail_elev):
-                                trail_line.append(
-                                    {"x": lon, "y": lat, "z": float(trail_elev)}
-                                )
-
-                    surface_data = {
-                        "x": xi.tolist(),
-                        "y": yi.tolist(),
-                        "z": zi_grid.tolist(),
-                        "bounds": {
-                            "x_min": float(x_min),
-                            "x_max": float(x_max),
-                            "y_min": float(y_min),
-                            "y_max": float(y_max),
-                            "z_min": float(np.nanmin(zi_grid)),
-                            "z_max": float(np.nanmax(zi_grid)),
-                        },
-                    }
-
-                    return {
-                        "surface": surface_data,
-                        "trail_line": trail_line,
-                        "metadata": {
-                            "grid_size": grid_size,
-                            "num_trail_points": len(trail_line),
-                            "elevation_range": float(
-                                np.nanmax(zi_grid) - np.nanmin(zi_grid)
-                            ),
-                            "data_source": "Brisbane DEM",
-                        },
-                    }
+                        z[missing] = grid[near_r, near_c]
+                    return z
+
+                # Trail line: every 5th point inside the surface
+                trail_lats, trail_lons = lats[::5], lons[::5]
+                inside = (
+                    (trail_lons >= x_min)
+                    & (trail_lons <= x_max)
+                    & (trail_lats >= y_min)
+                    & (trail_lats <= y_max)
+                )
+                trail_lats, trail_lons = trail_lats[inside], trail_lons[inside]
+
+                # Interpolate the regular surface grid and the trail points in
+                # one pass (one reprojection, one bilinear call; NaN filled
+                # from the nearest valid sample)
+                n_grid = grid_size * grid_size
+                z = sample_elevation(
+                    np.concatenate((xi_grid.ravel(), trail_lons)),
+                    np.concatenate((yi_grid.ravel(), trail_lats)),
+                )
+                zi_grid = z[:n_grid].reshape(grid_size, grid_size)
+                trail_elevs = z[n_grid:]
+                trail_line = [
+                    {"x": lon, "y": lat, "z": z}
+                    for lon, lat, z in zip(
+                        trail_lons.tolist(), trail_lats.tolist(), trail_elevs.tolist()
+                    )
+                ]
+
+                surface_data = {
+                    "x": xi.tolist(),
+                    "y": yi.tolist(),
+                    "z": zi_grid,
+                    "bounds": {
+                        "x_min": float(x_min),
+                        "x_max": float(x_max),
+                        "y_min": float(y_min),
+                        "y_max": float(y_max),
+                        "z_min": float(np.nanmin(zi_grid)),
+                        "z_max": float(np.nanmax(zi_grid)),
+                    },
+                }
+
+                return {
+                    "surface": surface_data,
+                    "trail_line": trail_line,
+                    "metadata": {
+                        "grid_size": grid_size,
+                        "num_trail_points": len(trail_line),
+                        "elevation_range": float(
+                            np.nanmax(zi_grid) - np.nanmin(zi_grid)
+                        ),
+                        "data_source": "Brisbane DEM",
+                    },
+                }
 
         except Exception as dem_error:
-            print(f"DEM processing failed: {dem_error}")
+            logger.warning("DEM processing failed: %s", dem_error)
             return None
 
     except Exception as e:
-        print(f"Error processing DEM: {e}")
+        logger.warning("Error processing DEM: %s", e)
         return None
@@ -4,13 +4,424 @@ Extracts elevation profiles from .las/.laz LiDAR point cloud files
 Now supports Supabase Storage with local caching
 """
 
+import json
+import logging
+import shutil
 import laspy
+from laspy import DecompressionSelection, LazBackend
 import numpy as np
 from scipy.spatial import cKDTree
 from pyproj import Transformer
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, NamedTuple
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from ._jit import NUMBA_AVAILABLE, _grid_min_z_jit
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _wgs84_to_mga56() -> Transformer:
+    """Shared WGS84 -> GDA94 MGA Zone 56 transformer (building one is slow)"""
+    return Transformer.from_crs("EPSG:4326", "EPSG:28356", always_xy=True)
+
+
+# Use the KD-tree instead of a grid index when the grid would have more than
+# this many cells per point (very sparse clouds or tiny search radii)
+MAX_GRID_CELLS_PER_POINT = 4
+
+
+class PointGrid(NamedTuple):
+    """
+    LiDAR points bucketed into square cells for fixed-radius queries.
+
+    Points are sorted by cell id (cell = col * ny + row); the points of a
+    cell are x/y/z[starts[cell]:starts[cell + 1]]. cell_min_z is the lowest
+    z in each cell (inf when empty), a min-Z raster of the tile.
+    """
+
+    x0: float
+    y0: float
+    cell_size: float
+    nx: int
+    ny: int
+    starts: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    cell_min_z: np.ndarray
+
+
+def _build_point_grid(x, y, z, cell_size: float) -> Optional[PointGrid]:
+    """
+    Bucket points into a uniform grid in one counting-sort pass.
+
+    Args:
+        x, y, z: Point coordinates and elevations
+        cell_size: Cell edge in meters (the search radius)
+
+    Returns:
+        PointGrid, or None if the grid would be too sparse to be worth it
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) == 0 or not cell_size > 0:
+        return None
+
+    x0, y0 = float(x.min()), float(y.min())
+    nx = int((float(x.max()) - x0) / cell_size) + 1
+    ny = int((float(y.max()) - y0) / cell_size) + 1
+    if nx * ny > MAX_GRID_CELLS_PER_POINT * len(x):
+        return None
+
+    # Cells in float64, exactly as the queries compute theirs
+    col = (np.subtract(x, x0, dtype=np.float64) / cell_size).astype(np.int64)
+    row = (np.subtract(y, y0, dtype=np.float64) / cell_size).astype(np.int64)
+
+    cell = col * ny + row
+    order = np.argsort(cell, kind="stable")
+    counts = np.bincount(cell, minlength=nx * ny)
+    starts = np.zeros(nx * ny + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    sorted_z = np.asarray(z, dtype=np.float64)[order]
+
+    cell_min_z = np.full(nx * ny, np.inf)
+    occupied = counts > 0
+    cell_min_z[occupied] = np.minimum.reduceat(sorted_z, starts[:-1][occupied])
+
+    return PointGrid(
+        x0, y0, float(cell_size), nx, ny, starts,
+        x[order], y[order], sorted_z, cell_min_z,
+    )
+
+
+def _grid_min_z(grid: PointGrid, qx, qy, radius: float) -> np.ndarray:
+    """
+    Lowest z within radius of each query point, scanning the 3x3 cells
+    around it (radius <= grid.cell_size).
+
+    Returns:
+        np.ndarray: Minimum z per query, NaN where no point is in range
+    """
+    if NUMBA_AVAILABLE:
+        # Compiled scan, parallel over queries, no candidate arrays
+        return _grid_min_z_jit(
+            qx, qy, grid.x, grid.y, grid.z, grid.starts, grid.cell_min_z,
+            grid.x0, grid.y0, grid.cell_size, grid.nx, grid.ny, float(radius),
+        )
+
+    n = len(qx)
+    qcol = np.floor((qx - grid.x0) / grid.cell_size).astype(np.int64)
+    qrow = np.floor((qy - grid.y0) / grid.cell_size).astype(np.int64)
+
+    # Candidate cells: (n, 9) neighbours of each query's cell
+    d = np.array([-1, 0, 1])
+    cols = (qcol[:, None] + np.repeat(d, 3)[None, :])
+    rows = (qrow[:, None] + np.tile(d, 3)[None, :])
+    inside = (cols >= 0) & (cols < grid.nx) & (rows >= 0) & (rows < grid.ny)
+    cells = np.where(inside, cols * grid.ny + rows, 0)
+    begin = grid.starts[cells]
+    lengths = np.where(inside, grid.starts[cells + 1] - begin, 0).ravel()
+
+    # Flatten every candidate point (query index, point index)
+    total = int(lengths.sum())
+    out = np.full(n, np.nan)
+    if total == 0:
+        return out
+    seg_start = np.cumsum(lengths) - lengths
+    point = np.repeat(begin.ravel() - seg_start, lengths) + np.arange(total)
+    query = np.repeat(np.arange(n * 9) // 9, lengths)
+
+    dist2 = (grid.x[point] - qx[query]) ** 2 + (grid.y[point] - qy[query]) ** 2
+    z = np.where(dist2 <= radius * radius, grid.z[point], np.inf)
+
+    # Per-query minimum over its (contiguous) candidates
+    per_query = lengths.reshape(n, 9).sum(axis=1)
+    has = per_query > 0
+    offsets = (np.cumsum(per_query) - per_query)[has]
+    out[has] = np.minimum.reduceat(z, offsets)
+    out[np.isinf(out)] = np.nan
+    return out
+
+
+def _pack_xy(x, y) -> np.ndarray:
+    """
+    x/y columns as one (N, 2) float64 array for cKDTree.
+
+    Filled in place into a single buffer of the dtype cKDTree works in, so
+    float32 tile offsets are converted once and the tree uses it without
+    copying again.
+    """
+    xy = np.empty((len(x), 2), dtype=np.float64)
+    xy[:, 0] = x
+    xy[:, 1] = y
+    return xy
+
+
+def _kdtree_min_z(x, y, z, qx, qy, radius: float) -> np.ndarray:
+    """
+    Lowest z within radius of each query point, via a KD-tree.
+
+    Fallback for point clouds too sparse for a grid index.
+    """
+    # Unbalanced, non-compact tree: much faster to build, and queries on
+    # unordered LiDAR points are barely slower
+    kdtree = cKDTree(_pack_xy(x, y), leafsize=32, balanced_tree=False, compact_nodes=False)
+    z = np.ascontiguousarray(z, dtype=np.float64)
+    # All query points in one batched call (threaded across cores)
+    neighbors = kdtree.query_ball_point(
+        _pack_xy(qx, qy), r=radius, workers=-1, return_sorted=False
+    )
+    counts = np.fromiter(map(len, neighbors), dtype=np.intp, count=len(neighbors))
+    hit = counts > 0
+
+    out = np.full(len(qx), np.nan)
+    if np.any(hit):
+        flat = np.concatenate(neighbors[hit]).astype(np.intp)
+        starts = np.concatenate(([0], np.cumsum(counts[hit])[:-1]))
+        out[hit] = np.minimum.reduceat(z[flat], starts)
+    return out
+
+
+@lru_cache(maxsize=256)
+def _las_header_bounds(las_file_path: str, mtime_ns: int) -> Dict[str, float]:
+    """
+    x/y bounds of a LAS/LAZ file from its header (no points are decoded).
+
+    Cached per file and mtime (mtime_ns is only part of the cache key).
+    """
+    with laspy.open(las_file_path) as reader:
+        header = reader.header
+        return {
+            "min_x": float(header.x_min),
+            "max_x": float(header.x_max),
+            "min_y": float(header.y_min),
+            "max_y": float(header.y_max),
+        }
+
+
+# Downloads: read size per iteration, and files at least this big are
+# fetched as DOWNLOAD_PARTS concurrent HTTP Range requests
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+DOWNLOAD_PARTS = 8
+DOWNLOAD_PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+
+@lru_cache(maxsize=1)
+def _http_session() -> requests.Session:
+    """Process-wide HTTP session, so downloads reuse keep-alive connections"""
+    return requests.Session()
+
+
+def _download_in_ranges(session, file_url: str, path: str, size: int) -> bool:
+    """
+    Download file_url into path as DOWNLOAD_PARTS concurrent Range requests.
+
+    Each part is written at its offset in a preallocated file.
+
+    Returns:
+        bool: False if the server ignored the Range header (nothing usable
+        was written); errors are raised
+    """
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+    bounds = np.linspace(0, size, DOWNLOAD_PARTS + 1).astype(np.int64)
+
+    def fetch(part):
+        start, end = int(bounds[part]), int(bounds[part + 1])
+        response = session.get(
+            file_url,
+            headers={"Range": f"bytes={start}-{end - 1}"},
+            stream=True,
+            timeout=300,
+        )
+        with response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                return False
+            written = 0
+            with open(path, "r+b") as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    f.write(chunk)
+                    written += len(chunk)
+        if written != end - start:
+            raise IOError(f"Incomplete range {start}-{end - 1}: got {written} bytes")
+        return True
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_PARTS) as pool:
+        return all(pool.map(fetch, range(DOWNLOAD_PARTS)))
+
+
+# LiDAR tiles (ground points, grid index) kept in memory between requests
+LIDAR_CACHE_SIZE = 2
+
+
+# LAZ decoding: decompress chunks on all cores when lazrs is installed, and
+# only the layers _read_ground_points uses (LAS 1.4 point formats store
+# intensity, GPS time, colour, ... as separately compressed layers)
+LAZ_BACKEND = LazBackend.LazrsParallel if LazBackend.LazrsParallel.is_available() else None
+GROUND_POINT_FIELDS = (
+    DecompressionSelection.XY_RETURNS_CHANNEL
+    | DecompressionSelection.Z
+    | DecompressionSelection.CLASSIFICATION
+)
+
+
+# Decoded ground points are saved next to each LAS/LAZ file, in
+# <file><suffix>/ as x.npy, y.npy, z.npy + meta.json, and memory-mapped
+# on later loads instead of decoding the file again
+GROUND_SIDECAR_SUFFIX = ".ground"
+
+
+# Concurrent trails per tile in LiDARExtractor.extract_many
+EXTRACT_WORKERS = 4
+
+
+# Points decoded per chunk when streaming a LAS/LAZ file
+LAS_CHUNK_POINTS = 1_000_000
+
+
+def _read_ground_points(las_file_path: str):
+    """
+    Stream a LAS/LAZ file and keep only x/y/z of ground points (class 2).
+
+    Points are read in chunks, so the full point records (intensity, GPS
+    time, colour, ...) are never held in memory at once. Files without any
+    ground-classified points fall back to all points.
+
+    x/y are float32 offsets from origin, the floored header minimum: float32
+    cannot hold absolute MGA northings (~7e6 m) to better than 0.5 m, but
+    resolves offsets within a tile to well under a millimetre. z stays
+    float64 so elevations are returned exactly as stored.
+
+    Args:
+        las_file_path: Path to the .las/.laz file
+
+    Returns:
+        tuple: (x, y, z, origin, header); absolute x = x + origin[0]
+    """
+
+    def read(ground_only):
+        xs, ys, zs = [], [], []
+        with laspy.open(
+            las_file_path,
+            laz_backend=LAZ_BACKEND,
+            decompression_selection=GROUND_POINT_FIELDS,
+        ) as reader:
+            header = reader.header
+            origin = (float(np.floor(header.x_min)), float(np.floor(header.y_min)))
+            for points in reader.chunk_iterator(LAS_CHUNK_POINTS):
+                x, y, z = np.asarray(points.x), np.asarray(points.y), np.asarray(points.z)
+                if ground_only:
+                    mask = np.asarray(points.classification) == 2  # Class 2 = Ground
+                    x, y, z = x[mask], y[mask], z[mask]
+                xs.append((x - origin[0]).astype(np.float32))
+                ys.append((y - origin[1]).astype(np.float32))
+                zs.append(z)
+        if not xs:
+            empty = np.empty(0, dtype=np.float32)
+            return empty, empty, np.empty(0), origin, header
+        return np.concatenate(xs), np.concatenate(ys), np.concatenate(zs), origin, header
+
+    lidar_x, lidar_y, lidar_z, origin, header = read(ground_only=True)
+    logger.debug("Total LiDAR points: %d", header.point_count)
+    if len(lidar_x):
+        logger.debug("Filtered to %d ground points (class 2)", len(lidar_x))
+        return lidar_x, lidar_y, lidar_z, origin, header
+
+    # No ground classification: second pass keeping every point
+    logger.info("No ground classification in %s, using all points", las_file_path)
+    return read(ground_only=False)
+
+
+def _load_ground_sidecar(las_file_path: str, mtime_ns: int):
+    """
+    Ground points saved by _save_ground_sidecar, memory-mapped read-only.
+
+    Returns:
+        tuple: As _read_ground_points, or None if there is no side-car or it
+        was written for a different version of the file
+    """
+    sidecar = las_file_path + GROUND_SIDECAR_SUFFIX
+    try:
+        with open(os.path.join(sidecar, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["mtime_ns"] != mtime_ns or meta["size"] != os.path.getsize(las_file_path):
+            return None
+        lidar_x, lidar_y, lidar_z = (
+            np.load(os.path.join(sidecar, f"{name}.npy"), mmap_mode="r")
+            for name in ("x", "y", "z")
+        )
+        # Header only, no points decoded
+        with laspy.open(las_file_path) as reader:
+            header = reader.header
+    except (OSError, ValueError, KeyError):
+        return None
+    return lidar_x, lidar_y, lidar_z, tuple(meta["origin"]), header
+
+
+def _save_ground_sidecar(las_file_path: str, mtime_ns: int, lidar_x, lidar_y, lidar_z, origin):
+    """
+    Save decoded ground points for _load_ground_sidecar.
+
+    Written to a temporary directory and renamed into place; a read-only
+    data directory just means no side-car.
+    """
+    sidecar = las_file_path + GROUND_SIDECAR_SUFFIX
+    tmp = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        for name, arr in (("x", lidar_x), ("y", lidar_y), ("z", lidar_z)):
+            np.save(os.path.join(tmp, f"{name}.npy"), arr)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "mtime_ns": mtime_ns,
+                    "size": os.path.getsize(las_file_path),
+                    "origin": list(origin),
+                },
+                f,
+            )
+        shutil.rmtree(sidecar, ignore_errors=True)
+        os.replace(tmp, sidecar)
+    except OSError as e:
+        logger.warning("Could not save ground points for %s: %s", os.path.basename(las_file_path), e)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+@lru_cache(maxsize=LIDAR_CACHE_SIZE)
+def _load_ground_points(las_file_path: str, mtime_ns: int):
+    """
+    _read_ground_points, cached per file and mtime (mtime_ns is only part of
+    the cache key, so a rewritten file is read again).
+
+    Across restarts the points come from the file's side-car when it is
+    current, skipping LAS/LAZ decoding. The arrays are shared between
+    callers and read-only.
+    """
+    points = _load_ground_sidecar(las_file_path, mtime_ns)
+    if points is None:
+        points = _read_ground_points(las_file_path)
+        _save_ground_sidecar(las_file_path, mtime_ns, *points[:4])
+    lidar_x, lidar_y, lidar_z, origin, header = points
+    for arr in (lidar_x, lidar_y, lidar_z):
+        arr.setflags(write=False)
+    return lidar_x, lidar_y, lidar_z, origin, header
+
+
+@lru_cache(maxsize=LIDAR_CACHE_SIZE)
+def _load_point_grid(las_file_path: str, mtime_ns: int, cell_size: float):
+    """Grid index of a file's ground points, cached like _load_ground_points"""
+    lidar_x, lidar_y, lidar_z, _, _ = _load_ground_points(las_file_path, mtime_ns)
+    grid = _build_point_grid(lidar_x, lidar_y, lidar_z, cell_size)
+    if grid is not None:
+        for arr in (grid.starts, grid.x, grid.y, grid.z, grid.cell_min_z):
+            arr.setflags(write=False)
+    return grid
 
 
 class LiDARExtractor:
@@ -29,9 +440,31 @@ class LiDARExtractor:
         # Store supabase client for database queries
         self.supabase = supabase_client
 
+        # Database bounds of _lidar_files, see _stored_bounds()
+        self._bounds_records = None
+        self._bounds = None
+
         # Find local files and load from database
-        self.lidar_files = self._find_lidar_files()
-        print(f"Found {len(self.lidar_files)} LiDAR files")
+        self._lidar_files = self._find_lidar_files()
+        self._dirty = False
+        logger.debug("Found %d LiDAR files", len(self._lidar_files))
+
+    @property
+    def lidar_files(self) -> List[Dict[str, Any]]:
+        """LiDAR file records, rescanned lazily after invalidate()"""
+        if self._dirty:
+            self._lidar_files = self._find_lidar_files()
+            self._dirty = False
+        return self._lidar_files
+
+    @lidar_files.setter
+    def lidar_files(self, records: List[Dict[str, Any]]):
+        self._lidar_files = records
+        self._dirty = False
+
+    def invalidate(self):
+        """Mark the LiDAR file list stale so it is rebuilt on next access"""
+        self._dirty = True
 
     def _find_lidar_files(self) -> List[Dict[str, Any]]:
         """
@@ -46,19 +479,21 @@ class LiDARExtractor:
                 response = self.supabase.table("lidar_files").select("*").execute()
                 if response.data:
                     lidar_records = response.data
-                    print(f"📊 Loaded {len(lidar_records)} LiDAR records from database")
+                    logger.debug("Loaded %d LiDAR records from database", len(lidar_records))
             except Exception as e:
-                print(f"⚠️  Could not load LiDAR files from database: {e}")
+                logger.warning("Could not load LiDAR files from database: %s", e)
 
         # Also check for local files (legacy/fallback)
         local_files = []
+        known = {r.get("filename") for r in lidar_records}
         if os.path.exists(self.lidar_base_path):
             for root, dirs, files in os.walk(self.lidar_base_path):
                 for file in files:
                     if file.endswith(".las") or file.endswith(".laz"):
                         file_path = os.path.join(root, file)
                         # Add as legacy record if not already in database
-                        if not any(r.get("filename") == file for r in lidar_records):
+                        if file not in known:
+                            known.add(file)
                             local_files.append(
                                 {
                                     "filename": file,
@@ -69,7 +504,7 @@ class LiDARExtractor:
                             )
 
         if local_files:
-            print(f"📁 Found {len(local_files)} local LiDAR files")
+            logger.debug("Found %d local LiDAR files", len(local_files))
             lidar_records.extend(local_files)
 
         return lidar_records
@@ -87,31 +522,56 @@ class LiDARExtractor:
         """
         # If already cached, return immediately
         if os.path.exists(local_cache_path):
-            print(f"💾 Using cached LiDAR file: {os.path.basename(local_cache_path)}")
+            logger.debug("Using cached LiDAR file: %s", os.path.basename(local_cache_path))
             return local_cache_path
 
-        print(f"☁️  Downloading LiDAR file from Supabase Storage...")
+        logger.info("Downloading LiDAR file from Supabase Storage: %s", file_url)
 
+        # Written under a temporary name, so an interrupted download is never
+        # mistaken for a cached file
+        partial_path = local_cache_path + ".part"
+        session = _http_session()
         try:
-            # Download from URL
-            response = requests.get(file_url, stream=True, timeout=300)
-            response.raise_for_status()
-
-            # Save to cache
             os.makedirs(os.path.dirname(local_cache_path), exist_ok=True)
-            file_size = 0
-            with open(local_cache_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                    file_size += len(chunk)
 
-            print(
-                f"✅ Cached LiDAR file: {os.path.basename(local_cache_path)} ({file_size/1024/1024:.1f} MB)"
+            # Large files that support Range requests download in parallel
+            size = 0
+            try:
+                head = session.head(file_url, allow_redirects=True, timeout=30)
+                if head.ok and head.headers.get("Accept-Ranges") == "bytes":
+                    size = int(head.headers.get("Content-Length", 0))
+            except (requests.RequestException, ValueError):
+                size = 0
+
+            if size >= DOWNLOAD_PARALLEL_MIN_BYTES and _download_in_ranges(
+                session, file_url, partial_path, size
+            ):
+                file_size = size
+            else:
+                # Single stream
+                with session.get(file_url, stream=True, timeout=300) as response:
+                    response.raise_for_status()
+                    file_size = 0
+                    with open(partial_path, "wb") as f:
+                        for chunk in response.iter_content(
+                            chunk_size=DOWNLOAD_CHUNK_BYTES
+                        ):
+                            f.write(chunk)
+                            file_size += len(chunk)
+
+            os.replace(partial_path, local_cache_path)
+
+            logger.info(
+                "Cached LiDAR file: %s (%.1f MB)",
+                os.path.basename(local_cache_path),
+                file_size / 1024 / 1024,
             )
             return local_cache_path
 
         except Exception as e:
-            print(f"❌ Error downloading LiDAR file: {e}")
+            logger.warning("Error downloading LiDAR file: %s", e)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
             raise
 
     def _get_local_file_path(self, lidar_record: Dict[str, Any]) -> Optional[str]:
@@ -132,10 +592,10 @@ class LiDARExtractor:
         if file_url and file_url.startswith("local://"):
             local_path = file_url.replace("local://", "")
             if os.path.exists(local_path):
-                print(f"📂 Using local file: {local_path}")
+                logger.debug("Using local file: %s", local_path)
                 return local_path
             else:
-                print(f"⚠️  Local file not found: {local_path}")
+                logger.warning("Local file not found: %s", local_path)
                 return None
 
         # If we have a local file_path and it exists, use it
@@ -148,68 +608,90 @@ class LiDARExtractor:
             try:
                 return self._download_lidar_file(file_url, cache_path)
             except Exception as e:
-                print(f"⚠️  Could not download {filename}: {e}")
+                logger.warning("Could not download %s: %s", filename, e)
                 return None
 
         return None
 
-    def _coords_to_mga56(self, coords: List[List[float]]) -> List[Tuple[float, float]]:
+    def _cached_file_path(self, lidar_record: Dict[str, Any]) -> Optional[str]:
+        """
+        Local path of a LiDAR record if the file is already on disk (never downloads)
+        """
+        file_url = lidar_record.get("file_url") or ""
+        filename = lidar_record.get("filename")
+        candidates = [
+            file_url[len("local://"):] if file_url.startswith("local://") else None,
+            lidar_record.get("file_path"),
+            os.path.join(self.lidar_base_path, filename) if filename else None,
+        ]
+        for path in candidates:
+            if path and os.path.exists(path):
+                return path
+        return None
+
+    def _stored_bounds(self):
+        """
+        LiDAR records with their database bounds as one array.
+
+        Rebuilt only when the record list changes (rescan or assignment).
+
+        Returns:
+            tuple: (records, (n, 4) array of [min_x, max_x, min_y, max_y],
+            NaN rows where a record has no usable bounds)
+        """
+        records = self.lidar_files
+        if self._bounds_records is not records:
+            rows = []
+            for record in records:
+                try:
+                    rows.append(
+                        [float(record[k]) for k in ("min_x", "max_x", "min_y", "max_y")]
+                    )
+                except (KeyError, TypeError, ValueError):
+                    rows.append([np.nan] * 4)
+            self._bounds = np.array(rows, dtype=np.float64).reshape(-1, 4)
+            self._bounds_records = records
+        return records, self._bounds
+
+    def _coords_to_mga56(self, coords: List[List[float]]) -> np.ndarray:
         """
         Convert WGS84 lat/lon to GDA94 MGA Zone 56 (EPSG:28356)
         Same projection as DEM data
 
         Args:
-            coords: List of [lat, lon] pairs
+            coords: List of [lat, lon] pairs (extra columns are ignored)
 
         Returns:
-            List of (easting, northing) tuples
+            (N, 2) array of (easting, northing)
         """
-        transformer = Transformer.from_crs("EPSG:4326", "EPSG:28356", always_xy=True)
-        converted = []
-        for lat, lon in coords:
-            x, y = transformer.transform(lon, lat)
-            converted.append((x, y))
-        return converted
+        arr = np.asarray(coords, dtype=np.float64)
+        if arr.size == 0:
+            return np.empty((0, 2))
+        # One vectorized PROJ call for all points
+        xs, ys = _wgs84_to_mga56().transform(arr[:, 1], arr[:, 0])
+        return np.column_stack([xs, ys])
 
     def _extract_profile_from_relative_lidar(
-        self, las_data, lidar_x, lidar_y, lidar_z, trail_coords, las_file_path
+        self, lidar_x, lidar_y, lidar_z, trail_coords, las_file_path
     ) -> Dict[str, Any]:
         """
         Extract elevation profile from LiDAR with relative coordinates.
         Creates a profile by sorting points along a path and sampling elevations.
 
         Args:
-            las_data: Loaded LAS/LAZ file
-            lidar_x, lidar_y, lidar_z: LiDAR point arrays
+            lidar_x, lidar_y, lidar_z: LiDAR point arrays (ground points when
+                the file is classified)
             trail_coords: Trail coordinates (for reference length)
             las_file_path: Path to LAS file
 
         Returns:
             Dictionary with elevation profile data
         """
-        print("🔄 Creating elevation profile from relative-coordinate LiDAR")
-
-        # Filter for ground points if classification is available
-        try:
-            if hasattr(las_data, "classification"):
-                classification = las_data.classification
-                ground_mask = classification == 2  # Class 2 = Ground
-
-                if np.any(ground_mask):
-                    lidar_x = lidar_x[ground_mask]
-                    lidar_y = lidar_y[ground_mask]
-                    lidar_z = lidar_z[ground_mask]
-                    print(f"✅ Filtered to {len(lidar_x):,} ground points (class 2)")
-        except Exception as e:
-            print(f"⚠️  Ground filtering failed: {e}, using all points")
+        logger.debug("Creating elevation profile from relative-coordinate LiDAR")
 
         # Create a path through the LiDAR points
-        # Strategy: Sort points to create a smooth path
-        lidar_points = np.column_stack([lidar_x, lidar_y, lidar_z])
-
-        # Find the point with minimum X (start point)
-        start_idx = np.argmin(lidar_x)
-        start_point = lidar_points[start_idx]
+        # Strategy: Sort points to create a smooth path. X, Y and Z stay
+        # separate arrays: the min-elevation pass only streams Z.
 
         # Sample points along the spatial extent
         # Use a grid approach: divide the area into segments
@@ -225,57 +707,42 @@ class LiDARExtractor:
         if x_range > y_range:
             # Sort by X coordinate
             sort_indices = np.argsort(lidar_x)
-            print(f"   Sorting by X (range: {x_range:.1f}m)")
+            logger.debug("Sorting by X (range: %.1fm)", x_range)
         else:
             # Sort by Y coordinate
             sort_indices = np.argsort(lidar_y)
-            print(f"   Sorting by Y (range: {y_range:.1f}m)")
+            logger.debug("Sorting by Y (range: %.1fm)", y_range)
 
-        sorted_points = lidar_points[sort_indices]
+        sorted_z = lidar_z[sort_indices]
 
         # Sample evenly along the sorted points, taking the minimum elevation in each segment
         # This helps filter out trees and obstacles by selecting ground-level points
-        segment_size = max(1, len(sorted_points) // num_samples)
-        sampled_elevations = []
-
-        for i in range(num_samples):
-            start_idx = i * segment_size
-            end_idx = min(start_idx + segment_size, len(sorted_points))
-
-            if start_idx < len(sorted_points):
-                # Take the minimum elevation in this segment (closest to ground)
-                segment_elevations = sorted_points[start_idx:end_idx, 2]
-                min_elevation = np.min(segment_elevations)
-                sampled_elevations.append(min_elevation)
+        segment_size = max(1, len(sorted_z) // num_samples)
 
-        sampled_elevations = np.array(sampled_elevations)
+        # Minimum elevation of every segment (closest to ground) in one pass;
+        # points past the last full segment are left out
+        end = min(num_samples * segment_size, len(sorted_z))
+        segment_starts = np.arange(0, end, segment_size)
+        sampled_elevations = np.minimum.reduceat(sorted_z[:end], segment_starts)
         sample_indices = np.linspace(
-            0, len(sorted_points) - 1, len(sampled_elevations), dtype=int
+            0, len(sorted_z) - 1, len(sampled_elevations), dtype=int
         )
-
-        # Calculate distances
-        distances = []
-        cumulative_dist = 0.0
-        for i in range(len(sample_indices)):
-            if i == 0:
-                distances.append(0.0)
-            else:
-                prev_point = sorted_points[sample_indices[i - 1]]
-                curr_point = sorted_points[sample_indices[i]]
-                dx = curr_point[0] - prev_point[0]
-                dy = curr_point[1] - prev_point[1]
-                dist = np.sqrt(dx**2 + dy**2)
-                cumulative_dist += dist
-                distances.append(cumulative_dist)
-
-        # Convert distances to km
-        distances_km = [d / 1000.0 for d in distances]
-
-        print(f"   Sampled {num_samples} points")
-        print(
-            f"   Elevation range: {np.min(sampled_elevations):.1f}m to {np.max(sampled_elevations):.1f}m"
+        # X/Y are only needed at the sampled positions
+        sample_x = lidar_x[sort_indices[sample_indices]].astype(np.float64)
+        sample_y = lidar_y[sort_indices[sample_indices]].astype(np.float64)
+
+        # Cumulative distance along the samples, in km
+        segment_lengths = np.hypot(np.diff(sample_x), np.diff(sample_y))
+        distances = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+        distances_km = (distances / 1000.0).tolist()
+
+        logger.debug(
+            "Sampled %d points, elevation %.1fm to %.1fm, total distance %.2f km",
+            num_samples,
+            np.min(sampled_elevations),
+            np.max(sampled_elevations),
+            distances_km[-1],
         )
-        print(f"   Total distance: {distances_km[-1]:.2f} km")
 
         return {
             "success": True,
@@ -316,8 +783,10 @@ class LiDARExtractor:
         if trail_id is not None:
             for lidar_record in self.lidar_files:
                 if lidar_record.get("trail_id") == trail_id:
-                    print(
-                        f"✅ Found LiDAR file associated with trail_id={trail_id}: {lidar_record.get('filename')}"
+                    logger.debug(
+                        "Found LiDAR file associated with trail_id=%s: %s",
+                        trail_id,
+                        lidar_record.get("filename"),
                     )
                     return lidar_record
 
@@ -325,93 +794,91 @@ class LiDARExtractor:
         mga_coords = self._coords_to_mga56(trail_coords)
 
         # Calculate trail bounding box
-        trail_xs = [c[0] for c in mga_coords]
-        trail_ys = [c[1] for c in mga_coords]
         trail_bbox = {
-            "min_x": min(trail_xs),
-            "max_x": max(trail_xs),
-            "min_y": min(trail_ys),
-            "max_y": max(trail_ys),
+            "min_x": float(mga_coords[:, 0].min()),
+            "max_x": float(mga_coords[:, 0].max()),
+            "min_y": float(mga_coords[:, 1].min()),
+            "max_y": float(mga_coords[:, 1].max()),
         }
 
-        best_match = None
-        best_overlap = 0
-
-        # Check each LiDAR file record
-        for lidar_record in self.lidar_files:
-            try:
-                # Get bounds from database record (faster than reading file)
-                min_x = lidar_record.get("min_x")
-                max_x = lidar_record.get("max_x")
-                min_y = lidar_record.get("min_y")
-                max_y = lidar_record.get("max_y")
-
-                # Skip if bounds not available in database
-                if None in (min_x, max_x, min_y, max_y):
-                    print(
-                        f"⚠️  No bounds data for {lidar_record.get('filename')}, skipping"
+        records, bounds = self._stored_bounds()
+
+        # Not in the database: read them from the header of a local copy
+        missing = np.flatnonzero(np.isnan(bounds).any(axis=1))
+        if len(missing):
+            bounds = bounds.copy()
+            for i in missing:
+                lidar_record = records[i]
+                local_path = self._cached_file_path(lidar_record)
+                if local_path is None:
+                    logger.debug(
+                        "No bounds data for %s, skipping", lidar_record.get("filename")
                     )
                     continue
-
-                # Get LiDAR file bounds
-                lidar_bbox = {
-                    "min_x": float(min_x),
-                    "max_x": float(max_x),
-                    "min_y": float(min_y),
-                    "max_y": float(max_y),
-                }
-
-                # Calculate overlap (intersection over trail area)
-                overlap_x = max(
-                    0,
-                    min(trail_bbox["max_x"], lidar_bbox["max_x"])
-                    - max(trail_bbox["min_x"], lidar_bbox["min_x"]),
-                )
-                overlap_y = max(
-                    0,
-                    min(trail_bbox["max_y"], lidar_bbox["max_y"])
-                    - max(trail_bbox["min_y"], lidar_bbox["min_y"]),
-                )
-                overlap_area = overlap_x * overlap_y
-
-                trail_area = (trail_bbox["max_x"] - trail_bbox["min_x"]) * (
-                    trail_bbox["max_y"] - trail_bbox["min_y"]
-                )
-
-                if trail_area > 0:
-                    overlap_ratio = overlap_area / trail_area
-
-                    # Debug logging
-                    print(f"   📊 {lidar_record.get('filename')}:")
-                    print(
-                        f"      Trail bbox: X({trail_bbox['min_x']:.1f}-{trail_bbox['max_x']:.1f}), Y({trail_bbox['min_y']:.1f}-{trail_bbox['max_y']:.1f})"
-                    )
-                    print(
-                        f"      LiDAR bbox: X({lidar_bbox['min_x']:.1f}-{lidar_bbox['max_x']:.1f}), Y({lidar_bbox['min_y']:.1f}-{lidar_bbox['max_y']:.1f})"
+                try:
+                    header_bounds = _las_header_bounds(
+                        local_path, os.stat(local_path).st_mtime_ns
                     )
-                    print(
-                        f"      Overlap: {overlap_ratio:.1%} ({overlap_x:.1f}m x {overlap_y:.1f}m)"
-                    )
-
-                    if overlap_ratio > best_overlap:
-                        best_overlap = overlap_ratio
-                        best_match = lidar_record
+                except Exception as e:
+                    logger.warning("Error checking %s: %s", lidar_record.get("filename"), e)
+                    continue
+                bounds[i] = [
+                    header_bounds["min_x"],
+                    header_bounds["max_x"],
+                    header_bounds["min_y"],
+                    header_bounds["max_y"],
+                ]
+
+        # Overlap with every file at once (intersection over trail area)
+        overlap_x = np.maximum(
+            0.0,
+            np.minimum(trail_bbox["max_x"], bounds[:, 1])
+            - np.maximum(trail_bbox["min_x"], bounds[:, 0]),
+        )
+        overlap_y = np.maximum(
+            0.0,
+            np.minimum(trail_bbox["max_y"], bounds[:, 3])
+            - np.maximum(trail_bbox["min_y"], bounds[:, 2]),
+        )
+        trail_area = (trail_bbox["max_x"] - trail_bbox["min_x"]) * (
+            trail_bbox["max_y"] - trail_bbox["min_y"]
+        )
 
-            except Exception as e:
-                print(f"❌ Error checking {lidar_record.get('filename')}: {e}")
-                continue
+        best_match = None
+        best_overlap = 0.0
+        if trail_area > 0 and len(records):
+            # Files without bounds (NaN) never match
+            ratios = np.nan_to_num(overlap_x * overlap_y / trail_area, nan=0.0)
+            best = int(np.argmax(ratios))
+            if ratios[best] > 0:
+                best_overlap = float(ratios[best])
+                best_match = records[best]
+
+            if logger.isEnabledFor(logging.DEBUG):
+                for i in np.flatnonzero(ratios):
+                    logger.debug(
+                        "%s: overlap %.1f%% (%.1fm x %.1fm)",
+                        records[i].get("filename"),
+                        ratios[i] * 100,
+                        overlap_x[i],
+                        overlap_y[i],
+                    )
 
         # Lower threshold to 2% for small LiDAR files or long trails
         min_overlap_threshold = 0.02  # 2% minimum overlap
 
         if best_match and best_overlap > min_overlap_threshold:
-            print(
-                f"✅ Found matching LiDAR file: {best_match.get('filename')} (overlap: {best_overlap:.1%})"
+            logger.debug(
+                "Found matching LiDAR file: %s (overlap: %.1f%%)",
+                best_match.get("filename"),
+                best_overlap * 100,
             )
             return best_match
         else:
-            print(
-                f"⚠️  No suitable LiDAR file found (best overlap: {best_overlap:.1%}, threshold: {min_overlap_threshold:.1%})"
+            logger.debug(
+                "No suitable LiDAR file found (best overlap: %.1f%%, threshold: %.1f%%)",
+                best_overlap * 100,
+                min_overlap_threshold * 100,
             )
             return None
 
@@ -459,52 +926,12 @@ class LiDARExtractor:
             }
 
         try:
-            # Read LiDAR data
-            print(f"📖 Reading LiDAR file: {os.path.basename(las_file_path)}")
-            las_data = laspy.read(las_file_path)
-
-            # Filter for ground points only (classification = 2) if available
-            print(f"Total LiDAR points: {len(las_data.points):,}")
-
-            try:
-                # Try to get classification data
-                if hasattr(las_data, "classification"):
-                    classification = las_data.classification
-                    ground_mask = classification == 2  # Class 2 = Ground
-
-                    if np.any(ground_mask):
-                        lidar_x = las_data.x[ground_mask]
-                        lidar_y = las_data.y[ground_mask]
-                        lidar_z = las_data.z[ground_mask]
-                        print(
-                            f"✅ Filtered to {len(lidar_x):,} ground points (class 2)"
-                        )
-                    else:
-                        # No ground classification, use all points but filter by elevation
-                        print(
-                            "⚠️  No ground classification found, using elevation filtering"
-                        )
-                        lidar_x = las_data.x
-                        lidar_y = las_data.y
-                        lidar_z = las_data.z
-                else:
-                    # No classification field, use all points
-                    print("⚠️  No classification field, using all points")
-                    lidar_x = las_data.x
-                    lidar_y = las_data.y
-                    lidar_z = las_data.z
-            except Exception as e:
-                print(f"⚠️  Classification filtering failed: {e}, using all points")
-                lidar_x = las_data.x
-                lidar_y = las_data.y
-                lidar_z = las_data.z
-
-            print(f"Using {len(lidar_x):,} LiDAR points for elevation extraction")
-            print(f"Trail points: {len(trail_coords)}")
+            mtime_ns = os.stat(las_file_path).st_mtime_ns
+            bounds = _las_header_bounds(las_file_path, mtime_ns)
+            x_range = (bounds["min_x"], bounds["max_x"])
+            y_range = (bounds["min_y"], bounds["max_y"])
 
             # Check if LiDAR uses relative coordinates (centered near 0,0)
-            x_range = (float(las_data.header.x_min), float(las_data.header.x_max))
-            y_range = (float(las_data.header.y_min), float(las_data.header.y_max))
             is_relative_coords = (
                 abs(x_range[0]) < 1000
                 and abs(x_range[1]) < 1000
@@ -512,51 +939,69 @@ class LiDARExtractor:
                 and abs(y_range[1]) < 1000
             )
 
+            if not is_relative_coords:
+                # Reject a tile the trail never comes within search_radius of
+                # using the header bounds, before decoding any points
+                mga_coords = self._coords_to_mga56(trail_coords)
+                if not len(mga_coords) or (
+                    mga_coords[:, 0].max() + search_radius < x_range[0]
+                    or mga_coords[:, 0].min() - search_radius > x_range[1]
+                    or mga_coords[:, 1].max() + search_radius < y_range[0]
+                    or mga_coords[:, 1].min() - search_radius > y_range[1]
+                ):
+                    return {
+                        "success": False,
+                        "error": f"Trail does not overlap LiDAR file: {os.path.basename(las_file_path)}",
+                        "elevations": [],
+                        "coordinates": [],
+                    }
+
+            # Read LiDAR data
+            logger.debug("Reading LiDAR file: %s", os.path.basename(las_file_path))
+            lidar_x, lidar_y, lidar_z, origin, _ = _load_ground_points(
+                las_file_path, mtime_ns
+            )
+
+            logger.debug(
+                "Using %d LiDAR points for %d trail points", len(lidar_x), len(trail_coords)
+            )
+
             if is_relative_coords:
-                print(
-                    f"⚠️  LiDAR uses relative coordinates (X: {x_range[0]:.1f} to {x_range[1]:.1f})"
+                logger.debug(
+                    "LiDAR uses relative coordinates (X: %.1f to %.1f), "
+                    "using it without coordinate matching",
+                    x_range[0],
+                    x_range[1],
                 )
-                print(f"   Using LiDAR data directly without coordinate matching")
                 # For relative coordinates, use LiDAR data as-is
                 return self._extract_profile_from_relative_lidar(
-                    las_data, lidar_x, lidar_y, lidar_z, trail_coords, las_file_path
+                    lidar_x, lidar_y, lidar_z, trail_coords, las_file_path
                 )
 
-            # Convert trail coordinates to MGA56 for absolute coordinate matching
-            mga_coords = self._coords_to_mga56(trail_coords)
-            print(f"Using coordinate-based matching (absolute coordinates)")
-
-            # Build KD-Tree for efficient nearest neighbor search
-            lidar_points = np.column_stack([lidar_x, lidar_y])
-            kdtree = cKDTree(lidar_points)
-
-            # Extract elevation for each trail point
-            elevations = []
-            matched_coords = []
-
-            for i, (x, y) in enumerate(mga_coords):
-                # Find all LiDAR points within search radius
-                indices = kdtree.query_ball_point([x, y], r=search_radius)
-
-                if indices:
-                    # Use the minimum elevation (closest to ground) to avoid trees/obstacles
-                    # This gives us the ground level even if there are overhead obstacles
-                    nearby_elevations = lidar_z[indices]
-                    elevation = np.min(
-                        nearby_elevations
-                    )  # Use minimum instead of median
-                    elevations.append(float(elevation))
-                    matched_coords.append(trail_coords[i])
-                else:
-                    # No nearby points - interpolate or skip
-                    if i > 0 and len(elevations) > 0:
-                        # Use previous elevation as fallback
-                        elevations.append(elevations[-1])
-                        matched_coords.append(trail_coords[i])
+            # Use the minimum elevation (closest to ground) to avoid trees/obstacles
+            # This gives us the ground level even if there are overhead obstacles
+            qx = mga_coords[:, 0] - origin[0]
+            qy = mga_coords[:, 1] - origin[1]
+            grid = _load_point_grid(las_file_path, mtime_ns, float(search_radius))
+            if grid is not None:
+                min_z = _grid_min_z(grid, qx, qy, search_radius)
+            else:
+                # Too sparse for a grid index
+                min_z = _kdtree_min_z(lidar_x, lidar_y, lidar_z, qx, qy, search_radius)
+            hit = ~np.isnan(min_z)
+
+            # No nearby points: use the previous elevation as fallback, and
+            # skip trail points before the first match
+            last_hit = np.maximum.accumulate(
+                np.where(hit, np.arange(len(min_z)), -1)
+            )
+            first = int(np.argmax(hit)) if np.any(hit) else len(min_z)
+            elevations = min_z[last_hit[first:]].tolist()
+            matched_coords = trail_coords[first:]
 
             coverage = len(elevations) / len(trail_coords) * 100 if trail_coords else 0
-            print(
-                f"Coverage: {coverage:.1f}% ({len(elevations)}/{len(trail_coords)} points)"
+            logger.debug(
+                "Coverage: %.1f%% (%d/%d points)", coverage, len(elevations), len(trail_coords)
             )
 
             return {
@@ -570,7 +1015,7 @@ class LiDARExtractor:
             }
 
         except Exception as e:
-            print(f"Error extracting LiDAR elevation: {e}")
+            logger.warning("Error extracting LiDAR elevation: %s", e)
             return {
                 "success": False,
                 "error": str(e),
@@ -578,6 +1023,65 @@ class LiDARExtractor:
                 "coordinates": [],
             }
 
+    def extract_many(
+        self,
+        trails: List[List[List[float]]],
+        lidar_record: Dict[str, Any] = None,
+        search_radius: float = 2.0,
+        trail_ids: List[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Extract elevation profiles for several trails
+
+        Trails are grouped by LiDAR file. The first trail of each group
+        loads the tile and its grid index into the shared cache; the rest
+        then only query it, in a thread pool.
+
+        Args:
+            trails: List of trails, each a list of [lat, lon] coordinates
+            lidar_record: LiDAR file to use for every trail (or auto-detect
+                per trail)
+            search_radius: Radius in meters to search for LiDAR points near each trail point
+            trail_ids: Optional trail IDs, one per trail, to match against
+                database associations
+
+        Returns:
+            List of elevation profile dictionaries, in the order of trails
+        """
+        if trail_ids is None:
+            trail_ids = [None] * len(trails)
+
+        # Trail indices per file; trails without a match fail in
+        # extract_elevation_profile as usual
+        groups: Dict[Any, List[int]] = {}
+        records: Dict[Any, Optional[Dict[str, Any]]] = {}
+        for i, (coords, trail_id) in enumerate(zip(trails, trail_ids)):
+            record = lidar_record or self.find_matching_lidar_file(coords, trail_id=trail_id)
+            key = record.get("filename") if record else None
+            groups.setdefault(key, []).append(i)
+            records[key] = record
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(trails)
+
+        def extract(i, record):
+            results[i] = self.extract_elevation_profile(
+                trails[i],
+                lidar_record=record,
+                search_radius=search_radius,
+                trail_id=trail_ids[i],
+            )
+
+        for key, indices in groups.items():
+            record = records[key]
+            extract(indices[0], record)
+            if len(indices) > 1:
+                with ThreadPoolExecutor(
+                    max_workers=min(EXTRACT_WORKERS, len(indices) - 1)
+                ) as pool:
+                    list(pool.map(lambda i: extract(i, record), indices[1:]))
+
+        return results
+
     def get_lidar_file_info(self, las_file_path: str) -> Dict[str, Any]:
         """
         Get metadata about a LiDAR file
@@ -589,8 +1093,9 @@ class LiDARExtractor:
             Dictionary with file information
         """
         try:
-            las = laspy.open(las_file_path)
-            header = las.header
+            # Header only; the file is closed again before returning
+            with laspy.open(las_file_path) as las:
+                header = las.header
 
             return {
                 "filename": os.path.basename(las_file_path),
@@ -1,190 +1,368 @@
 import os
+import copy
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import rasterio
+from rasterio.enums import Resampling
 import rasterio.windows
 import rasterio.transform
 from rasterio.mask import mask
-from shapely.geometry import LineString, Point
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+from shapely.geometry import Point
 import geopandas as gpd
 from pyproj import Transformer
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import io
 import base64
 from typing import List, Tuple, Dict, Any
 import glob
 
+from ._jit import NUMBA_AVAILABLE, _terrain_features_jit
+
+
+# Elevation profiles memoized per analyzer
+PROFILE_CACHE_SIZE = 64
+
+# Open DEM datasets kept per thread (a GDAL handle must not be shared
+# between threads), so repeat reads of a tile hit GDAL's block cache
+DATASET_CACHE_SIZE = 16
+_open_datasets = threading.local()
+
+# Plotly config for the interactive 3D terrain, as HTML page or JSON spec
+PLOTLY_CONFIG = {
+    "displayModeBar": True,
+    "displaylogo": False,
+    "modeBarButtonsToAdd": ["pan3d", "orbitRotation", "tableRotation"],
+    "scrollZoom": True,
+}
+
+# QSpatial/ELVIS 1 m DEM tiles are named after the south-west corner of
+# the 1 km MGA cell they cover, e.g. Brisbane_2014_SW_502000_6965000_1K_DEM_1m.tif
+DEM_TILE_NAME = re.compile(r"_SW_(\d{6})_(\d{7})_1K_", re.IGNORECASE)
+DEM_TILE_SIZE = 1000.0
+
+# Threads reading the tiles of a trail that crosses several. The pool lives
+# for the process, so each worker keeps its own open datasets between calls.
+TILE_READ_WORKERS = min(4, os.cpu_count() or 1)
+_tile_pool = ThreadPoolExecutor(
+    max_workers=TILE_READ_WORKERS, thread_name_prefix="dem-tile"
+)
+
+
+def _open_dataset(path: str):
+    """
+    Open a DEM tile for reading, reusing this thread's recently opened handles
+
+    Handles are keyed by path and mtime, so a replaced tile is reopened and
+    the handle to its old version closed. The least recently used handle is
+    closed once DATASET_CACHE_SIZE are open.
+    """
+    cache = getattr(_open_datasets, "cache", None)
+    if cache is None:
+        cache = _open_datasets.cache = OrderedDict()
+    key = (path, os.stat(path).st_mtime_ns)
+    dataset = cache.get(key)
+    if dataset is None or dataset.closed:
+        for stale in [k for k in cache if k[0] == path and k != key]:
+            cache.pop(stale).close()
+        dataset = rasterio.open(path)
+        cache[key] = dataset
+        if len(cache) > DATASET_CACHE_SIZE:
+            cache.popitem(last=False)[1].close()
+    else:
+        cache.move_to_end(key)
+    return dataset
+
+
+def _filename_to_bounds(path: str):
+    """
+    Bounds of a DEM tile from its file name, without opening it
+
+    Returns:
+        (left, bottom, right, top), or None if the name doesn't follow
+        the DEM_TILE_NAME convention
+    """
+    match = DEM_TILE_NAME.search(os.path.basename(path))
+    if match is None:
+        return None
+    left, bottom = float(match.group(1)), float(match.group(2))
+    return left, bottom, left + DEM_TILE_SIZE, bottom + DEM_TILE_SIZE
+
+
+def _sample_tile(dem_file: str, xs: np.ndarray, ys: np.ndarray):
+    """
+    DEM values under points that all fall in one tile, from one windowed read
+
+    Returns:
+        (found, values): indices into xs/ys of the points with data, and
+        the pixel values under them
+    """
+    try:
+        dataset = _open_dataset(dem_file)
+
+        rows, cols = rasterio.transform.rowcol(dataset.transform, xs, ys)
+        rows = np.asarray(rows)
+        cols = np.asarray(cols)
+
+        # Ensure we're within the raster bounds
+        in_raster = (
+            (0 <= rows) & (rows < dataset.height) & (0 <= cols) & (cols < dataset.width)
+        )
+        found = np.flatnonzero(in_raster)
+        if not len(found):
+            return found, np.empty(0)
+        rows = rows[found]
+        cols = cols[found]
+
+        # One read of the window spanning these points
+        row_off, col_off = rows.min(), cols.min()
+        window = rasterio.windows.Window(
+            col_off,
+            row_off,
+            cols.max() - col_off + 1,
+            rows.max() - row_off + 1,
+        )
+        values = dataset.read(1, window=window)[rows - row_off, cols - col_off]
+
+        if dataset.nodata is not None:
+            keep = values != dataset.nodata
+            values = values[keep]
+            found = found[keep]
+
+        return found, values
+
+    except Exception as e:
+        print(f"Error processing {dem_file}: {e}")
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
 
 class RealDEMAnalyzer:
     def __init__(self, dem_base_path: str):
         """Initialize with path to DEM data directory"""
         self.dem_base_path = dem_base_path
+        # Recent extract_elevation_profile results (LRU), see _profile_key
+        self._profile_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        # Built once: constructing a Transformer looks up the PROJ database
+        self._to_gda94 = Transformer.from_crs("EPSG:4326", "EPSG:28356", always_xy=True)
         self.dem_files = self._find_dem_files()
+        # Tile bounds, read once so lookups don't reopen every tile
+        self._tile_bounds = self._read_tile_bounds()
 
     def _find_dem_files(self) -> List[str]:
         """Find all DEM .tif files in the directory"""
         pattern = os.path.join(self.dem_base_path, "**/*.tif")
         return glob.glob(pattern, recursive=True)
 
-    def _coords_to_gda94(self, coords: List[List[float]]) -> List[Tuple[float, float]]:
-        """Convert WGS84 coordinates to GDA94 MGA Zone 56"""
-        transformer = Transformer.from_crs("EPSG:4326", "EPSG:28356", always_xy=True)
-        converted = []
-        for lat, lon in coords:
-            x, y = transformer.transform(
-                lon, lat
-            )  # Note: transformer expects (lon, lat)
-            converted.append((x, y))
-        return converted
+    def _read_tile_bounds(self) -> np.ndarray:
+        """Bounds of each DEM file as (left, bottom, right, top) rows, NaN if unreadable
+
+        Tiles named by their grid cell aren't opened; only other files are.
+        """
+        tile_bounds = np.full((len(self.dem_files), 4), np.nan)
+        for i, dem_file in enumerate(self.dem_files):
+            named_bounds = _filename_to_bounds(dem_file)
+            if named_bounds is not None:
+                tile_bounds[i] = named_bounds
+                continue
+            try:
+                with rasterio.open(dem_file) as dataset:
+                    tile_bounds[i] = tuple(dataset.bounds)
+            except Exception as e:
+                print(f"Error reading {dem_file}: {e}")
+        return tile_bounds
+
+    def _coords_to_gda94(self, coords: List[List[float]]) -> np.ndarray:
+        """Convert WGS84 coordinates to GDA94 MGA Zone 56
+
+        Returns:
+            (N, 2) float64 array of x, y columns
+        """
+        latlon = np.array([(c[0], c[1]) for c in coords], dtype=np.float64).reshape(-1, 2)
+        # One vectorized call; the transformer expects (lon, lat)
+        xs, ys = self._to_gda94.transform(latlon[:, 1], latlon[:, 0])
+        return np.column_stack((xs, ys))
 
     def _find_relevant_dem_tiles(self, trail_coords: List[List[float]]) -> List[str]:
         """Find DEM tiles that intersect with the trail path"""
         # Convert trail to GDA94
         gda94_coords = self._coords_to_gda94(trail_coords)
+        return [self.dem_files[i] for i in self._relevant_tile_indices(gda94_coords)]
 
+    def _relevant_tile_indices(self, gda94_coords: np.ndarray) -> np.ndarray:
+        """Indices into dem_files of the tiles intersecting a GDA94 trail"""
         # Create bounding box
-        min_x = min(coord[0] for coord in gda94_coords)
-        max_x = max(coord[0] for coord in gda94_coords)
-        min_y = min(coord[1] for coord in gda94_coords)
-        max_y = max(coord[1] for coord in gda94_coords)
+        min_x, min_y = gda94_coords.min(axis=0)
+        max_x, max_y = gda94_coords.max(axis=0)
 
-        relevant_files = []
-
-        for dem_file in self.dem_files:
-            try:
-                with rasterio.open(dem_file) as dataset:
-                    bounds = dataset.bounds
-                    # Check if trail bounding box intersects with DEM bounds
-                    if (
-                        min_x <= bounds.right
-                        and max_x >= bounds.left
-                        and min_y <= bounds.top
-                        and max_y >= bounds.bottom
-                    ):
-                        relevant_files.append(dem_file)
-            except Exception as e:
-                print(f"Error reading {dem_file}: {e}")
-                continue
-
-        return relevant_files
+        # Check if trail bounding box intersects with each tile's bounds
+        # (unreadable tiles have NaN bounds and never match)
+        left, bottom, right, top = self._tile_bounds.T
+        intersects = (
+            (min_x <= right) & (max_x >= left) & (min_y <= top) & (max_y >= bottom)
+        )
+        return np.flatnonzero(intersects)
 
     def extract_elevation_profile(
         self, trail_coords: List[List[float]]
     ) -> Dict[str, Any]:
-        """Extract detailed elevation profile from DEM data"""
-        try:
-            # Find relevant DEM tiles
-            relevant_tiles = self._find_relevant_dem_tiles(trail_coords)
-
-            if not relevant_tiles:
-                return {"error": "No DEM tiles found for trail area"}
+        """
+        Extract detailed elevation profile from DEM data
 
+        Profiles are memoized on the trail coordinates and the mtimes of the
+        tiles they were read from; callers get their own copy.
+        """
+        try:
             # Convert coordinates to GDA94
             gda94_coords = self._coords_to_gda94(trail_coords)
 
-            # Create LineString for the trail
-            trail_line = LineString(gda94_coords)
-
-            # Sample points along the trail (every 10 meters)
-            distances = np.arange(0, trail_line.length, 10)
-            sample_points = [trail_line.interpolate(distance) for distance in distances]
-
-            elevations = []
-            coordinates = []
+            # Find relevant DEM tiles
+            tile_ids = self._relevant_tile_indices(gda94_coords)
+            relevant_tiles = [self.dem_files[i] for i in tile_ids]
 
-            # Process each relevant DEM tile
-            for dem_file in relevant_tiles:
-                try:
-                    with rasterio.open(dem_file) as dataset:
-                        for i, point in enumerate(sample_points):
-                            x, y = point.x, point.y
-
-                            # Check if point is within this tile's bounds
-                            if (
-                                dataset.bounds.left <= x <= dataset.bounds.right
-                                and dataset.bounds.bottom <= y <= dataset.bounds.top
-                            ):
-
-                                # Read elevation at this point
-                                row, col = dataset.index(x, y)
-
-                                # Ensure we're within the raster bounds
-                                if (
-                                    0 <= row < dataset.height
-                                    and 0 <= col < dataset.width
-                                ):
-                                    elevation = dataset.read(1)[row, col]
-
-                                    if elevation != dataset.nodata:
-                                        elevations.append(float(elevation))
-                                        coordinates.append(
-                                            [
-                                                trail_coords[
-                                                    min(i, len(trail_coords) - 1)
-                                                ][0],
-                                                trail_coords[
-                                                    min(i, len(trail_coords) - 1)
-                                                ][1],
-                                            ]
-                                        )
-
-                except Exception as e:
-                    print(f"Error processing {dem_file}: {e}")
-                    continue
+            if not relevant_tiles:
+                return {"error": "No DEM tiles found for trail area"}
 
-            if not elevations:
+            key = self._profile_key(trail_coords, relevant_tiles)
+            cached = self._profile_cache.get(key)
+            if cached is not None:
+                self._profile_cache.move_to_end(key)
+                return copy.deepcopy(cached)
+
+            if len(gda94_coords) < 2:
+                raise ValueError("trail needs at least two coordinates")
+
+            # Sample points along the trail (every 10 meters), interpolated
+            # along the cumulative length of its segments
+            sample_xy = self._interpolate_along(gda94_coords, 10)
+            distances = np.arange(len(sample_xy)) * 10.0
+            sample_x = sample_xy[:, 0]
+            sample_y = sample_xy[:, 1]
+
+            # Assign each sample point to the first relevant tile whose pixels
+            # cover it. Bounds are half-open like the pixel grid, so a point on
+            # a shared edge belongs to the tile east/south of it.
+            left, bottom, right, top = (
+                b[np.newaxis, :] for b in self._tile_bounds[tile_ids].T
+            )
+            x = sample_x[:, np.newaxis]
+            y = sample_y[:, np.newaxis]
+            covers = (left <= x) & (x < right) & (bottom < y) & (y <= top)
+            owner = np.where(covers.any(axis=1), covers.argmax(axis=1), -1)
+
+            # float32 holds any DEM band we read (int16 or float32 tiles)
+            # exactly, at half the memory of float64
+            values = np.full(len(sample_x), np.nan, dtype=np.float32)
+            has_data = np.zeros(len(sample_x), dtype=bool)
+
+            # Read each tile once, for just the points it owns; tiles are
+            # independent reads, so several go to the pool at once
+            tiles = np.unique(owner[owner >= 0])
+            groups = [np.flatnonzero(owner == tile) for tile in tiles]
+            jobs = [
+                (relevant_tiles[tile], sample_x[points], sample_y[points])
+                for tile, points in zip(tiles, groups)
+            ]
+            if len(jobs) > 1:
+                results = _tile_pool.map(lambda job: _sample_tile(*job), jobs)
+            else:
+                results = (_sample_tile(*job) for job in jobs)
+            for points, (found, tile_values) in zip(groups, results):
+                values[points[found]] = tile_values
+                has_data[points[found]] = True
+
+            # Samples with data, in order along the trail
+            sampled = np.flatnonzero(has_data)
+            elev = values[sampled]
+            latlon = np.asarray(trail_coords, dtype=float)[:, :2]
+            coordinates = latlon[
+                np.minimum(sampled, len(latlon) - 1)
+            ].tolist()
+
+            if not len(elev):
                 return {"error": "No elevation data extracted"}
 
-            # Calculate slope and other metrics
-            slopes = []
-            for i in range(1, len(elevations)):
-                rise = elevations[i] - elevations[i - 1]
-                run = 10  # 10 meter sampling
-                slope = (rise / run) * 100  # Convert to percentage
-                slopes.append(slope)
+            # Calculate slope and other metrics, staying in float32; values
+            # become Python floats only in the result below
+            rises = np.diff(elev)
+            run = 10  # 10 meter sampling
+            slopes = (rises / np.float32(run)) * np.float32(100)  # Convert to percentage
 
-            return {
+            result = {
                 "success": True,
                 "elevation_profile": {
-                    "distances": distances[: len(elevations)].tolist(),
-                    "elevations": elevations,
-                    "slopes": [0] + slopes,  # Add 0 for first point
+                    "distances": distances[: len(elev)].tolist(),
+                    "elevations": elev.tolist(),
+                    "slopes": [0] + slopes.tolist(),  # Add 0 for first point
                     "coordinates": coordinates,
                 },
                 "statistics": {
-                    "min_elevation": min(elevations),
-                    "max_elevation": max(elevations),
-                    "elevation_gain": sum(
-                        max(0, elevations[i] - elevations[i - 1])
-                        for i in range(1, len(elevations))
-                    ),
-                    "elevation_loss": sum(
-                        max(0, elevations[i - 1] - elevations[i])
-                        for i in range(1, len(elevations))
-                    ),
-                    "max_slope": max(slopes) if slopes else 0,
-                    "min_slope": min(slopes) if slopes else 0,
-                    "avg_slope": np.mean([abs(s) for s in slopes]) if slopes else 0,
+                    "min_elevation": float(np.nanmin(elev)),
+                    "max_elevation": float(np.nanmax(elev)),
+                    "elevation_gain": float(rises[rises > 0].sum()),
+                    "elevation_loss": float((-rises[rises < 0]).sum()),
+                    "max_slope": float(np.nanmax(slopes)) if len(slopes) else 0,
+                    "min_slope": float(np.nanmin(slopes)) if len(slopes) else 0,
+                    "avg_slope": float(np.mean(np.abs(slopes))) if len(slopes) else 0,
                 },
                 "data_sources": relevant_tiles,
                 "resolution": "1 meter",
                 "sample_interval": "10 meters",
             }
+            self._profile_cache[key] = result
+            while len(self._profile_cache) > PROFILE_CACHE_SIZE:
+                self._profile_cache.popitem(last=False)
+            return copy.deepcopy(result)
 
         except Exception as e:
             return {"error": f"DEM analysis failed: {str(e)}"}
 
+    @staticmethod
+    def _interpolate_along(xy: np.ndarray, interval: float) -> np.ndarray:
+        """Points every interval meters along a polyline, from its start
+
+        Args:
+            xy: (N, 2) array of polyline vertices, N >= 2
+            interval: Spacing between points along the line
+
+        Returns:
+            (M, 2) array of points at distances 0, interval, ... < length
+        """
+        seg = np.diff(xy, axis=0)
+        seg_len = np.hypot(seg[:, 0], seg[:, 1])
+        cum = np.concatenate(([0.0], np.cumsum(seg_len)))
+        distances = np.arange(0, cum[-1], interval)
+        # Segment holding each distance; "right" skips zero-length segments
+        i = np.searchsorted(cum, distances, side="right") - 1
+        t = (distances - cum[i]) / seg_len[i]
+        return xy[i] + seg[i] * t[:, np.newaxis]
+
+    def _profile_key(self, trail_coords: List[List[float]], dem_files: List[str]) -> bytes:
+        """Digest of the trail coordinates and the DEM files (with mtimes) under them"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(
+            np.array([(c[0], c[1]) for c in trail_coords], dtype=np.float64).tobytes()
+        )
+        for dem_file in dem_files:
+            digest.update(f"{dem_file}\0{os.stat(dem_file).st_mtime_ns}\0".encode())
+        return digest.digest()
+
     def _calculate_trail_bounds(
-        self, gda94_coords: List[List[float]], buffer_meters: int = 0
+        self, gda94_coords: np.ndarray, buffer_meters: int = 0
     ) -> Dict[str, float]:
         """Calculate exact bounding box around trail coordinates"""
-        x_coords = [coord[0] for coord in gda94_coords]
-        y_coords = [coord[1] for coord in gda94_coords]
+        min_x, min_y = gda94_coords.min(axis=0).tolist()
+        max_x, max_y = gda94_coords.max(axis=0).tolist()
 
         return {
-            "min_x": min(x_coords),
-            "max_x": max(x_coords),
-            "min_y": min(y_coords),
-            "max_y": max(y_coords),
+            "min_x": min_x,
+            "max_x": max_x,
+            "min_y": min_y,
+            "max_y": max_y,
         }
 
     def create_3d_terrain_visualization(
@@ -194,6 +372,7 @@ class RealDEMAnalyzer:
         elevation_source: str = "gpx",
         trail_id: int = None,
         lidar_elevations: List[float] = None,
+        output_format: str = "html",
     ) -> Dict[str, Any]:
         """Create interactive 3D terrain visualization around the trail using Plotly
 
@@ -203,261 +382,290 @@ class RealDEMAnalyzer:
             elevation_source: "gpx" (uses DEM for elevations) or "lidar" (uses LiDAR point cloud elevations)
             trail_id: Trail ID (required if elevation_source="lidar")
             lidar_elevations: Pre-fetched LiDAR elevation data (if available)
+            output_format: "html" for a standalone page (html_content) or
+                "json" for the figure spec as a JSON string (figure_json)
         """
         try:
-            relevant_tiles = self._find_relevant_dem_tiles(trail_coords)
+            # Convert coordinates to GDA94 early (needed for both Plotly and fallback)
+            gda94_coords = self._coords_to_gda94(trail_coords)
+
+            relevant_tiles = [
+                self.dem_files[i] for i in self._relevant_tile_indices(gda94_coords)
+            ]
 
             if not relevant_tiles:
                 return {"success": False, "error": "No DEM tiles found for trail area"}
 
-            # Convert coordinates to GDA94 early (needed for both Plotly and fallback)
-            gda94_coords = self._coords_to_gda94(trail_coords)
-
             # Use the first relevant tile for demonstration
             dem_file = relevant_tiles[0]
 
-            with rasterio.open(dem_file) as dataset:
-                # Calculate exact trail bounds (no buffer)
-                trail_bounds = self._calculate_trail_bounds(gda94_coords)
-
-                # Convert bounds to pixel coordinates
-                min_col, min_row = dataset.index(
-                    trail_bounds["min_x"], trail_bounds["max_y"]
-                )
-                max_col, max_row = dataset.index(
-                    trail_bounds["max_x"], trail_bounds["min_y"]
+            dataset = _open_dataset(dem_file)
+
+            # Calculate exact trail bounds (no buffer)
+            trail_bounds = self._calculate_trail_bounds(gda94_coords)
+
+            # Convert bounds to pixel coordinates
+            min_col, min_row = dataset.index(
+                trail_bounds["min_x"], trail_bounds["max_y"]
+            )
+            max_col, max_row = dataset.index(
+                trail_bounds["max_x"], trail_bounds["min_y"]
+            )
+
+            # Ensure we don't go outside the dataset bounds
+            min_row = max(0, min_row)
+            min_col = max(0, min_col)
+            max_row = min(dataset.height, max_row)
+            max_col = min(dataset.width, max_col)
+
+            # Read only the exact area that contains the trail
+            window = rasterio.windows.Window(
+                min_col, min_row, max_col - min_col, max_row - min_row
+            ).crop(dataset.height, dataset.width)
+            window_height, window_width = int(window.height), int(window.width)
+
+            # Sample the data for visualization (reduce resolution for
+            # performance): a decimated read, which GDAL serves from the
+            # tile's overviews when it has them, instead of reading every
+            # pixel and striding
+            step = max(1, window_height // 100)
+            if step > 1 and window_width:
+                elevation_data = dataset.read(
+                    1,
+                    window=window,
+                    out_shape=(
+                        math.ceil(window_height / step),
+                        math.ceil(window_width / step),
+                    ),
+                    resampling=Resampling.nearest,
                 )
+            else:
+                elevation_data = dataset.read(1, window=window)
 
-                # Ensure we don't go outside the dataset bounds
-                min_row = max(0, min_row)
-                min_col = max(0, min_col)
-                max_row = min(dataset.height, max_row)
-                max_col = min(dataset.width, max_col)
+            # Update transform for the windowed data
+            windowed_transform = rasterio.windows.transform(
+                window, dataset.transform
+            )
 
-                # Read only the exact area that contains the trail
-                window = rasterio.windows.Window(
-                    min_col, min_row, max_col - min_col, max_row - min_row
+            # Try to create interactive 3D plot with Plotly
+            try:
+                import plotly.graph_objects as go
+                import plotly.io as pio
+
+                # Create coordinate arrays in full-resolution pixels of the window
+                y_indices = np.arange(0, window_height, step)
+                x_indices = np.arange(0, window_width, step)
+                X, Y = np.meshgrid(x_indices, y_indices)
+                Z = elevation_data
+
+                # Remove no-data values: one float32 copy (elevation_data is
+                # still read below), masked in place
+                Z_clean = Z.astype(np.float32)
+                if dataset.nodata is not None:
+                    Z_clean[Z == dataset.nodata] = np.nan
+
+                # Create 3D surface plot
+                fig = go.Figure()
+
+                # Add terrain surface
+                fig.add_trace(
+                    go.Surface(
+                        z=Z_clean,
+                        x=X,
+                        y=Y,
+                        colorscale="earth",  # Valid Plotly colorscale that resembles terrain
+                        name="Terrain",
+                        showscale=True,
+                        colorbar=dict(title="Elevation (m)", x=1.02),
+                        opacity=0.9,
+                    )
                 )
-                elevation_data = dataset.read(1, window=window)
 
-                # Update transform for the windowed data
-                windowed_transform = rasterio.windows.transform(
-                    window, dataset.transform
+                # Add trail path as 3D scatter plot with higher accuracy
+                # Use more trail points for better accuracy (every 3rd point or minimum of 200 points)
+                total_points = len(gda94_coords)
+                target_points = min(
+                    200, total_points
+                )  # Up to 200 points for accuracy
+                sample_interval = max(1, total_points // target_points)
+                sampled_coords = gda94_coords[::sample_interval]
+
+                # Determine elevation source
+                using_lidar = (
+                    elevation_source.lower() == "lidar"
+                    and lidar_elevations is not None
+                )
+                source_name = "LiDAR" if using_lidar else "DEM"
+                print(
+                    f"Processing {len(sampled_coords)} trail points from {total_points} total points (interval: {sample_interval}) using {source_name} elevations..."
                 )
 
-                # Try to create interactive 3D plot with Plotly
-                try:
-                    import plotly.graph_objects as go
-                    import plotly.io as pio
+                if using_lidar:
+                    print(f"   Note: Using DEM elevations for trail path to ensure proper alignment with terrain surface")
 
-                    # Sample the data for visualization (reduce resolution for performance)
-                    step = max(1, elevation_data.shape[0] // 100)
+                xs = sampled_coords[:, 0]
+                ys = sampled_coords[:, 1]
 
-                    # Create coordinate arrays that match the actual data dimensions
-                    y_indices = np.arange(0, elevation_data.shape[0], step)
-                    x_indices = np.arange(0, elevation_data.shape[1], step)
-                    X, Y = np.meshgrid(x_indices, y_indices)
-                    Z = elevation_data[::step, ::step]
+                # Convert world coordinates to windowed pixel coordinates
+                global_col, global_row = rasterio.transform.rowcol(
+                    dataset.transform, xs, ys
+                )
+                windowed_col = np.asarray(global_col) - min_col
+                windowed_row = np.asarray(global_row) - min_row
+
+                in_window = (
+                    (0 <= windowed_row)
+                    & (windowed_row < window_height)
+                    & (0 <= windowed_col)
+                    & (windowed_col < window_width)
+                )
+                windowed_col = windowed_col[in_window]
+                windowed_row = windowed_row[in_window]
+
+                # ALWAYS use DEM elevation for the trail path to ensure it sits on terrain
+                # (Even when "LiDAR" source is selected - this is just for visual consistency),
+                # from the surface cell under each point
+                z = elevation_data[
+                    windowed_row * elevation_data.shape[0] // window_height,
+                    windowed_col * elevation_data.shape[1] // window_width,
+                ]
+                has_data = np.isfinite(z)
+                if dataset.nodata is not None:
+                    has_data &= z != dataset.nodata
+                print(
+                    f"Trail points out of bounds: {int(np.sum(~in_window))}, no data: {int(np.sum(~has_data))}"
+                )
 
-                    # Remove no-data values
-                    Z_clean = np.where(Z == dataset.nodata, np.nan, Z)
+                trail_x = windowed_col[has_data].tolist()
+                trail_y = windowed_row[has_data].tolist()
+                # Add small visual offset above terrain surface
+                elevation_offset = 1.0
+                trail_z = (z[has_data] + elevation_offset).tolist()
 
-                    # Create 3D surface plot
-                    fig = go.Figure()
+                print(f"Final trail points: {len(trail_x)}")
 
-                    # Add terrain surface
+                if trail_x:
+                    print(
+                        f"Creating high-accuracy trail visualization with {len(trail_x)} points"
+                    )
                     fig.add_trace(
-                        go.Surface(
-                            z=Z_clean,
-                            x=X,
-                            y=Y,
-                            colorscale="earth",  # Valid Plotly colorscale that resembles terrain
-                            name="Terrain",
-                            showscale=True,
-                            colorbar=dict(title="Elevation (m)", x=1.02),
-                            opacity=0.9,
+                        go.Scatter3d(
+                            x=trail_x,
+                            y=trail_y,
+                            z=trail_z,
+                            mode="lines+markers",
+                            line=dict(color="red", width=4),
+                            marker=dict(size=2, color="red"),
+                            name="Trail Path",
+                            hovertemplate="<b>Trail Point</b><br>X: %{x}<br>Y: %{y}<br>Elevation: %{z:.1f}m<extra></extra>",
                         )
                     )
 
-                    # Add trail path as 3D scatter plot with higher accuracy
-                    trail_x = []
-                    trail_y = []
-                    trail_z = []
-
-                    # Use more trail points for better accuracy (every 3rd point or minimum of 200 points)
-                    total_points = len(gda94_coords)
-                    target_points = min(
-                        200, total_points
-                    )  # Up to 200 points for accuracy
-                    sample_interval = max(1, total_points // target_points)
-                    sampled_coords = gda94_coords[::sample_interval]
-
-                    # Determine elevation source
-                    using_lidar = (
-                        elevation_source.lower() == "lidar"
-                        and lidar_elevations is not None
-                    )
-                    source_name = "LiDAR" if using_lidar else "DEM"
-                    print(
-                        f"Processing {len(sampled_coords)} trail points from {total_points} total points (interval: {sample_interval}) using {source_name} elevations..."
-                    )
-
-                    if using_lidar:
-                        print(f"   Note: Using DEM elevations for trail path to ensure proper alignment with terrain surface")
-
-                    for i, (x, y) in enumerate(sampled_coords):
-                        try:
-                            # Convert world coordinates to windowed pixel coordinates
-                            global_col, global_row = dataset.index(x, y)
-
-                            # Convert to windowed coordinates
-                            windowed_col = global_col - min_col
-                            windowed_row = global_row - min_row
-
-                            if (
-                                0 <= windowed_row < elevation_data.shape[0]
-                                and 0 <= windowed_col < elevation_data.shape[1]
-                            ):
-                                # ALWAYS use DEM elevation for the trail path to ensure it sits on terrain
-                                # (Even when "LiDAR" source is selected - this is just for visual consistency)
-                                z = elevation_data[windowed_row, windowed_col]
-
-                                if z != dataset.nodata and not (
-                                    isinstance(z, float) and np.isnan(z)
-                                ):
-                                    trail_x.append(windowed_col)
-                                    trail_y.append(windowed_row)
-                                    # Add small visual offset above terrain surface
-                                    elevation_offset = 1.0
-                                    trail_z.append(z + elevation_offset)
-                                    if i < 5:  # Only print first few for debugging
-                                        print(
-                                            f"Added trail point {i}: ({windowed_col}, {windowed_row}, {z:.1f}m + {elevation_offset}m offset = {z + elevation_offset:.1f}m) from DEM"
-                                        )
-                                else:
-                                    print(f"Trail point {i}: No data value")
-                            else:
-                                print(
-                                    f"Trail point {i}: Out of bounds ({windowed_row}, {windowed_col})"
-                                )
-                        except Exception as e:
-                            print(f"Trail point {i} error: {e}")
-                            continue
-
-                    print(f"Final trail points: {len(trail_x)}")
-
-                    if trail_x:
-                        print(
-                            f"Creating high-accuracy trail visualization with {len(trail_x)} points"
-                        )
+                    # Also add start and end markers for better visualization
+                    if len(trail_x) > 1:
+                        # Start marker
                         fig.add_trace(
                             go.Scatter3d(
-                                x=trail_x,
-                                y=trail_y,
-                                z=trail_z,
-                                mode="lines+markers",
-                                line=dict(color="red", width=4),
-                                marker=dict(size=2, color="red"),
-                                name="Trail Path",
-                                hovertemplate="<b>Trail Point</b><br>X: %{x}<br>Y: %{y}<br>Elevation: %{z:.1f}m<extra></extra>",
+                                x=[trail_x[0]],
+                                y=[trail_y[0]],
+                                z=[trail_z[0] + 8],
+                                mode="markers",
+                                marker=dict(
+                                    size=15, color="green", symbol="diamond"
+                                ),
+                                name="Trail Start",
+                                hovertemplate="<b>Trail Start</b><br>Elevation: %{z:.1f}m<extra></extra>",
                             )
                         )
 
-                        # Also add start and end markers for better visualization
-                        if len(trail_x) > 1:
-                            # Start marker
-                            fig.add_trace(
-                                go.Scatter3d(
-                                    x=[trail_x[0]],
-                                    y=[trail_y[0]],
-                                    z=[trail_z[0] + 8],
-                                    mode="markers",
-                                    marker=dict(
-                                        size=15, color="green", symbol="diamond"
-                                    ),
-                                    name="Trail Start",
-                                    hovertemplate="<b>Trail Start</b><br>Elevation: %{z:.1f}m<extra></extra>",
-                                )
-                            )
-
-                            # End marker
-                            fig.add_trace(
-                                go.Scatter3d(
-                                    x=[trail_x[-1]],
-                                    y=[trail_y[-1]],
-                                    z=[trail_z[-1] + 8],
-                                    mode="markers",
-                                    marker=dict(
-                                        size=15, color="blue", symbol="diamond"
-                                    ),
-                                    name="Trail End",
-                                    hovertemplate="<b>Trail End</b><br>Elevation: %{z:.1f}m<extra></extra>",
-                                )
+                        # End marker
+                        fig.add_trace(
+                            go.Scatter3d(
+                                x=[trail_x[-1]],
+                                y=[trail_y[-1]],
+                                z=[trail_z[-1] + 8],
+                                mode="markers",
+                                marker=dict(
+                                    size=15, color="blue", symbol="diamond"
+                                ),
+                                name="Trail End",
+                                hovertemplate="<b>Trail End</b><br>Elevation: %{z:.1f}m<extra></extra>",
                             )
-                    else:
-                        print(
-                            "No trail points found - trail line will not be displayed"
                         )
-
-                    # Update layout for better interaction
-                    elevation_source_label = "LiDAR Elevations" if using_lidar else "DEM Elevations"
-                    fig.update_layout(
-                        title={
-                            "text": f"3D Terrain Visualization - Trail with {elevation_source_label}",
-                            "x": 0.5,
-                            "xanchor": "center",
-                        },
-                        scene=dict(
-                            xaxis_title="Easting (m)",
-                            yaxis_title="Northing (m)",
-                            zaxis_title="Elevation (m)",
-                            camera=dict(eye=dict(x=1.2, y=1.2, z=0.8)),
-                            aspectmode="manual",
-                            aspectratio=dict(x=1, y=1, z=0.5),
-                        ),
-                        width=900,
-                        height=700,
-                        margin=dict(r=100, b=40, l=40, t=60),
-                        showlegend=True,
-                        legend=dict(x=0, y=1),
+                else:
+                    print(
+                        "No trail points found - trail line will not be displayed"
                     )
 
-                    # Generate standalone HTML
-                    html_content = pio.to_html(
-                        fig,
-                        include_plotlyjs=True,
-                        div_id="terrain-3d-plot",
-                        config={
-                            "displayModeBar": True,
-                            "displaylogo": False,
-                            "modeBarButtonsToAdd": [
-                                "pan3d",
-                                "orbitRotation",
-                                "tableRotation",
-                            ],
-                            "scrollZoom": True,
-                        },
-                    )
+                # Update layout for better interaction
+                elevation_source_label = "LiDAR Elevations" if using_lidar else "DEM Elevations"
+                fig.update_layout(
+                    title={
+                        "text": f"3D Terrain Visualization - Trail with {elevation_source_label}",
+                        "x": 0.5,
+                        "xanchor": "center",
+                    },
+                    scene=dict(
+                        xaxis_title="Easting (m)",
+                        yaxis_title="Northing (m)",
+                        zaxis_title="Elevation (m)",
+                        camera=dict(eye=dict(x=1.2, y=1.2, z=0.8)),
+                        aspectmode="manual",
+                        aspectratio=dict(x=1, y=1, z=0.5),
+                    ),
+                    width=900,
+                    height=700,
+                    margin=dict(r=100, b=40, l=40, t=60),
+                    showlegend=True,
+                    legend=dict(x=0, y=1),
+                )
+
+                if output_format == "json":
+                    # Figure spec for clients that render with their own
+                    # Plotly: Plotly.newPlot(div, spec.data, spec.layout, spec.config)
+                    from plotly.io.json import to_json_plotly
 
+                    spec = fig.to_plotly_json()
                     return {
                         "success": True,
                         "type": "interactive",
-                        "html_content": html_content,
+                        "figure_json": to_json_plotly(
+                            {
+                                "data": spec["data"],
+                                "layout": spec["layout"],
+                                "config": PLOTLY_CONFIG,
+                            }
+                        ),
                         "description": "Interactive 3D terrain - Click and drag to rotate, scroll to zoom",
                     }
 
-                except ImportError as e:
-                    print(f"Plotly not available: {e}")
-                    # Fallback to matplotlib
-                    return self._create_static_3d_plot(
-                        elevation_data, gda94_coords, dataset
-                    )
-                except Exception as e:
-                    print(f"Plotly 3D error: {e}")
-                    # Fallback to matplotlib
-                    return self._create_static_3d_plot(
-                        elevation_data, gda94_coords, dataset
-                    )
+                # Generate standalone HTML
+                html_content = pio.to_html(
+                    fig,
+                    include_plotlyjs="cdn",
+                    div_id="terrain-3d-plot",
+                    config=PLOTLY_CONFIG,
+                )
+
+                return {
+                    "success": True,
+                    "type": "interactive",
+                    "html_content": html_content,
+                    "description": "Interactive 3D terrain - Click and drag to rotate, scroll to zoom",
+                }
+
+            except ImportError as e:
+                print(f"Plotly not available: {e}")
+                # Fallback to matplotlib
+                return self._create_static_3d_plot(
+                    elevation_data, gda94_coords, dataset
+                )
+            except Exception as e:
+                print(f"Plotly 3D error: {e}")
+                # Fallback to matplotlib
+                return self._create_static_3d_plot(
+                    elevation_data, gda94_coords, dataset
+                )
 
         except Exception as e:
             print(f"3D visualization error: {e}")
@@ -466,11 +674,12 @@ class RealDEMAnalyzer:
     def _create_static_3d_plot(self, elevation_data, gda94_coords, dataset):
         """Fallback static 3D plot using matplotlib"""
         try:
-            import matplotlib.pyplot as plt
             from mpl_toolkits.mplot3d import Axes3D
 
-            # Create 3D plot
-            fig = plt.figure(figsize=(12, 8))
+            # Create 3D plot. A bare Figure renders with Agg on savefig and
+            # skips pyplot's global figure registry, which isn't thread-safe
+            # (this runs in a worker thread) and would need closing.
+            fig = Figure(figsize=(12, 8))
             ax = fig.add_subplot(111, projection="3d")
 
             # Sample the data for visualization
@@ -480,8 +689,10 @@ class RealDEMAnalyzer:
             X, Y = np.meshgrid(x_range, y_range)
             Z = elevation_data[::step, ::step]
 
-            # Remove no-data values
-            Z_clean = np.where(Z == dataset.nodata, np.nan, Z)
+            # Remove no-data values, masked in place on a float32 copy
+            Z_clean = Z.astype(np.float32)
+            if dataset.nodata is not None:
+                Z_clean[Z == dataset.nodata] = np.nan
 
             # Create surface plot
             surface = ax.plot_surface(X, Y, Z_clean, cmap="terrain", alpha=0.8)
@@ -514,14 +725,12 @@ class RealDEMAnalyzer:
             ax.set_xlabel("Easting (m)")
             ax.set_ylabel("Northing (m)")
             ax.set_zlabel("Elevation (m)")
-            plt.colorbar(surface, shrink=0.8)
+            fig.colorbar(surface, ax=ax, shrink=0.8)
 
             # Save to base64
             buffer = io.BytesIO()
-            plt.savefig(buffer, format="png", dpi=150, bbox_inches="tight")
-            buffer.seek(0)
+            fig.savefig(buffer, format="png", dpi=150, bbox_inches="tight")
             image_base64 = base64.b64encode(buffer.getvalue()).decode()
-            plt.close()
 
             return {
                 "success": True,
@@ -548,47 +757,39 @@ class RealDEMAnalyzer:
             distances = profile_result["elevation_profile"]["distances"]
             slopes = profile_result["elevation_profile"]["slopes"]
 
-            features = []
-
-            # Identify peaks (local maxima)
-            for i in range(1, len(elevations) - 1):
-                if (
-                    elevations[i] > elevations[i - 1]
-                    and elevations[i] > elevations[i + 1]
-                ):
-                    if (
-                        elevations[i] - min(elevations[max(0, i - 10) : i + 10]) > 20
-                    ):  # At least 20m prominence
-                        features.append(
-                            {
-                                "type": "Peak",
-                                "elevation": elevations[i],
-                                "distance": distances[i],
-                                "description": f"Local peak at {elevations[i]:.1f}m elevation",
-                            }
-                        )
+            elev = np.asarray(elevations, dtype=float)
+            slope_arr = np.asarray(slopes, dtype=float)
+            if NUMBA_AVAILABLE:
+                # Compiled single pass over the profile
+                kinds, indices = _terrain_features_jit(elev, slope_arr, 20.0, 10)
+            else:
+                kinds, indices = self._feature_indices(elev, slope_arr)
 
-            # Identify valleys (local minima)
-            for i in range(1, len(elevations) - 1):
-                if (
-                    elevations[i] < elevations[i - 1]
-                    and elevations[i] < elevations[i + 1]
-                ):
-                    if (
-                        max(elevations[max(0, i - 10) : i + 10]) - elevations[i] > 20
-                    ):  # At least 20m depth
-                        features.append(
-                            {
-                                "type": "Valley",
-                                "elevation": elevations[i],
-                                "distance": distances[i],
-                                "description": f"Valley bottom at {elevations[i]:.1f}m elevation",
-                            }
-                        )
-
-            # Identify steep sections
-            for i, slope in enumerate(slopes):
-                if abs(slope) > 25:  # Steep grade > 25%
+            features = []
+            for kind, i in zip(kinds.tolist(), indices.tolist()):
+                if kind == 0:
+                    # Local peak with at least 20m prominence
+                    features.append(
+                        {
+                            "type": "Peak",
+                            "elevation": elevations[i],
+                            "distance": distances[i],
+                            "description": f"Local peak at {elevations[i]:.1f}m elevation",
+                        }
+                    )
+                elif kind == 1:
+                    # Local minimum at least 20m deep
+                    features.append(
+                        {
+                            "type": "Valley",
+                            "elevation": elevations[i],
+                            "distance": distances[i],
+                            "description": f"Valley bottom at {elevations[i]:.1f}m elevation",
+                        }
+                    )
+                else:
+                    # Steep section (grade > 25%)
+                    slope = slopes[i]
                     features.append(
                         {
                             "type": "Steep Grade" if slope > 0 else "Steep Descent",
@@ -615,3 +816,28 @@ class RealDEMAnalyzer:
 
         except Exception as e:
             return {"error": f"Terrain analysis failed: {str(e)}"}
+
+    @staticmethod
+    def _feature_indices(elev: np.ndarray, slopes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """NumPy equivalent of _terrain_features_jit(elev, slopes, 20.0, 10)
+
+        Returns:
+            (kinds, indices): kind 0 = peak, 1 = valley, 2 = steep section;
+            grouped by kind, each group in profile order
+        """
+        # Lowest/highest elevation in the window [i - 10, i + 10) around
+        # each point (truncated at the ends of the profile)
+        window_min = minimum_filter1d(elev, size=20, mode="nearest")
+        window_max = maximum_filter1d(elev, size=20, mode="nearest")
+        is_peak = np.zeros(len(elev), dtype=bool)
+        is_valley = np.zeros(len(elev), dtype=bool)
+        is_peak[1:-1] = (elev[1:-1] > elev[:-2]) & (elev[1:-1] > elev[2:])
+        is_valley[1:-1] = (elev[1:-1] < elev[:-2]) & (elev[1:-1] < elev[2:])
+
+        groups = [
+            np.flatnonzero(is_peak & (elev - window_min > 20)),
+            np.flatnonzero(is_valley & (window_max - elev > 20)),
+            np.flatnonzero(np.abs(slopes) > 25),
+        ]
+        kinds = np.repeat(np.arange(3), [len(g) for g in groups])
+        return kinds, np.concatenate(groups)
@@ -1,6 +1,94 @@
 """
 Terrain analysis functions for weather exposure, surface types, and difficulty.
 """
+from bisect import bisect_right
+from types import MappingProxyType
+
+import numpy as np
+
+from ._jit import NUMBA_AVAILABLE, _terrain_variety_batch_jit, _terrain_variety_jit
+
+
+# Below this many trails calculate_terrain_variety_batch scores them one by
+# one; a parallel kernel launch costs more than it saves
+VARIETY_BATCH_MIN_TRAILS = 32
+
+# Weather exposure results, shared by every caller (read them, don't modify)
+_EXPOSURE_HIGH = {
+    "exposure_level": "High",
+    "risk_factors": (
+        "Rapid weather changes",
+        "Snow/ice risk",
+        "High wind exposure",
+        "Temperature drops",
+    ),
+}
+_EXPOSURE_MODERATE = {
+    "exposure_level": "Moderate",
+    "risk_factors": ("Cooler temperatures", "Wind exposure", "Potential fog"),
+}
+_EXPOSURE_LOW_MODERATE = {
+    "exposure_level": "Low-Moderate",
+    "risk_factors": ("Slightly cooler temps", "Some wind exposure"),
+}
+_EXPOSURE_LOW = {
+    "exposure_level": "Low",
+    "risk_factors": ("Minimal weather impact", "Protected terrain"),
+}
+
+# estimate_surface_type_from_terrain results, shared by every caller (read
+# them, don't modify)
+_SEGMENTS_UNKNOWN = ({"surface": "unknown", "percentage": 100},)
+_SEGMENTS_ROCKY = (
+    {"surface": "rock", "percentage": 40},
+    {"surface": "dirt", "percentage": 35},
+    {"surface": "scree", "percentage": 25},
+)
+_SEGMENTS_ALPINE = (
+    {"surface": "grass", "percentage": 50},
+    {"surface": "dirt", "percentage": 30},
+    {"surface": "rock", "percentage": 20},
+)
+_SEGMENTS_FOREST = (
+    {"surface": "forest_floor", "percentage": 60},
+    {"surface": "dirt", "percentage": 30},
+    {"surface": "soil", "percentage": 10},
+)
+_SEGMENTS_COASTAL = (
+    {"surface": "dirt", "percentage": 50},
+    {"surface": "sand", "percentage": 30},
+    {"surface": "grass", "percentage": 20},
+)
+_SEGMENTS_MIXED = (
+    {"surface": "dirt", "percentage": 70},
+    {"surface": "gravel", "percentage": 20},
+    {"surface": "grass", "percentage": 10},
+)
+_SEGMENTS_NO_ELEVATION = (
+    {"surface": "dirt", "percentage": 60},
+    {"surface": "gravel", "percentage": 25},
+    {"surface": "grass", "percentage": 15},
+)
+
+# get_weather_exposure_from_score: a score at or above _WEATHER_THRESHOLDS[i]
+# (and below the next) gets _WEATHER_EXPOSURES[i + 1]
+_WEATHER_THRESHOLDS = (1.05, 1.15, 1.25)
+_WEATHER_EXPOSURES = (
+    _EXPOSURE_LOW,
+    _EXPOSURE_LOW_MODERATE,
+    _EXPOSURE_MODERATE,
+    _EXPOSURE_HIGH,
+)
+
+# get_terrain_variety_description, laid out the same way
+_VARIETY_THRESHOLDS = (2, 4, 6, 8)
+_VARIETY_DESCRIPTIONS = (
+    "Flat or very consistent terrain",
+    "Limited terrain variety, mostly consistent elevation",
+    "Moderate terrain variety with some elevation changes",
+    "Good terrain variety with several elevation changes",
+    "Highly varied terrain with multiple elevation zones",
+)
 
 
 def get_trail_weather_exposure(trail):
@@ -12,36 +100,19 @@ def get_trail_weather_exposure(trail):
         trail: Trail dict with max_elevation
     
     Returns:
-        dict: exposure_level and risk_factors
+        dict: exposure_level and risk_factors (a tuple); shared, not a copy
     """
     max_elev = trail.get("max_elevation", 0)
 
     # Return exposure level and explanation (static characteristics)
     if max_elev > 1500:
-        return {
-            "exposure_level": "High",
-            "risk_factors": [
-                "Rapid weather changes",
-                "Snow/ice risk",
-                "High wind exposure",
-                "Temperature drops",
-            ],
-        }
+        return _EXPOSURE_HIGH
     elif max_elev > 1000:
-        return {
-            "exposure_level": "Moderate",
-            "risk_factors": ["Cooler temperatures", "Wind exposure", "Potential fog"],
-        }
+        return _EXPOSURE_MODERATE
     elif max_elev > 500:
-        return {
-            "exposure_level": "Low-Moderate",
-            "risk_factors": ["Slightly cooler temps", "Some wind exposure"],
-        }
+        return _EXPOSURE_LOW_MODERATE
     else:
-        return {
-            "exposure_level": "Low",
-            "risk_factors": ["Minimal weather impact", "Protected terrain"],
-        }
+        return _EXPOSURE_LOW
 
 
 def calculate_terrain_variety(elevations):
@@ -57,32 +128,69 @@ def calculate_terrain_variety(elevations):
     if len(elevations) < 10:
         return 0
 
-    # Calculate elevation ranges in 100m bands
-    elevation_bands = set()
-    for elev in elevations:
-        band = int(elev / 100) * 100  # Round to nearest 100m
-        elevation_bands.add(band)
+    elev = np.asarray(elevations, dtype=np.float64)
 
-    # More bands = more variety
-    variety_score = min(len(elevation_bands), 10)  # Cap at 10
+    if NUMBA_AVAILABLE:
+        # Compiled single pass for bands and change rate
+        n_bands, avg_change = _terrain_variety_jit(elev)
+    else:
+        # Calculate elevation ranges in 100m bands (truncated toward zero);
+        # NaN/infinite readings are not a band
+        finite = elev[np.isfinite(elev)]
+        n_bands = np.unique(np.trunc(finite / 100)).size
+        # Also consider elevation change rate
+        avg_change = float(np.abs(np.diff(elev)).mean())
 
-    # Also consider elevation change rate
-    elevation_changes = []
-    for i in range(1, len(elevations)):
-        change_rate = abs(elevations[i] - elevations[i - 1])
-        elevation_changes.append(change_rate)
+    # More bands = more variety
+    variety_score = min(int(n_bands), 10)  # Cap at 10
 
     # Bonus for frequent elevation changes
-    if elevation_changes:
-        avg_change = sum(elevation_changes) / len(elevation_changes)
-        if avg_change > 20:  # Frequent significant changes
-            variety_score = min(variety_score + 2, 10)
-        elif avg_change > 10:  # Moderate changes
-            variety_score = min(variety_score + 1, 10)
+    if avg_change > 20:  # Frequent significant changes
+        variety_score = min(variety_score + 2, 10)
+    elif avg_change > 10:  # Moderate changes
+        variety_score = min(variety_score + 1, 10)
 
     return variety_score
 
 
+def calculate_terrain_variety_batch(elevation_profiles):
+    """
+    calculate_terrain_variety for many trails, scored in one parallel pass.
+
+    With Numba, profiles are packed back to back (CSR-style offsets) and
+    each trail is scored on its own thread; without it, or for fewer than
+    VARIETY_BATCH_MIN_TRAILS trails, they are scored one by one.
+
+    Args:
+        elevation_profiles: List of per-trail elevation lists/arrays in meters
+
+    Returns:
+        np.ndarray: Variety score 0-10 for each trail, in input order
+    """
+    n = len(elevation_profiles)
+    if not NUMBA_AVAILABLE or n < VARIETY_BATCH_MIN_TRAILS:
+        return np.array(
+            [calculate_terrain_variety(elev) for elev in elevation_profiles],
+            dtype=np.int64,
+        )
+
+    lengths = np.fromiter(
+        (len(elev) for elev in elevation_profiles), dtype=np.int64, count=n
+    )
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    elev_all = np.concatenate(
+        [np.asarray(elev, dtype=np.float64) for elev in elevation_profiles]
+    )
+    n_bands, avg_change = _terrain_variety_batch_jit(elev_all, offsets)
+
+    # Same ladder as calculate_terrain_variety
+    bonus = np.where(avg_change > 20, 2, np.where(avg_change > 10, 1, 0))
+    scores = np.minimum(np.minimum(n_bands, 10) + bonus, 10)
+    scores[lengths < 10] = 0
+    return scores
+
+
 def get_terrain_variety_description(score):
     """
     Get a human-readable description for terrain variety score.
@@ -93,16 +201,40 @@ def get_terrain_variety_description(score):
     Returns:
         str: Description of terrain variety
     """
-    if score >= 8:
-        return "Highly varied terrain with multiple elevation zones"
-    elif score >= 6:
-        return "Good terrain variety with several elevation changes"
-    elif score >= 4:
-        return "Moderate terrain variety with some elevation changes"
-    elif score >= 2:
-        return "Limited terrain variety, mostly consistent elevation"
-    else:
-        return "Flat or very consistent terrain"
+    return _VARIETY_DESCRIPTIONS[bisect_right(_VARIETY_THRESHOLDS, score)]
+
+
+# Difficulty multiplier per surface type (see get_surface_difficulty_multiplier),
+# read-only since every caller shares it
+SURFACE_DIFFICULTY_MULTIPLIERS = MappingProxyType({
+    # Easy surfaces (< 1.0)
+    "paved": 0.7,
+    "boardwalk": 0.8,
+    "concrete": 0.75,
+    # Normal surfaces (1.0)
+    "dirt": 1.0,
+    "gravel": 1.0,
+    "grass": 1.0,
+    # Moderate surfaces (1.1-1.3)
+    "soil": 1.1,
+    "forest_floor": 1.15,
+    "crushed_stone": 1.1,
+    "wood_chips": 1.2,
+    "tall_grass": 1.25,
+    # Challenging surfaces (1.3-1.6)
+    "sand": 1.4,
+    "mud": 1.5,
+    "loose_gravel": 1.3,
+    "scree": 1.6,
+    "snow": 1.4,
+    # Difficult surfaces (1.6-2.0)
+    "rock": 1.7,
+    "boulder": 1.8,
+    "swamp": 1.9,
+    "ice": 2.0,
+    # Default for unknown
+    "unknown": 1.0,
+})
 
 
 def get_surface_difficulty_multiplier(surface_type):
@@ -122,37 +254,7 @@ def get_surface_difficulty_multiplier(surface_type):
     Returns:
         float: Difficulty multiplier
     """
-    surface_multipliers = {
-        # Easy surfaces (< 1.0)
-        "paved": 0.7,
-        "boardwalk": 0.8,
-        "concrete": 0.75,
-        # Normal surfaces (1.0)
-        "dirt": 1.0,
-        "gravel": 1.0,
-        "grass": 1.0,
-        # Moderate surfaces (1.1-1.3)
-        "soil": 1.1,
-        "forest_floor": 1.15,
-        "crushed_stone": 1.1,
-        "wood_chips": 1.2,
-        "tall_grass": 1.25,
-        # Challenging surfaces (1.3-1.6)
-        "sand": 1.4,
-        "mud": 1.5,
-        "loose_gravel": 1.3,
-        "scree": 1.6,
-        "snow": 1.4,
-        # Difficult surfaces (1.6-2.0)
-        "rock": 1.7,
-        "boulder": 1.8,
-        "swamp": 1.9,
-        "ice": 2.0,
-        # Default for unknown
-        "unknown": 1.0,
-    }
-
-    return surface_multipliers.get(surface_type.lower(), 1.0)
+    return SURFACE_DIFFICULTY_MULTIPLIERS.get(surface_type.lower(), 1.0)
 
 
 def estimate_surface_type_from_terrain(coordinates, elevation_profile=None):
@@ -165,69 +267,37 @@ def estimate_surface_type_from_terrain(coordinates, elevation_profile=None):
         elevation_profile: Optional list of elevation dicts
     
     Returns:
-        list: Surface segments with type and percentage
+        tuple: Shared surface segments with type and percentage (don't modify)
     """
     if not coordinates:
-        return [{"surface": "unknown", "percentage": 100}]
-
-    surface_segments = []
-
-    # Get elevation statistics if available
-    elevations = []
-    if elevation_profile:
-        elevations = [point.get("elevation", 0) for point in elevation_profile]
+        return _SEGMENTS_UNKNOWN
 
-    # Estimate based on coordinate patterns and elevation
-    if elevations:
-        avg_elevation = sum(elevations) / len(elevations)
-        elevation_variance = sum((e - avg_elevation) ** 2 for e in elevations) / len(
-            elevations
-        )
-
-        # High elevation, high variance = rocky terrain
-        if avg_elevation > 800 and elevation_variance > 1000:
-            surface_segments = [
-                {"surface": "rock", "percentage": 40},
-                {"surface": "dirt", "percentage": 35},
-                {"surface": "scree", "percentage": 25},
-            ]
-        # High elevation, low variance = alpine meadows
-        elif avg_elevation > 800:
-            surface_segments = [
-                {"surface": "grass", "percentage": 50},
-                {"surface": "dirt", "percentage": 30},
-                {"surface": "rock", "percentage": 20},
-            ]
-        # Medium elevation, high variance = forest trails
-        elif avg_elevation > 200 and elevation_variance > 500:
-            surface_segments = [
-                {"surface": "forest_floor", "percentage": 60},
-                {"surface": "dirt", "percentage": 30},
-                {"surface": "soil", "percentage": 10},
-            ]
-        # Low elevation, coastal areas
-        elif avg_elevation < 100:
-            surface_segments = [
-                {"surface": "dirt", "percentage": 50},
-                {"surface": "sand", "percentage": 30},
-                {"surface": "grass", "percentage": 20},
-            ]
-        else:
-            # Default mixed terrain
-            surface_segments = [
-                {"surface": "dirt", "percentage": 70},
-                {"surface": "gravel", "percentage": 20},
-                {"surface": "grass", "percentage": 10},
-            ]
-    else:
+    if not elevation_profile:
         # No elevation data, assume mixed terrain
-        surface_segments = [
-            {"surface": "dirt", "percentage": 60},
-            {"surface": "gravel", "percentage": 25},
-            {"surface": "grass", "percentage": 15},
-        ]
-
-    return surface_segments
+        return _SEGMENTS_NO_ELEVATION
+
+    elevations = np.fromiter(
+        (point.get("elevation", 0) for point in elevation_profile),
+        dtype=np.float64,
+        count=len(elevation_profile),
+    )
+    avg_elevation = float(elevations.mean())
+    elevation_variance = float(elevations.var())
+
+    # High elevation, high variance = rocky terrain
+    if avg_elevation > 800 and elevation_variance > 1000:
+        return _SEGMENTS_ROCKY
+    # High elevation, low variance = alpine meadows
+    if avg_elevation > 800:
+        return _SEGMENTS_ALPINE
+    # Medium elevation, high variance = forest trails
+    if avg_elevation > 200 and elevation_variance > 500:
+        return _SEGMENTS_FOREST
+    # Low elevation, coastal areas
+    if avg_elevation < 100:
+        return _SEGMENTS_COASTAL
+    # Default mixed terrain
+    return _SEGMENTS_MIXED
 
 
 def calculate_surface_difficulty_score(surface_segments):
@@ -246,12 +316,13 @@ def calculate_surface_difficulty_score(surface_segments):
     total_score = 0
     total_percentage = 0
 
+    # Look multipliers up in the shared table directly (no per-segment call)
+    multipliers = SURFACE_DIFFICULTY_MULTIPLIERS
     for segment in surface_segments:
-        surface = segment.get("surface", "unknown")
         percentage = segment.get("percentage", 0)
-        multiplier = get_surface_difficulty_multiplier(surface)
+        surface = segment.get("surface", "unknown").lower()
 
-        total_score += multiplier * percentage
+        total_score += multipliers.get(surface, 1.0) * percentage
         total_percentage += percentage
 
     if total_percentage == 0:
@@ -308,7 +379,7 @@ def get_weather_exposure_from_score(score):
         score: Weather exposure score (1.0 = baseline)
     
     Returns:
-        dict: exposure_level and risk_factors
+        dict: exposure_level and risk_factors (a tuple); shared, not a copy
     """
     # Handle None/null values
     if score is None:
@@ -318,29 +389,7 @@ def get_weather_exposure_from_score(score):
         score = float(score)  # Ensure it's a number
     except (ValueError, TypeError):
         score = 1.0  # Default to low exposure if conversion fails
+    if score != score:
+        score = 1.0  # NaN is below no threshold: low exposure
 
-    if score >= 1.25:
-        return {
-            "exposure_level": "High",
-            "risk_factors": [
-                "Rapid weather changes",
-                "Snow/ice risk",
-                "High wind exposure",
-                "Temperature drops",
-            ],
-        }
-    elif score >= 1.15:
-        return {
-            "exposure_level": "Moderate",
-            "risk_factors": ["Cooler temperatures", "Wind exposure", "Potential fog"],
-        }
-    elif score >= 1.05:
-        return {
-            "exposure_level": "Low-Moderate",
-            "risk_factors": ["Slightly cooler temps", "Some wind exposure"],
-        }
-    else:
-        return {
-            "exposure_level": "Low",
-            "risk_factors": ["Minimal weather impact", "Protected terrain"],
-        }
+    return _WEATHER_EXPOSURES[bisect_right(_WEATHER_THRESHOLDS, score)]